@@ -0,0 +1,326 @@
+"""
+Async AWS Pricing API client
+Fans all price lookups out concurrently instead of one after another
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+import boto3
+import httpx
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+
+from app.aws_pricing import (
+    BATCH_MIN_KEYS,
+    LAMBDA_FALLBACK_PRICING,
+    PRODUCTS_PAGE_SIZE,
+    SERVICE_LABELS,
+    PriceKey,
+    build_batch_query,
+    build_product_query,
+    get_region_name,
+    parse_on_demand_price,
+    parse_price_list,
+    plan_batches,
+)
+from app.metrics import PRICING_API_SECONDS
+from app.pricing_cache import PricingCache
+
+if TYPE_CHECKING:
+    from app.price_store import PriceStore
+
+logger = logging.getLogger(__name__)
+
+# The Pricing API is only served from us-east-1 (and ap-south-1)
+PRICING_ENDPOINT_URL = "https://api.pricing.us-east-1.amazonaws.com"
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT_SECONDS = 5.0
+
+
+class AsyncAWSPricingClient:
+    """
+    Async counterpart of AWSPricingClient
+
+    Calls the Pricing API's GetProducts action over HTTP with SigV4
+    signing, so lookups run on the event loop instead of tying up a
+    threadpool worker each. Shares PriceKey, cache and price store with
+    the sync client.
+    """
+
+    def __init__(
+        self,
+        region: str = "us-east-1",
+        cache: Optional[PricingCache] = None,
+        price_store: Optional["PriceStore"] = None,
+        offline: bool = False,
+        endpoint_url: Optional[str] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+        sign_requests: bool = True,
+        batch_min_keys: int = BATCH_MIN_KEYS,
+    ):
+        """
+        Args:
+            region: Region to price resources in
+            cache: Pricing cache to use (default: a new PricingCache)
+            price_store: Local price store checked before the Pricing API
+            offline: Never call the Pricing API (price store only)
+            endpoint_url: Pricing API endpoint (default: $PRICING_ENDPOINT_URL
+                or the public us-east-1 endpoint); point at a stub for tests
+            max_concurrency: Maximum in-flight Pricing API calls
+            timeout_seconds: Per-call timeout
+            sign_requests: Sign requests with the default boto3 credentials
+            batch_min_keys: Fetch a service's prices with one paginated
+                query once this many are needed (see plan_batches)
+        """
+        self.target_region = region
+        self.cache = cache if cache is not None else PricingCache()
+        self.price_store = price_store
+        self.offline = offline
+        self.endpoint_url = (
+            endpoint_url or os.environ.get("PRICING_ENDPOINT_URL") or PRICING_ENDPOINT_URL
+        )
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.sign_requests = sign_requests
+        self.batch_min_keys = batch_min_keys
+        self._credentials = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def get_ec2_pricing(self, instance_type: str) -> Optional[float]:
+        """Get EC2 instance pricing per hour, or None if not found"""
+        return await self.get_price(PriceKey('ec2', self.target_region, instance_type))
+
+    async def get_rds_pricing(self, instance_type: str, engine: str = "MySQL") -> Optional[float]:
+        """Get RDS instance pricing per hour, or None if not found"""
+        return await self.get_price(PriceKey('rds', self.target_region, instance_type, engine))
+
+    async def get_lambda_pricing(self) -> Dict[str, float]:
+        """
+        Get Lambda pricing (requests and compute duration), fetched concurrently
+
+        Returns:
+            Dictionary with 'per_request' and 'per_gb_second' pricing
+        """
+        prices = await self.get_prices([
+            PriceKey('lambda', self.target_region, 'requests'),
+            PriceKey('lambda', self.target_region, 'duration'),
+        ])
+        per_request, per_gb_second = prices.values()
+
+        return {
+            'per_request': (
+                per_request if per_request is not None
+                else LAMBDA_FALLBACK_PRICING['per_request']
+            ),
+            'per_gb_second': (
+                per_gb_second if per_gb_second is not None
+                else LAMBDA_FALLBACK_PRICING['per_gb_second']
+            ),
+        }
+
+    async def get_price(self, key: PriceKey) -> Optional[float]:
+        """
+        Get a unit price, served from the cache when fresh
+
+        Returns:
+            Price per unit in USD, or None if not found
+        """
+        prices = await self.get_prices([key])
+        return prices[key]
+
+    async def get_prices(
+        self,
+        keys: Iterable[PriceKey],
+        refresh: bool = False,
+    ) -> Dict[PriceKey, Optional[float]]:
+        """
+        Get several unit prices concurrently
+
+        Worst-case latency is the slowest single lookup (bounded by the
+        per-call timeout), not the sum of all of them. Uncached prices
+        sharing a service, region and engine are fetched with one
+        paginated query per group once there are `batch_min_keys` of them.
+
+        Args:
+            keys: Prices to look up
+            refresh: Bypass the cache and fetch fresh prices
+
+        Returns:
+            Mapping of key to price, None where not found
+        """
+        keys = list(dict.fromkeys(keys))
+        pending = keys if refresh else [key for key in keys if key not in self.cache]
+        _, batches = plan_batches(pending, self.batch_min_keys)
+        batched = {key for group in batches for key in group}
+
+        fetched = await asyncio.gather(*(self._fetch_batch(group) for group in batches))
+        for prices in fetched:
+            for key, price in prices.items():
+                self.cache.store_loaded(key, price, refresh)
+
+        # Loaders may outlive this call (other callers share the flight),
+        # so they use the client's long-lived HTTP connection pool
+        prices = await asyncio.gather(*(
+            self.cache.get_or_load_async(
+                key,
+                lambda key=key: self._fetch_price(key),
+                refresh=refresh and key not in batched,
+            )
+            for key in keys
+        ))
+        return dict(zip(keys, prices))
+
+    async def _fetch_batch(self, keys: List[PriceKey]) -> Dict[PriceKey, Optional[float]]:
+        """Fetch prices sharing a service, region and engine (uncached)"""
+        prices: Dict[PriceKey, Optional[float]] = {}
+        if self.price_store is not None:
+            for key in keys:
+                price = self.price_store.get_price(key)
+                if price is not None:
+                    prices[key] = price
+        remaining = [key for key in keys if key not in prices]
+        if not remaining or self.offline:
+            return {key: prices.get(key) for key in keys}
+        if len(remaining) < self.batch_min_keys:
+            found = await asyncio.gather(*(self._fetch_price(key) for key in remaining))
+            prices.update(zip(remaining, found))
+            return prices
+
+        template = remaining[0]
+        service_code, filters = build_batch_query(template, get_region_name(template.region))
+        payload = {
+            'ServiceCode': service_code,
+            'Filters': filters,
+            'FormatVersion': 'aws_v1',
+            'MaxResults': PRODUCTS_PAGE_SIZE,
+        }
+        missing = set(remaining)
+
+        with PRICING_API_SECONDS.time(
+            client='async', service=template.service, outcome='error'
+        ) as call:
+            try:
+                # Pages chain through NextToken, so they're fetched in order
+                while missing:
+                    async with self._get_semaphore():
+                        response = await asyncio.wait_for(
+                            self._get_products(self._get_http(), payload),
+                            timeout=self.timeout_seconds,
+                        )
+                    page = parse_price_list(response.get('PriceList', []), template, missing)
+                    for key in missing & page.keys():
+                        prices[key] = page[key]
+                    missing -= page.keys()
+                    if not response.get('NextToken'):
+                        break
+                    payload['NextToken'] = response['NextToken']
+                call['outcome'] = 'ok' if len(missing) < len(remaining) else 'not_found'
+            except Exception as e:
+                label = SERVICE_LABELS.get(template.service, template.service)
+                logger.warning("Error fetching %s pricing for %d SKUs: %r", label, len(remaining), e)
+
+        return {key: prices.get(key) for key in keys}
+
+    async def _fetch_price(self, key: PriceKey) -> Optional[float]:
+        """Fetch a single unit price from the local store or Pricing API (uncached)"""
+        if self.price_store is not None:
+            price = self.price_store.get_price(key)
+            if price is not None:
+                return price
+        if self.offline:
+            return None
+
+        service_code, filters = build_product_query(key, get_region_name(key.region))
+
+        with PRICING_API_SECONDS.time(client='async', service=key.service, outcome='error') as call:
+            try:
+                async with self._get_semaphore():
+                    response = await asyncio.wait_for(
+                        self._get_products(self._get_http(), {
+                            'ServiceCode': service_code,
+                            'Filters': filters,
+                            'FormatVersion': 'aws_v1',
+                            'MaxResults': 1,
+                        }),
+                        timeout=self.timeout_seconds,
+                    )
+
+                if response.get('PriceList'):
+                    price = parse_on_demand_price(response['PriceList'][0])
+                    call['outcome'] = 'ok'
+                    return price
+
+                call['outcome'] = 'not_found'
+                return None
+
+            except Exception as e:
+                label = SERVICE_LABELS.get(key.service, key.service)
+                logger.warning("Error fetching %s pricing for %s: %r", label, key.sku, e)
+                return None
+
+    async def _get_products(self, http: httpx.AsyncClient, payload: Dict) -> Dict:
+        """POST a GetProducts request and return the decoded response"""
+        body = json.dumps(payload)
+        headers = {
+            'Content-Type': 'application/x-amz-json-1.1',
+            'X-Amz-Target': 'AWSPriceListService.GetProducts',
+        }
+
+        credentials = await self._get_credentials()
+        if credentials is not None:
+            request = AWSRequest(method='POST', url=self.endpoint_url, data=body, headers=headers)
+            SigV4Auth(credentials, 'pricing', 'us-east-1').add_auth(request)
+            headers = dict(request.headers.items())
+
+        response = await http.post(self.endpoint_url, content=body, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def _get_credentials(self):
+        """Resolve boto3 credentials once (off the event loop, it may hit IMDS)"""
+        if not self.sign_requests:
+            return None
+        if self._credentials is None:
+            credentials = await asyncio.to_thread(boto3.Session().get_credentials)
+            if credentials is None:
+                raise RuntimeError("No AWS credentials found to sign Pricing API requests")
+            self._credentials = credentials
+        return self._credentials.get_frozen_credentials()
+
+    def _get_http(self) -> httpx.AsyncClient:
+        """
+        Shared HTTP client, recreated if the client moves to another event loop
+
+        Lives as long as this pricing client (see aclose()), not a single
+        get_prices() call, so a caller being cancelled can't close it under
+        a fetch that other callers are still waiting on.
+        """
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http_loop is not loop or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=self.timeout_seconds)
+            self._http_loop = loop
+        return self._http
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client (call on app shutdown)"""
+        if self._http is not None and self._http_loop is asyncio.get_running_loop():
+            await self._http.aclose()
+        self._http = None
+        self._http_loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Concurrency cap, recreated if the client moves to another event loop"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
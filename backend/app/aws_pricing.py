@@ -4,25 +4,292 @@ Fetches real-time pricing data from AWS Price List API
 """
 
 import boto3
-import json
-from typing import Dict, Optional
-from functools import lru_cache
+import logging
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from app.metrics import PRICING_API_SECONDS
+from app.price_document import extract_price_document
+from app.pricing_cache import PricingCache
+
+if TYPE_CHECKING:
+    from app.price_store import PriceStore
+
+logger = logging.getLogger(__name__)
+
+
+class PriceKey(NamedTuple):
+    """
+    Identifies a single on-demand unit price
+
+    Examples:
+        PriceKey("ec2", "us-east-1", "t4g.nano")
+        PriceKey("rds", "us-east-1", "db.t4g.micro", "MySQL")
+        PriceKey("lambda", "us-east-1", "requests")
+        PriceKey("lambda", "us-east-1", "duration")
+    """
+    service: str
+    region: str
+    sku: str
+    variant: str = ""
+
+
+# Used when a Lambda price can't be fetched
+LAMBDA_FALLBACK_PRICING = {
+    'per_request': 0.0000002,
+    'per_gb_second': 0.0000166667,
+}
+
+# Monthly Lambda free tier, per account (never expires)
+LAMBDA_FREE_TIER = {
+    'requests': 1_000_000,
+    'gb_seconds': 400_000,
+}
+
+LAMBDA_PRICE_GROUPS = {
+    'requests': 'AWS-Lambda-Requests',
+    'duration': 'AWS-Lambda-Duration',
+}
+
+# Region code -> Pricing API location name
+REGION_NAMES = {
+    'us-east-1': 'US East (N. Virginia)',
+    'us-east-2': 'US East (Ohio)',
+    'us-west-1': 'US West (N. California)',
+    'us-west-2': 'US West (Oregon)',
+    'af-south-1': 'Africa (Cape Town)',
+    'ap-east-1': 'Asia Pacific (Hong Kong)',
+    'ap-south-1': 'Asia Pacific (Mumbai)',
+    'ap-south-2': 'Asia Pacific (Hyderabad)',
+    'ap-southeast-1': 'Asia Pacific (Singapore)',
+    'ap-southeast-2': 'Asia Pacific (Sydney)',
+    'ap-southeast-3': 'Asia Pacific (Jakarta)',
+    'ap-southeast-4': 'Asia Pacific (Melbourne)',
+    'ap-northeast-1': 'Asia Pacific (Tokyo)',
+    'ap-northeast-2': 'Asia Pacific (Seoul)',
+    'ap-northeast-3': 'Asia Pacific (Osaka)',
+    'ca-central-1': 'Canada (Central)',
+    'ca-west-1': 'Canada West (Calgary)',
+    'eu-central-1': 'EU (Frankfurt)',
+    'eu-central-2': 'EU (Zurich)',
+    'eu-west-1': 'EU (Ireland)',
+    'eu-west-2': 'EU (London)',
+    'eu-west-3': 'EU (Paris)',
+    'eu-south-1': 'EU (Milan)',
+    'eu-south-2': 'EU (Spain)',
+    'eu-north-1': 'EU (Stockholm)',
+    'il-central-1': 'Israel (Tel Aviv)',
+    'me-south-1': 'Middle East (Bahrain)',
+    'me-central-1': 'Middle East (UAE)',
+    'sa-east-1': 'South America (Sao Paulo)',
+}
+
+_LAMBDA_GROUP_SKUS = {group: sku for sku, group in LAMBDA_PRICE_GROUPS.items()}
+
+# Below this many prices from one service/region/engine, one MaxResults=1
+# lookup per price is cheaper than paging through every product (a region
+# has several hundred Linux EC2 instance types, 100 per page)
+BATCH_MIN_KEYS = 8
+
+# Largest page get_products returns
+PRODUCTS_PAGE_SIZE = 100
+
+SERVICE_LABELS = {
+    'ec2': 'EC2',
+    'rds': 'RDS',
+    'lambda': 'Lambda',
+}
+
+
+def get_region_name(region_code: str) -> str:
+    """
+    Convert region code to AWS Pricing API region name
+    
+    Args:
+        region_code: AWS region code (e.g., 'us-east-1')
+        
+    Returns:
+        Region name for Pricing API (e.g., 'US East (N. Virginia)')
+    """
+    return REGION_NAMES.get(region_code, REGION_NAMES['us-east-1'])
+
+
+def _term_filters(fields: Dict[str, str]) -> List[Dict[str, str]]:
+    """Build TERM_MATCH filters for pricing.get_products"""
+    return [
+        {'Type': 'TERM_MATCH', 'Field': field, 'Value': value}
+        for field, value in fields.items()
+    ]
+
+
+def build_product_query(key: PriceKey, location: str) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Build the get_products service code and filters for a price key
+    
+    Args:
+        key: Price to look up
+        location: Pricing API region name (e.g., 'US East (N. Virginia)')
+        
+    Returns:
+        (ServiceCode, Filters) tuple
+    """
+    if key.service == 'ec2':
+        return 'AmazonEC2', _term_filters({
+            'instanceType': key.sku,
+            'location': location,
+            'operatingSystem': 'Linux',
+            'tenancy': 'Shared',
+            'preInstalledSw': 'NA',
+            'capacitystatus': 'Used',
+        })
+    if key.service == 'rds':
+        return 'AmazonRDS', _term_filters({
+            'instanceType': key.sku,
+            'location': location,
+            'databaseEngine': key.variant or 'MySQL',
+            'deploymentOption': 'Single-AZ',
+        })
+    if key.service == 'lambda':
+        return 'AWSLambda', _term_filters({
+            'location': location,
+            'group': LAMBDA_PRICE_GROUPS[key.sku],
+        })
+    raise ValueError(f"Unsupported pricing service: {key.service}")
+
+
+def build_batch_query(key: PriceKey, location: str) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Like build_product_query, minus the per-SKU filter
+
+    The result matches every product that shares `key`'s service, region
+    and engine, so one paginated query prices all of them.
+    """
+    service_code, filters = build_product_query(key, location)
+    sku_field = 'group' if key.service == 'lambda' else 'instanceType'
+    return service_code, [f for f in filters if f['Field'] != sku_field]
+
+
+def batch_group(key: PriceKey) -> Tuple[str, str, str]:
+    """Keys with the same group are answered by the same batch query"""
+    return key.service, key.region, key.variant
+
+
+def plan_batches(
+    keys: Iterable[PriceKey],
+    min_keys: int = BATCH_MIN_KEYS,
+) -> Tuple[List[PriceKey], List[List[PriceKey]]]:
+    """
+    Split lookups into single-price queries and batch queries
+
+    Args:
+        keys: Prices to look up
+        min_keys: Smallest group worth a batch query
+
+    Returns:
+        (keys to look up one by one, groups of keys to fetch in one batch)
+    """
+    groups: Dict[Tuple[str, str, str], List[PriceKey]] = {}
+    for key in keys:
+        groups.setdefault(batch_group(key), []).append(key)
+
+    singles, batches = [], []
+    for group in groups.values():
+        if len(group) >= min_keys:
+            batches.append(group)
+        else:
+            singles.extend(group)
+    return singles, batches
+
+
+def parse_price_list(
+    documents: Iterable[str],
+    template: PriceKey,
+    wanted: Optional[Iterable[PriceKey]] = None,
+) -> Dict[PriceKey, float]:
+    """
+    Index a batch query's PriceList by PriceKey in one pass
+
+    Args:
+        documents: PriceList entries from every page
+        template: Any key of the batch (supplies service, region, variant)
+        wanted: Stop reading once all of these are priced (pass a lazy
+            `documents` iterator so later pages are never fetched)
+
+    Returns:
+        On-demand unit price per key (the first product wins on duplicates,
+        as with a MaxResults=1 lookup)
+    """
+    sku_attribute = 'group' if template.service == 'lambda' else 'instanceType'
+    prices: Dict[PriceKey, float] = {}
+    remaining = set(wanted) if wanted is not None else None
+    for document in documents:
+        extracted = extract_price_document(document, (sku_attribute,))
+        sku = extracted.attributes.get(sku_attribute)
+        if template.service == 'lambda':
+            sku = _LAMBDA_GROUP_SKUS.get(sku)
+        if sku is None or extracted.on_demand is None:
+            continue
+
+        key = template._replace(sku=sku)
+        if key in prices:
+            continue
+        prices[key] = extracted.on_demand
+        if remaining is not None:
+            remaining.discard(key)
+            if not remaining:
+                break
+    return prices
+
+
+def parse_on_demand_price(price_list_item: str) -> float:
+    """
+    Extract the on-demand USD unit price from a PriceList JSON document
+    
+    Args:
+        price_list_item: One entry of a get_products 'PriceList'
+        
+    Returns:
+        Price per unit in USD (first tier, if the price is tiered)
+        
+    Raises:
+        ValueError: The document lists no on-demand USD price
+    """
+    price = extract_price_document(price_list_item).on_demand
+    if price is None:
+        raise ValueError("No on-demand USD price in PriceList document")
+    return price
 
 
 class AWSPricingClient:
     """Client for fetching AWS service pricing"""
     
-    def __init__(self, region: str = "us-east-1"):
+    def __init__(
+        self,
+        region: str = "us-east-1",
+        cache: Optional[PricingCache] = None,
+        price_store: Optional["PriceStore"] = None,
+        offline: bool = False,
+        batch_min_keys: int = BATCH_MIN_KEYS,
+    ):
         """
         Initialize AWS Pricing client
         
         Note: The Pricing API is only available in us-east-1 and ap-south-1
         but returns pricing for all regions
+        
+        Args:
+            region: Region to price resources in
+            cache: Pricing cache to use (default: a new PricingCache)
+            price_store: Local price store checked before the Pricing API
+            offline: Never call the Pricing API (price store only)
+            batch_min_keys: Fetch a service's prices with one paginated
+                query once this many are needed (see plan_batches)
         """
         self.pricing_client = boto3.client('pricing', region_name='us-east-1')
         self.target_region = region
+        self.cache = cache if cache is not None else PricingCache()
+        self.price_store = price_store
+        self.offline = offline
+        self.batch_min_keys = batch_min_keys
         
-    @lru_cache(maxsize=100)
     def get_ec2_pricing(self, instance_type: str) -> Optional[float]:
         """
         Get EC2 instance pricing per hour
@@ -33,58 +300,8 @@ class AWSPricingClient:
         Returns:
             Price per hour in USD, or None if not found
         """
-        try:
-            response = self.pricing_client.get_products(
-                ServiceCode='AmazonEC2',
-                Filters=[
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'instanceType',
-                        'Value': instance_type
-                    },
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'location',
-                        'Value': self._get_region_name(self.target_region)
-                    },
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'operatingSystem',
-                        'Value': 'Linux'
-                    },
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'tenancy',
-                        'Value': 'Shared'
-                    },
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'preInstalledSw',
-                        'Value': 'NA'
-                    },
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'capacitystatus',
-                        'Value': 'Used'
-                    }
-                ],
-                MaxResults=1
-            )
-            
-            if response['PriceList']:
-                price_item = json.loads(response['PriceList'][0])
-                on_demand = price_item['terms']['OnDemand']
-                price_dimensions = list(on_demand.values())[0]['priceDimensions']
-                price_per_hour = float(list(price_dimensions.values())[0]['pricePerUnit']['USD'])
-                return price_per_hour
-            
-            return None
-            
-        except Exception as e:
-            print(f"Error fetching EC2 pricing for {instance_type}: {e}")
-            return None
+        return self.get_price(PriceKey('ec2', self.target_region, instance_type))
     
-    @lru_cache(maxsize=100)
     def get_rds_pricing(self, instance_type: str, engine: str = "MySQL") -> Optional[float]:
         """
         Get RDS instance pricing per hour
@@ -96,48 +313,8 @@ class AWSPricingClient:
         Returns:
             Price per hour in USD, or None if not found
         """
-        try:
-            response = self.pricing_client.get_products(
-                ServiceCode='AmazonRDS',
-                Filters=[
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'instanceType',
-                        'Value': instance_type
-                    },
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'location',
-                        'Value': self._get_region_name(self.target_region)
-                    },
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'databaseEngine',
-                        'Value': engine
-                    },
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'deploymentOption',
-                        'Value': 'Single-AZ'
-                    }
-                ],
-                MaxResults=1
-            )
-            
-            if response['PriceList']:
-                price_item = json.loads(response['PriceList'][0])
-                on_demand = price_item['terms']['OnDemand']
-                price_dimensions = list(on_demand.values())[0]['priceDimensions']
-                price_per_hour = float(list(price_dimensions.values())[0]['pricePerUnit']['USD'])
-                return price_per_hour
-            
-            return None
-            
-        except Exception as e:
-            print(f"Error fetching RDS pricing for {instance_type}: {e}")
-            return None
+        return self.get_price(PriceKey('rds', self.target_region, instance_type, engine))
     
-    @lru_cache(maxsize=50)
     def get_lambda_pricing(self) -> Dict[str, float]:
         """
         Get Lambda pricing (requests and compute duration)
@@ -145,92 +322,156 @@ class AWSPricingClient:
         Returns:
             Dictionary with 'per_request' and 'per_gb_second' pricing
         """
-        try:
-            response = self.pricing_client.get_products(
-                ServiceCode='AWSLambda',
-                Filters=[
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'location',
-                        'Value': self._get_region_name(self.target_region)
-                    },
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'group',
-                        'Value': 'AWS-Lambda-Requests'
-                    }
-                ],
-                MaxResults=1
-            )
-            
-            per_request = 0.0000002  # Default fallback
-            
-            if response['PriceList']:
-                price_item = json.loads(response['PriceList'][0])
-                on_demand = price_item['terms']['OnDemand']
-                price_dimensions = list(on_demand.values())[0]['priceDimensions']
-                per_request = float(list(price_dimensions.values())[0]['pricePerUnit']['USD'])
-            
-            # Lambda compute pricing (per GB-second)
-            response = self.pricing_client.get_products(
-                ServiceCode='AWSLambda',
-                Filters=[
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'location',
-                        'Value': self._get_region_name(self.target_region)
-                    },
-                    {
-                        'Type': 'TERM_MATCH',
-                        'Field': 'group',
-                        'Value': 'AWS-Lambda-Duration'
-                    }
-                ],
-                MaxResults=1
-            )
-            
-            per_gb_second = 0.0000166667  # Default fallback
-            
-            if response['PriceList']:
-                price_item = json.loads(response['PriceList'][0])
-                on_demand = price_item['terms']['OnDemand']
-                price_dimensions = list(on_demand.values())[0]['priceDimensions']
-                per_gb_second = float(list(price_dimensions.values())[0]['pricePerUnit']['USD'])
-            
-            return {
-                'per_request': per_request,
-                'per_gb_second': per_gb_second
-            }
+        per_request = self.get_price(PriceKey('lambda', self.target_region, 'requests'))
+        per_gb_second = self.get_price(PriceKey('lambda', self.target_region, 'duration'))
+        
+        return {
+            'per_request': (
+                per_request if per_request is not None
+                else LAMBDA_FALLBACK_PRICING['per_request']
+            ),
+            'per_gb_second': (
+                per_gb_second if per_gb_second is not None
+                else LAMBDA_FALLBACK_PRICING['per_gb_second']
+            ),
+        }
+    
+    def get_price(self, key: PriceKey, refresh: bool = False) -> Optional[float]:
+        """
+        Get a unit price, served from the cache when fresh
+        
+        Failed lookups are cached too, but only for the cache's short
+        negative TTL, so they're retried soon after a transient error.
+        
+        Args:
+            key: Price to look up
+            refresh: Bypass the cache and fetch a fresh price
             
-        except Exception as e:
-            print(f"Error fetching Lambda pricing: {e}")
-            return {
-                'per_request': 0.0000002,
-                'per_gb_second': 0.0000166667
-            }
+        Returns:
+            Price per unit in USD, or None if not found
+        """
+        return self.cache.get_or_load(key, lambda: self._fetch_price(key), refresh=refresh)
     
-    def _get_region_name(self, region_code: str) -> str:
+    def get_prices(
+        self,
+        keys: List[PriceKey],
+        refresh: bool = False
+    ) -> Dict[PriceKey, Optional[float]]:
         """
-        Convert region code to AWS Pricing API region name
+        Get several unit prices
+        
+        Uncached prices are grouped by service, region and engine; groups
+        of at least `batch_min_keys` are fetched with one paginated query
+        each, the rest one lookup after another.
         
         Args:
-            region_code: AWS region code (e.g., 'us-east-1')
+            keys: Prices to look up
+            refresh: Bypass the cache and fetch fresh prices
             
         Returns:
-            Region name for Pricing API (e.g., 'US East (N. Virginia)')
+            Mapping of key to price, None where not found
         """
-        region_map = {
-            'us-east-1': 'US East (N. Virginia)',
-            'us-east-2': 'US East (Ohio)',
-            'us-west-1': 'US West (N. California)',
-            'us-west-2': 'US West (Oregon)',
-            'eu-west-1': 'EU (Ireland)',
-            'eu-central-1': 'EU (Frankfurt)',
-            'ap-southeast-1': 'Asia Pacific (Singapore)',
-            'ap-southeast-2': 'Asia Pacific (Sydney)',
-            'ap-northeast-1': 'Asia Pacific (Tokyo)',
+        keys = list(dict.fromkeys(keys))
+        pending = keys if refresh else [key for key in keys if key not in self.cache]
+        _, batches = plan_batches(pending, self.batch_min_keys)
+        
+        batched = set()
+        for group in batches:
+            for key, price in self._fetch_batch(group).items():
+                self.cache.store_loaded(key, price, refresh)
+            batched.update(group)
+        
+        return {
+            key: self.get_price(key, refresh=refresh and key not in batched)
+            for key in keys
         }
-        return region_map.get(region_code, 'US East (N. Virginia)')
+    
+    def _fetch_batch(self, keys: List[PriceKey]) -> Dict[PriceKey, Optional[float]]:
+        """Fetch prices sharing a service, region and engine (uncached)"""
+        prices: Dict[PriceKey, Optional[float]] = {}
+        if self.price_store is not None:
+            for key in keys:
+                price = self.price_store.get_price(key)
+                if price is not None:
+                    prices[key] = price
+        remaining = [key for key in keys if key not in prices]
+        if not remaining or self.offline:
+            return {key: prices.get(key) for key in keys}
+        if len(remaining) < self.batch_min_keys:
+            prices.update((key, self._fetch_price(key)) for key in remaining)
+            return prices
+        
+        service_code, filters = build_batch_query(
+            remaining[0], self._get_region_name(remaining[0].region)
+        )
+        
+        with PRICING_API_SECONDS.time(
+            client='sync', service=remaining[0].service, outcome='error'
+        ) as call:
+            try:
+                found = parse_price_list(
+                    self._iter_price_list(service_code, filters), remaining[0], remaining
+                )
+                call['outcome'] = 'ok' if found else 'not_found'
+            except Exception as e:
+                label = SERVICE_LABELS.get(remaining[0].service, remaining[0].service)
+                logger.warning("Error fetching %s pricing for %d SKUs: %s", label, len(remaining), e)
+                found = {}
+        
+        prices.update((key, found.get(key)) for key in remaining)
+        return prices
+    
+    def _iter_price_list(self, service_code: str, filters: List[Dict[str, str]]) -> Iterator[str]:
+        """Every PriceList document matching the filters, page by page"""
+        request = {
+            'ServiceCode': service_code,
+            'Filters': filters,
+            'MaxResults': PRODUCTS_PAGE_SIZE,
+        }
+        while True:
+            response = self.pricing_client.get_products(**request)
+            yield from response['PriceList']
+            if not response.get('NextToken'):
+                return
+            request['NextToken'] = response['NextToken']
+    
+    def _fetch_price(self, key: PriceKey) -> Optional[float]:
+        """Fetch a single unit price from the local store or Pricing API (uncached)"""
+        if self.price_store is not None:
+            price = self.price_store.get_price(key)
+            if price is not None:
+                return price
+        if self.offline:
+            return None
+        
+        service_code, filters = build_product_query(
+            key, self._get_region_name(key.region)
+        )
+        
+        with PRICING_API_SECONDS.time(client='sync', service=key.service, outcome='error') as call:
+            try:
+                response = self.pricing_client.get_products(
+                    ServiceCode=service_code,
+                    Filters=filters,
+                    MaxResults=1
+                )
+                
+                if response['PriceList']:
+                    price = parse_on_demand_price(response['PriceList'][0])
+                    call['outcome'] = 'ok'
+                    return price
+                
+                call['outcome'] = 'not_found'
+                return None
+                
+            except Exception as e:
+                label = SERVICE_LABELS.get(key.service, key.service)
+                logger.warning("Error fetching %s pricing for %s: %s", label, key.sku, e)
+                return None
+    
+    def _get_region_name(self, region_code: str) -> str:
+        """Convert region code to AWS Pricing API region name"""
+        return get_region_name(region_code)
 
 
 def calculate_monthly_cost(hourly_price: float, hours_per_month: int = 730) -> float:
@@ -251,7 +492,8 @@ def calculate_lambda_cost(
     requests: int,
     avg_duration_ms: int,
     memory_mb: int,
-    pricing: Dict[str, float]
+    pricing: Dict[str, float],
+    apply_free_tier: bool = False
 ) -> float:
     """
     Calculate Lambda cost based on usage
@@ -261,18 +503,24 @@ def calculate_lambda_cost(
         avg_duration_ms: Average duration in milliseconds
         memory_mb: Memory allocation in MB
         pricing: Lambda pricing dictionary from get_lambda_pricing()
+        apply_free_tier: Deduct the monthly free tier (1M requests +
+            400,000 GB-seconds). The allowance is per account, so only
+            use this for a function that has the account to itself;
+            TemplateRegistry shares it across a whole plan.
         
     Returns:
         Total cost
     """
+    gb_seconds = (memory_mb / 1024) * (avg_duration_ms / 1000) * requests
+    
+    if apply_free_tier:
+        requests = max(0, requests - LAMBDA_FREE_TIER['requests'])
+        gb_seconds = max(0.0, gb_seconds - LAMBDA_FREE_TIER['gb_seconds'])
+    
     # Request cost
     request_cost = requests * pricing['per_request']
     
     # Compute cost
-    gb_seconds = (memory_mb / 1024) * (avg_duration_ms / 1000) * requests
     compute_cost = gb_seconds * pricing['per_gb_second']
     
-    # Free tier: 1M requests + 400,000 GB-seconds per month
-    # For simplicity, we're not accounting for free tier here
-    
     return request_cost + compute_cost
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""
+Budget index over priced templates
+Answers "what fits in this budget" with one bisect instead of scanning
+every template
+"""
+
+from bisect import bisect_right, insort
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.json_encoding import dumps, encode_object
+
+
+class BudgetSplit(NamedTuple):
+    """
+    Templates partitioned by a budget
+
+    Attributes:
+        affordable: Templates costing at most the budget, cheapest first
+        expensive: Templates costing more than the budget, cheapest first
+        cheapest: Cost of the cheapest affordable template (0 if none)
+        most_expensive_affordable: Cost of the priciest affordable template (0 if none)
+    """
+    affordable: Tuple[BaseModel, ...]
+    expensive: Tuple[BaseModel, ...]
+    cheapest: float
+    most_expensive_affordable: float
+
+
+@dataclass(frozen=True)
+class BudgetIndex:
+    """
+    Templates sorted by total cost
+
+    Attributes:
+        costs: Total costs, ascending
+        templates: Templates in the same order (ties keep catalog order)
+        fragments: Pre-encoded JSON of each template, in the same order
+            (empty if none were supplied)
+        order: Catalog position of each template, in the same order
+    """
+    costs: Tuple[float, ...] = ()
+    templates: Tuple[BaseModel, ...] = ()
+    fragments: Tuple[bytes, ...] = ()
+    order: Tuple[int, ...] = ()
+
+    @classmethod
+    def build(
+        cls,
+        templates: Sequence[BaseModel],
+        fragments: Optional[Sequence[bytes]] = None,
+    ) -> "BudgetIndex":
+        """
+        Index templates by their `total_cost`
+
+        Args:
+            templates: Templates, in catalog order
+            fragments: Pre-encoded JSON of each template, in catalog order
+        """
+        order = sorted(range(len(templates)), key=lambda i: templates[i].total_cost)
+        return cls._from_order(templates, fragments, order)
+
+    @classmethod
+    def _from_order(
+        cls,
+        templates: Sequence[BaseModel],
+        fragments: Optional[Sequence[bytes]],
+        order: Sequence[int],
+    ) -> "BudgetIndex":
+        return cls(
+            costs=tuple(templates[i].total_cost for i in order),
+            templates=tuple(templates[i] for i in order),
+            fragments=tuple(fragments[i] for i in order) if fragments is not None else (),
+            order=tuple(order),
+        )
+
+    def updated(
+        self,
+        templates: Sequence[BaseModel],
+        fragments: Optional[Sequence[bytes]],
+        changed: Sequence[int],
+    ) -> "BudgetIndex":
+        """
+        Re-index after the templates at some catalog positions changed
+
+        The rest keep their relative order, so only the changed templates
+        are re-inserted instead of sorting the whole catalog again.
+
+        Args:
+            templates: Templates, in catalog order (same length as before)
+            fragments: Pre-encoded JSON of each template, in catalog order
+            changed: Catalog positions of the templates that changed
+        """
+        if len(self.order) != len(templates):
+            return self.build(templates, fragments)
+        if not changed:
+            return self
+
+        changed_set = set(changed)
+        # (cost, catalog position) sorts exactly like build()'s stable sort
+        keys = [(cost, i) for cost, i in zip(self.costs, self.order) if i not in changed_set]
+        for i in changed_set:
+            insort(keys, (templates[i].total_cost, i))
+        return self._from_order(templates, fragments, [i for _, i in keys])
+
+    def count_within(self, budget: float) -> int:
+        """Number of templates costing at most `budget`"""
+        return bisect_right(self.costs, budget)
+
+    def count_within_many(self, budgets: Sequence[float]) -> np.ndarray:
+        """count_within() for many budgets in one vectorized search"""
+        return np.searchsorted(
+            np.asarray(self.costs, dtype=np.float64),
+            np.asarray(budgets, dtype=np.float64),
+            side="right",
+        )
+
+    def split(self, budget: float) -> BudgetSplit:
+        """Partition the templates by a budget"""
+        count = self.count_within(budget)
+        return BudgetSplit(
+            affordable=self.templates[:count],
+            expensive=self.templates[count:],
+            cheapest=self.costs[0] if count else 0,
+            most_expensive_affordable=self.costs[count - 1] if count else 0,
+        )
+
+
+@dataclass(frozen=True)
+class BudgetAnswerTable:
+    """
+    Pre-serialized budget query responses
+
+    The answer only changes where the budget crosses a template's cost, so
+    every piece of the response that depends on the interval is encoded
+    up front. The template lists are slices of one shared buffer (all
+    fragments in cost order, comma-separated), so the table stays O(n) in
+    size rather than holding a full body per interval.
+
+    Attributes:
+        costs: Breakpoints (the index's sorted costs)
+        buffer: Every template's JSON in cost order, joined with commas
+        splits: Per affordable count k, (end of the affordable slice,
+            start of the expensive slice) in `buffer`
+        heads: Per k, the bytes between the budget and the affordable list
+        stats: Per k, the bytes between the expensive list and the
+            remaining budget
+        most_expensive: Per k, the priciest affordable cost (0 if none)
+        tail: Everything after the remaining budget
+    """
+    costs: Tuple[float, ...]
+    buffer: bytes
+    splits: Tuple[Tuple[int, int], ...]
+    heads: Tuple[bytes, ...]
+    stats: Tuple[bytes, ...]
+    most_expensive: Tuple[float, ...]
+    tail: bytes
+
+    @classmethod
+    def build(cls, index: BudgetIndex, trailer: Optional[Dict[str, Any]] = None) -> "BudgetAnswerTable":
+        """
+        Encode the answer for every breakpoint interval
+
+        Args:
+            index: Budget index with pre-encoded fragments
+            trailer: Fields appended after the stats (e.g. pricing source)
+        """
+        buffer = b",".join(index.fragments)
+        ends = list(accumulate(len(fragment) + 1 for fragment in index.fragments))
+
+        splits, heads, stats, most_expensive = [], [], [], []
+        for count in range(len(index.fragments) + 1):
+            start = ends[count - 1] if count else 0
+            splits.append((max(start - 1, 0), start))
+            heads.append(
+                b',"affordable_count":' + dumps(count) + b',"affordable_projects":['
+            )
+            cheapest = index.costs[0] if count else 0
+            stats.append(
+                b'],"stats":{"cheapest":' + dumps(cheapest) + b',"remaining_budget":'
+            )
+            most_expensive.append(index.costs[count - 1] if count else 0)
+
+        tail = b"}"
+        if trailer:
+            tail += b"," + encode_object(trailer)[1:-1]
+        return cls(
+            costs=index.costs,
+            buffer=buffer,
+            splits=tuple(splits),
+            heads=tuple(heads),
+            stats=tuple(stats),
+            most_expensive=tuple(most_expensive),
+            tail=tail + b"}",
+        )
+
+    def render(self, budget: float) -> bytes:
+        """The response body for a budget: one bisect and one join"""
+        count = bisect_right(self.costs, budget)
+        affordable_end, expensive_start = self.splits[count]
+        view = memoryview(self.buffer)
+        return b"".join((
+            b'{"budget":',
+            dumps(budget),
+            self.heads[count],
+            view[:affordable_end],
+            b'],"expensive_projects":[',
+            view[expensive_start:],
+            self.stats[count],
+            dumps(budget - self.most_expensive[count]),
+            self.tail,
+        ))
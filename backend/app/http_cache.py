@@ -0,0 +1,82 @@
+"""
+Conditional GET support for snapshot-backed endpoints
+Lets browsers, CDNs and reverse proxies revalidate with a 304 instead of
+downloading the same body again until prices change
+"""
+
+import os
+from typing import Any, Callable
+
+from fastapi import Request, Response
+
+from app.snapshot import TemplateSnapshot
+
+DEFAULT_MAX_AGE_SECONDS = 60
+DEFAULT_STALE_WHILE_REVALIDATE_SECONDS = 300
+
+
+def cache_control() -> str:
+    """
+    Cache-Control for snapshot-backed responses
+
+    Shared caches may serve a response for HTTP_CACHE_MAX_AGE_SECONDS
+    (default 60), then keep serving it while they revalidate for up to
+    HTTP_CACHE_STALE_SECONDS more (default 300).
+    """
+    max_age = int(os.environ.get("HTTP_CACHE_MAX_AGE_SECONDS", DEFAULT_MAX_AGE_SECONDS))
+    stale = int(os.environ.get("HTTP_CACHE_STALE_SECONDS", DEFAULT_STALE_WHILE_REVALIDATE_SECONDS))
+    return f"public, max-age={max_age}, stale-while-revalidate={stale}"
+
+
+def snapshot_etag(snapshot: TemplateSnapshot, *variant: Any) -> str:
+    """
+    Strong ETag for a response built from a snapshot
+
+    Args:
+        snapshot: Snapshot the response is built from
+        variant: Anything else the body depends on (e.g. the budget)
+
+    Returns:
+        Quoted entity tag
+    """
+    tag = snapshot.fingerprint[:20]
+    if variant:
+        tag += "-" + "-".join(str(part) for part in variant)
+    return f'"{tag}"'
+
+
+def budget_key(budget: float) -> str:
+    """
+    Budget normalized to cents, so 10, 10.0 and 10.00 share an ETag
+
+    Responses keyed on it must be built from float(budget_key(budget)),
+    or two budgets sharing an ETag could have different bodies.
+    """
+    return f"{budget:.2f}"
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match covers `etag` (weak comparison, per RFC 9110)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in header.split(","))
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def conditional_response(
+    request: Request,
+    etag: str,
+    build_body: Callable[[], bytes],
+) -> Response:
+    """
+    304 if the client already has this representation, else the JSON body
+
+    `build_body` is only called on a cache miss.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control()}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=build_body(), media_type="application/json", headers=headers)
@@ -0,0 +1,54 @@
+"""
+Fast JSON encoding for pre-serialized responses
+Templates are encoded once per snapshot; responses are assembled from
+those bytes instead of running jsonable_encoder on every request
+"""
+
+import json
+from typing import Any, Dict, Iterable
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # Standard library fallback, same output modulo whitespace
+    orjson = None
+
+
+class RawJSON(bytes):
+    """Already-encoded JSON, embedded verbatim by encode_object()"""
+
+
+def dumps(value: Any) -> bytes:
+    """Encode a plain JSON value (dict, list, str, number, bool, None)"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def encode_model(model: BaseModel) -> RawJSON:
+    """Encode a Pydantic model"""
+    return RawJSON(dumps(model.model_dump(mode="json")))
+
+
+def join_array(fragments: Iterable[bytes]) -> RawJSON:
+    """JSON array of already-encoded elements"""
+    return RawJSON(b"[" + b",".join(fragments) + b"]")
+
+
+def encode_object(fields: Dict[str, Any]) -> bytes:
+    """
+    Encode a JSON object whose values may be RawJSON fragments
+
+    Args:
+        fields: Keys and values; RawJSON values are copied as-is, anything
+            else goes through dumps()
+
+    Returns:
+        UTF-8 JSON bytes
+    """
+    members = [
+        dumps(key) + b":" + (value if isinstance(value, RawJSON) else dumps(value))
+        for key, value in fields.items()
+    ]
+    return b"{" + b",".join(members) + b"}"
@@ -2,14 +2,76 @@
 FastAPI backend for AWS Budget Planner
 """
 
-from fastapi import FastAPI, Query
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.projects import get_projects_by_budget, get_live_project_templates
+from app.cost_engine import (
+    ForecastRequest,
+    LambdaBatchRequest,
+    evaluate_lambda_batch,
+    forecast_costs,
+    lambda_pricing_from,
+)
+from app.aws_pricing import REGION_NAMES
+from app.http_cache import budget_key, conditional_response, snapshot_etag
+from app.json_encoding import dumps
+from app.metrics import CONTENT_TYPE, HTTP_REQUEST_SECONDS, REGISTRY
+from app.optimizer import PackingRequest, optimize_projects
+from app.profiler import (
+    DEFAULT_INTERVAL_SECONDS,
+    MAX_DURATION_SECONDS,
+    ProfilerBusy,
+    collapsed,
+    profiler_enabled,
+    sample_stacks,
+)
+from app.projects import (
+    DEFAULT_REGION,
+    FREE_TIER_NEW_ACCOUNT,
+    BudgetBatchRequest,
+    build_region_matrix,
+    close_async_pricing_client,
+    encode_all_projects,
+    encode_budget_batch,
+    encode_projects_by_budget,
+    find_cheapest_region,
+    get_region_snapshots_async,
+    get_template_snapshot_async,
+    pricing_cache,
+    seed_template_snapshot,
+    template_registry,
+    template_store,
+)
+from app.refresher import PricingRefresher
+from app.snapshot import record_served_snapshots
+from app.usage_report import compare_spend, get_usage_store
+
+# Library loggers stay at WARNING; ours default to INFO (override with LOG_LEVEL)
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger("app").setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Serve fallback pricing immediately and refresh live prices in the background"""
+    seed_template_snapshot()
+    refresher = PricingRefresher.from_env(template_store)
+    refresher.start()
+    yield
+    await refresher.stop()
+    await close_async_pricing_client()
+
 
 app = FastAPI(
     title="AWS Budget Planner API",
     description="API for calculating AWS project costs within budget",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Enable CORS so your React frontend can call this API
@@ -19,9 +81,65 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "ETag",
+        "X-Pricing-Snapshot-Version",
+        "X-Pricing-Snapshot-Age",
+        "X-Pricing-Refreshing",
+    ],
 )
 
 
+@app.middleware("http")
+async def add_snapshot_headers(request: Request, call_next):
+    """
+    Report which pricing snapshots served the request and how old they are,
+    and time the request for /metrics
+    
+    The headers describe the snapshots the handler actually used (one per
+    region for multi-region requests: versions comma-separated in request
+    order, the oldest age), and are left out when it used none.
+    
+    One middleware for both, since every BaseHTTPMiddleware layer adds
+    its own per-request overhead.
+    """
+    started = time.perf_counter()
+    status = 500
+    try:
+        with record_served_snapshots() as served:
+            response = await call_next(request)
+        status = response.status_code
+        if served and request.url.path.startswith("/api/"):
+            snapshots = list({id(snapshot): snapshot for _, snapshot in served}.values())
+            versions = ",".join(str(snapshot.version) for snapshot in snapshots)
+            age = max(snapshot.age_seconds for snapshot in snapshots)
+            refreshing = any(store.refreshing for store, _ in served)
+            response.headers["X-Pricing-Snapshot-Version"] = versions
+            response.headers["X-Pricing-Snapshot-Age"] = f"{age:.0f}"
+            response.headers["X-Pricing-Refreshing"] = "true" if refreshing else "false"
+        return response
+    finally:
+        # Labelled by route template, not raw path, to bound cardinality
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route_paths().get(request.scope.get("endpoint"), "unmatched"),
+            status=str(status),
+        )
+
+
+_route_paths: dict = {}
+
+
+def route_paths() -> dict:
+    """Endpoint function -> route path template"""
+    if not _route_paths:
+        _route_paths.update(
+            (route.endpoint, route.path) for route in app.routes if hasattr(route, "endpoint")
+        )
+    return _route_paths
+
+
 @app.get("/")
 def read_root():
     """Health check endpoint"""
@@ -33,7 +151,8 @@ def read_root():
 
 
 @app.get("/api/projects")
-def get_projects(
+async def get_projects(
+    request: Request,
     budget: float = Query(
         default=10.0,
         ge=1.0,
@@ -44,48 +163,336 @@ def get_projects(
     """
     Get project templates filtered by budget
     
+    Supports conditional GET: the ETag changes only when prices (or the
+    budget) do, so repeat requests get a 304.
+    
     Args:
-        budget: Monthly budget in USD (default: $10)
+        budget: Monthly budget in USD (default: $10), rounded to cents
         
     Returns:
         Projects within budget and statistics
     """
-    return get_projects_by_budget(budget)
+    snapshot = await get_template_snapshot_async()
+    # The ETag is per cent, so the body must be too: answer for the
+    # budget the ETag names, not the raw query value
+    key = budget_key(budget)
+    return conditional_response(
+        request,
+        snapshot_etag(snapshot, key),
+        lambda: encode_projects_by_budget(float(key), snapshot=snapshot),
+    )
 
 
 @app.get("/api/projects/all")
-def get_all_projects():
+async def get_all_projects(request: Request):
     """
     Get all available project templates with live pricing
     
     Returns:
         List of all project templates
     """
-    from app.projects import get_live_project_templates
+    snapshot = await get_template_snapshot_async()
     
-    projects = get_live_project_templates()
-    pricing_source = projects[0].pricing_source if projects else "unknown"
+    return conditional_response(
+        request,
+        snapshot_etag(snapshot),
+        lambda: encode_all_projects(snapshot),
+    )
+
+
+def validate_regions(codes: List[str]) -> List[str]:
+    """De-duplicate region codes, rejecting unsupported ones with a 400"""
+    codes = list(dict.fromkeys(code.strip() for code in codes if code.strip()))
+    unknown = [code for code in codes if code not in REGION_NAMES]
+    if unknown or not codes:
+        raise HTTPException(status_code=400, detail=f"Unsupported regions: {', '.join(unknown)}")
+    return codes
+
+
+def parse_regions(regions: Optional[str]) -> List[str]:
+    """Split a comma-separated region list (default: every supported region)"""
+    if not regions:
+        return list(REGION_NAMES)
+    return validate_regions(regions.split(","))
+
+
+@app.post("/api/projects/batch")
+async def get_projects_for_budgets(batch: BudgetBatchRequest):
+    """
+    Answer many budget queries in one request
     
-    return {
-        "count": len(projects),
-        "projects": projects,
-        "pricing_source": pricing_source,
-    }
+    Args:
+        batch: Budgets to evaluate, and optionally regions (default: us-east-1)
+        
+    Returns:
+        Per region: the projects (cheapest first) and, for each budget,
+        the affordable/expensive project ids and stats
+    """
+    regions = validate_regions(batch.regions) if batch.regions else [DEFAULT_REGION]
+    snapshots = await get_region_snapshots_async(regions)
+    return Response(
+        content=encode_budget_batch(batch.budgets, regions, snapshots),
+        media_type="application/json",
+    )
+
+
+@app.get("/api/projects/regions")
+async def get_region_matrix(
+    regions: Optional[str] = Query(
+        default=None,
+        description="Comma-separated region codes (default: all supported regions)"
+    ),
+    budget: Optional[float] = Query(
+        default=None,
+        ge=1.0,
+        le=10000.0,
+        description="Also count affordable projects per region"
+    )
+):
+    """
+    Price every project template in every region
+    
+    Args:
+        regions: Regions to compare
+        budget: Optional monthly budget in USD
+        
+    Returns:
+        Region-by-project cost matrix and the cheapest region per project
+    """
+    codes = parse_regions(regions)
+    snapshots = await get_region_snapshots_async(codes)
+    return build_region_matrix(codes, snapshots, budget)
+
+
+@app.get("/api/projects/cheapest-region")
+async def get_cheapest_region(
+    budget: float = Query(
+        default=10.0,
+        ge=1.0,
+        le=10000.0,
+        description="Monthly budget in USD"
+    ),
+    regions: Optional[str] = Query(
+        default=None,
+        description="Comma-separated region codes (default: all supported regions)"
+    )
+):
+    """
+    Find the region where a budget covers the most projects
+    
+    Args:
+        budget: Monthly budget in USD (default: $10)
+        regions: Regions to compare
+        
+    Returns:
+        Projects within budget in the best region, plus how the others compare
+    """
+    codes = parse_regions(regions)
+    snapshots = await get_region_snapshots_async(codes)
+    return find_cheapest_region(budget, codes, snapshots)
+
+
+@app.post("/api/projects/optimize")
+async def optimize_project_mix(request: PackingRequest):
+    """
+    Find the best combinations of projects to run together within a budget
+    
+    Shared components (e.g. a Route53 hosted zone) are paid for once.
+    
+    Args:
+        request: Budget, objective and number of combinations to return
+        
+    Returns:
+        Top combinations with their combined cost and shared savings
+    """
+    snapshot = await get_template_snapshot_async()
+    
+    result = optimize_projects(request, snapshot.templates)
+    result["pricing_source"] = snapshot.pricing_source
+    return result
+
+
+@app.post("/api/projects/forecast")
+async def forecast_project_cost(request: ForecastRequest):
+    """
+    Forecast a project's monthly cost when usage is uncertain
+    
+    Runs a vectorized Monte Carlo simulation: traffic (and optionally
+    run time) is drawn from the given distributions for every sample.
+    
+    Args:
+        request: Project, budget, traffic/duration distributions and
+            number of samples
+        
+    Returns:
+        Cost percentiles, mean, probability of going over budget and a
+        histogram, next to the project's point estimate
+    """
+    region = validate_regions([request.region])[0] if request.region else DEFAULT_REGION
+    index = next(
+        (i for i, spec in enumerate(template_registry.templates) if spec.id == request.project_id),
+        None,
+    )
+    if index is None:
+        raise HTTPException(status_code=404, detail=f"Unknown project: {request.project_id}")
+    
+    snapshot = (await get_region_snapshots_async([region]))[0]
+    # ~10 ms at the default sample count, but up to ~100 ms at the cap:
+    # keep it off the event loop
+    result = await asyncio.to_thread(
+        forecast_costs,
+        request, template_registry, index, snapshot.prices, region, FREE_TIER_NEW_ACCOUNT,
+    )
+    result["project"] = snapshot.templates[index].name
+    result["estimated_cost"] = snapshot.templates[index].total_cost
+    result["region"] = region
+    result["pricing_source"] = snapshot.pricing_source
+    return result
+
+
+@app.post("/api/costs/lambda")
+async def batch_lambda_costs(batch: LambdaBatchRequest):
+    """
+    Price many Lambda usage scenarios in one vectorized call
+    
+    Args:
+        batch: Columnar requests / duration / memory scenarios, optionally
+            expanded to a full grid, with an optional budget
+        
+    Returns:
+        Cost of every scenario (and the most requests each can afford)
+    """
+    snapshot = await get_template_snapshot_async()
+    pricing = lambda_pricing_from(snapshot.prices, DEFAULT_REGION)
+    
+    # Large sweeps take a while to price and encode: keep them off the
+    # event loop, and skip jsonable_encoder's per-element walk
+    def price_and_encode() -> bytes:
+        result = evaluate_lambda_batch(batch, pricing)
+        result["pricing_source"] = snapshot.pricing_source
+        return dumps(result)
+    
+    return Response(content=await asyncio.to_thread(price_and_encode), media_type="application/json")
+
+
+@app.get("/api/spend")
+async def get_actual_spend(
+    month: Optional[str] = Query(
+        default=None,
+        pattern=r"^\d{4}-\d{2}$",
+        description="Billing month as YYYY-MM (default: latest ingested)"
+    ),
+    projects: Optional[str] = Query(
+        default=None,
+        description="Comma-separated ids of the projects you run (default: all)"
+    ),
+    budget: Optional[float] = Query(
+        default=None,
+        ge=1.0,
+        le=10000.0,
+        description="Monthly budget in USD"
+    )
+):
+    """
+    Compare actual spend from the Cost and Usage Report with the estimates
+    
+    Needs CUR_STATE_PATH pointing at a store built by
+    `python -m app.usage_report`.
+    
+    Args:
+        month: Billing month
+        projects: Projects running in the account
+        budget: Optional monthly budget in USD
+        
+    Returns:
+        Planned vs actual spend per service, per project and in total, with
+        credits, refunds and tax listed apart
+    """
+    # SQLite reads block: run them in the threadpool, not on the event loop
+    store = await asyncio.to_thread(get_usage_store)
+    months = await asyncio.to_thread(store.months) if store is not None else []
+    if not months:
+        raise HTTPException(status_code=404, detail="No Cost and Usage Report data ingested")
+    month = month or months[-1]
+    if month not in months:
+        raise HTTPException(status_code=404, detail=f"No spend recorded for {month}")
+
+    snapshot = await get_template_snapshot_async()
+    templates = list(snapshot.templates)
+    if projects:
+        by_id = {template.id: template for template in templates}
+        try:
+            ids = list(dict.fromkeys(int(value) for value in projects.split(",") if value.strip()))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Project ids must be integers")
+        unknown = [str(project_id) for project_id in ids if project_id not in by_id]
+        if unknown or not ids:
+            raise HTTPException(status_code=400, detail=f"Unknown projects: {', '.join(unknown)}")
+        templates = [by_id[project_id] for project_id in ids]
+
+    def read_spend():
+        return store.monthly_spend(month), store.monthly_adjustments(month), store.summary()
+
+    actual, adjustments, ingested = await asyncio.to_thread(read_spend)
+    result = compare_spend(templates, actual, budget, adjustments)
+    result["month"] = month
+    result["months_available"] = months
+    result["ingested"] = ingested
+    result["pricing_source"] = snapshot.pricing_source
+    return result
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: pricing calls, cache, fallbacks, snapshot age, request timing"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/debug/profile")
+async def profile(
+    seconds: float = Query(default=5.0, gt=0, le=MAX_DURATION_SECONDS),
+    interval_ms: float = Query(default=DEFAULT_INTERVAL_SECONDS * 1000, ge=1.0, le=1000.0),
+):
+    """
+    Sample the server's stacks for a while (only with PROFILER_ENABLED=1)
+    
+    Returns:
+        Collapsed stacks for flamegraph.pl or speedscope
+    """
+    if not profiler_enabled():
+        raise HTTPException(status_code=404, detail="Not Found")
+    try:
+        counts = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(content=collapsed(counts), media_type="text/plain")
 
 
 @app.get("/api/health")
-def health_check():
+async def health_check():
     """Detailed health check"""
-    projects = get_live_project_templates()
+    snapshot = await get_template_snapshot_async()
     
     return {
         "status": "healthy",
-        "projects_loaded": len(projects),
-        "pricing_source": projects[0].pricing_source if projects else "unknown",
+        "projects_loaded": len(snapshot.templates),
+        "pricing_source": snapshot.pricing_source,
+        "snapshot_version": snapshot.version,
+        "snapshot_age_seconds": round(snapshot.age_seconds, 1),
+        "refresh_in_progress": template_store.refreshing,
+        "pricing_cache": pricing_cache.stats(),
         "endpoints": [
             "GET /",
             "GET /api/projects?budget=10",
             "GET /api/projects/all",
+            "POST /api/projects/batch",
+            "GET /api/projects/regions?budget=10",
+            "GET /api/projects/cheapest-region?budget=10",
+            "POST /api/projects/optimize",
+            "POST /api/projects/forecast",
+            "POST /api/costs/lambda",
+            "GET /api/spend?month=2024-05&projects=1,2",
             "GET /api/health",
+            "GET /metrics",
         ]
     }
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""
+In-process metrics in the Prometheus text format
+Counters, gauges and histograms for the pricing hot paths, rendered by
+GET /metrics (no client library needed)
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans in-process cache hits (sub-millisecond) to slow Pricing API calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Starlette appends "; charset=utf-8" to text/* media types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, per label set"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (e.g. latencies) in cumulative buckets"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts incl. +Inf, sum)
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[Dict[str, str]]:
+        """
+        Time a block; the yielded labels may be updated inside it (e.g. to
+        record the outcome)
+        """
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Counter or gauge read from a callback at scrape time
+
+    For values the app already tracks elsewhere (cache statistics,
+    snapshot age), so there's nothing to keep in sync.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        type_name: str,
+        callback: Callable[[], Iterable[Tuple[Dict[str, str], float]]],
+        labelnames: Sequence[str] = (),
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.type_name = type_name
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, self._key(labels))} {_format_value(value)}"
+            for labels, value in self.callback()
+        ]
+
+
+class Registry:
+    """Every metric exposed on /metrics, in registration order"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines += metric.header()
+            lines += metric.samples()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help_text, labelnames))
+
+
+def histogram(
+    name: str,
+    help_text: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, help_text, labelnames, buckets))
+
+
+def callback_metric(
+    name: str,
+    help_text: str,
+    type_name: str,
+    callback: Callable[[], Iterable[Tuple[Dict[str, str], float]]],
+    labelnames: Sequence[str] = (),
+) -> CallbackMetric:
+    return REGISTRY.register(CallbackMetric(name, help_text, type_name, callback, labelnames))
+
+
+# Shared metrics, recorded by the modules that own the work
+
+PRICING_API_SECONDS = histogram(
+    "pricing_api_request_seconds",
+    "Pricing API GetProducts calls (a batch counts once per page walk)",
+    ("client", "service", "outcome"),
+)
+TEMPLATE_BUILD_SECONDS = histogram(
+    "template_build_seconds",
+    "Pricing every project template from unit prices",
+    ("region",),
+)
+TEMPLATES_REPRICED = counter(
+    "templates_repriced_total",
+    "Templates rebuilt by catalog builds (ones no changed price touches are reused)",
+    ("region",),
+)
+PRICING_FALLBACKS = counter(
+    "pricing_fallbacks_total",
+    "Catalog builds that had to use fallback prices",
+    ("region",),
+)
+PRICING_REFRESH_FAILURES = counter(
+    "pricing_refresh_failures_total",
+    "Background pricing refreshes that raised",
+)
+HTTP_REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds",
+    "API request latency by route",
+    ("method", "route", "status"),
+)
@@ -0,0 +1,281 @@
+"""
+Multi-project budget packing
+Finds the combinations of project templates that fit in one budget when
+run side by side, paying for shared components (Route53, CloudWatch) once
+"""
+
+import heapq
+import math
+from bisect import bisect_right
+from itertools import accumulate, count
+from typing import Dict, List, Literal, NamedTuple, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+
+DEFAULT_TOP_K = 5
+MAX_TOP_K = 50
+
+# Search budget per request (candidate projects examined); past this the
+# best combinations found so far are returned, flagged as not proven optimal
+DEFAULT_MAX_NODES = 200_000
+
+# Costs are in cents, so anything smaller is float noise
+EPSILON = 1e-9
+
+
+class PackingRequest(BaseModel):
+    """
+    Body of the optimizer endpoint
+
+    Attributes:
+        budget: Monthly budget in USD for all projects together
+        top_k: Number of combinations to return
+        objective: "coverage" maximizes the number of projects, "value"
+            maximizes the sum of `values`
+        values: Value per template id for the "value" objective (default:
+            the template's standalone monthly cost, i.e. get the most
+            infrastructure for the budget)
+        template_ids: Only consider these templates (default: all)
+    """
+    budget: float = Field(gt=0, le=10000.0)
+    top_k: int = Field(default=DEFAULT_TOP_K, ge=1, le=MAX_TOP_K)
+    objective: Literal["coverage", "value"] = "coverage"
+    values: Dict[int, float] = Field(default_factory=dict)
+    template_ids: Optional[List[int]] = None
+
+
+class Combination(NamedTuple):
+    """
+    Projects that fit in the budget together
+
+    Attributes:
+        templates: The projects, by template id
+        value: Objective value
+        total_cost: Monthly cost with shared components counted once
+        standalone_cost: Sum of the projects' individual totals
+    """
+    templates: Tuple[BaseModel, ...]
+    value: float
+    total_cost: float
+    standalone_cost: float
+
+
+class PackingResult(NamedTuple):
+    """
+    Attributes:
+        combinations: Best combinations, best first
+        optimal: False if the search hit its node limit first
+        nodes: Candidate projects examined
+    """
+    combinations: List[Combination]
+    optimal: bool
+    nodes: int
+
+
+class _Item(NamedTuple):
+    template: BaseModel
+    value: float
+    own_cost: float
+    shared: Tuple[Tuple[str, float], ...]
+
+
+class _SearchLimitReached(Exception):
+    pass
+
+
+def shared_costs(template: BaseModel) -> Dict[str, float]:
+    """Cost of a template's shared components, by service"""
+    costs: Dict[str, float] = {}
+    for component in template.components:
+        if component.shared:
+            costs[component.service] = costs.get(component.service, 0.0) + component.cost
+    return costs
+
+
+class BudgetPacker:
+    """
+    Branch-and-bound search for the best project combinations
+
+    Projects are tried in order of value per dollar of their unshared
+    cost. A branch is cut when even the fractional-knapsack relaxation of
+    the remaining projects (shared components assumed free, which can
+    only under-estimate cost) can't beat the k-th best combination found
+    so far. Prefix sums make each bound a single bisect.
+    """
+
+    def __init__(self, templates: Sequence[BaseModel], values: Optional[Dict[int, float]] = None):
+        """
+        Args:
+            templates: Priced project templates
+            values: Value per template id (default: 1 each, i.e. maximize
+                the number of projects); templates worth 0 are skipped
+        """
+        items = []
+        for template in templates:
+            value = 1.0 if values is None else values.get(template.id, 0.0)
+            if value <= 0:
+                continue
+            shared = shared_costs(template)
+            own_cost = max(0.0, template.total_cost - sum(shared.values()))
+            items.append(_Item(template, value, own_cost, tuple(shared.items())))
+
+        items.sort(key=lambda item: -item.value / item.own_cost if item.own_cost > 0 else float("-inf"))
+        self.items = items
+        # Whole-number values (e.g. coverage) let bounds round down
+        self.integral = all(item.value.is_integer() for item in items)
+        self.prefix_cost = [0.0, *accumulate(item.own_cost for item in items)]
+        self.prefix_value = [0.0, *accumulate(item.value for item in items)]
+
+    def bound(self, start: int, capacity: float) -> float:
+        """Upper bound on the value items[start:] can add within `capacity`"""
+        limit = self.prefix_cost[start] + capacity + EPSILON
+        end = bisect_right(self.prefix_cost, limit) - 1
+        value = self.prefix_value[end] - self.prefix_value[start]
+        if end < len(self.items):
+            item = self.items[end]
+            value += (limit - self.prefix_cost[end]) / item.own_cost * item.value
+        return float(math.floor(value + EPSILON)) if self.integral else value
+
+    def solve(
+        self,
+        budget: float,
+        top_k: int = DEFAULT_TOP_K,
+        max_nodes: int = DEFAULT_MAX_NODES,
+    ) -> PackingResult:
+        """
+        Find the top-k combinations within a budget
+
+        Ties on value go to whichever combination the search finds first
+        (it explores the best value-per-dollar projects first).
+
+        Args:
+            budget: Monthly budget in USD
+            top_k: Number of combinations to return
+            max_nodes: Search node limit
+
+        Returns:
+            Best combinations, best value first (cheapest first on ties)
+        """
+        items = self.items
+        best: List[Tuple[float, float, int, Tuple[int, ...], float]] = []
+        sequence = count()
+        chosen: List[int] = []
+        shared_max: Dict[str, float] = {}
+        nodes = 0
+
+        def threshold() -> float:
+            return best[0][0] if len(best) >= top_k else float("-inf")
+
+        def record(value: float, cost: float) -> None:
+            # Heap of the k best so far, worst on top: higher value, then
+            # lower cost, then found earlier wins
+            entry = (round(value, 9), -round(cost, 9), -next(sequence), tuple(chosen), cost)
+            if len(best) < top_k:
+                heapq.heappush(best, entry)
+            elif entry > best[0]:
+                heapq.heapreplace(best, entry)
+
+        def search() -> None:
+            # Depth-first with an explicit stack: one frame per chosen project
+            # (next index to try, value, cost), so catalogs of thousands of
+            # templates can't exhaust the recursion limit
+            nonlocal nodes
+            stack = [[0, 0.0, 0.0]]
+            restores: List[List[Tuple[str, Optional[float]]]] = []
+            while stack:
+                frame = stack[-1]
+                index, value, cost = frame
+                descended = False
+                while index < len(items):
+                    nodes += 1
+                    if nodes > max_nodes:
+                        raise _SearchLimitReached
+
+                    # Bounds only shrink as `index` grows, so nothing later can win either
+                    if value + self.bound(index, budget - cost) <= threshold() + EPSILON:
+                        break
+
+                    item = items[index]
+                    marginal = item.own_cost
+                    for service, shared_cost in item.shared:
+                        marginal += max(0.0, shared_cost - shared_max.get(service, 0.0))
+                    if cost + marginal > budget + EPSILON:
+                        index += 1
+                        continue
+
+                    restores.append([(service, shared_max.get(service)) for service, _ in item.shared])
+                    for service, shared_cost in item.shared:
+                        shared_max[service] = max(shared_max.get(service, 0.0), shared_cost)
+                    chosen.append(index)
+                    frame[0] = index + 1
+                    record(value + item.value, cost + marginal)
+                    stack.append([index + 1, value + item.value, cost + marginal])
+                    descended = True
+                    break
+
+                if descended:
+                    continue
+                stack.pop()
+                if chosen:
+                    # Backtrack: un-choose the project this frame was opened for
+                    chosen.pop()
+                    for service, old in restores.pop():
+                        if old is None:
+                            del shared_max[service]
+                        else:
+                            shared_max[service] = old
+
+        optimal = True
+        try:
+            search()
+        except _SearchLimitReached:
+            optimal = False
+
+        combinations = []
+        for value, _, _, indexes, cost in sorted(best, reverse=True):
+            templates = tuple(sorted((items[i].template for i in indexes), key=lambda t: t.id))
+            combinations.append(Combination(
+                templates=templates,
+                value=value,
+                total_cost=cost,
+                standalone_cost=sum(template.total_cost for template in templates),
+            ))
+        return PackingResult(combinations, optimal, min(nodes, max_nodes))
+
+
+def optimize_projects(request: PackingRequest, templates: Sequence[BaseModel]) -> Dict:
+    """
+    Answer an optimizer request against priced templates
+
+    Returns:
+        Response body with the top combinations
+    """
+    if request.template_ids is not None:
+        wanted = set(request.template_ids)
+        templates = [template for template in templates if template.id in wanted]
+
+    values = None
+    if request.objective == "value":
+        values = {
+            template.id: request.values.get(template.id, template.total_cost)
+            for template in templates
+        }
+
+    result = BudgetPacker(templates, values).solve(request.budget, request.top_k)
+    return {
+        "budget": request.budget,
+        "objective": request.objective,
+        "optimal": result.optimal,
+        "combinations": [
+            {
+                "project_ids": [template.id for template in combination.templates],
+                "projects": combination.templates,
+                "value": round(combination.value, 2),
+                "total_cost": round(combination.total_cost, 2),
+                "standalone_cost": round(combination.standalone_cost, 2),
+                "shared_savings": round(max(0.0, combination.standalone_cost - combination.total_cost), 2),
+                "remaining_budget": round(request.budget - combination.total_cost, 2),
+            }
+            for combination in result.combinations
+        ],
+    }
@@ -0,0 +1,374 @@
+"""
+Price List document extraction
+Reads only the parts of a pricing document we use (the on-demand price,
+reserved prices, a few attributes) and streams whole offer files in
+bounded memory
+"""
+
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+_decoder = json.JSONDecoder()
+
+# Top-level-ish keys whose values we decode; everything else in a document
+# (the rest of the product block, unwanted term types) is never decoded
+_SECTION = re.compile(r'"(attributes|OnDemand|Reserved)"\s*:\s*')
+
+_LEASE_HOURS = {'1yr': 8760, '3yr': 3 * 8760}
+
+
+class ReservedPrice(NamedTuple):
+    """
+    One Reserved Instance offering
+
+    Attributes:
+        lease_length: "1yr" or "3yr"
+        purchase_option: "No Upfront", "Partial Upfront" or "All Upfront"
+        offering_class: "standard" or "convertible"
+        hourly: Recurring USD per hour
+        upfront: One-time USD fee
+    """
+    lease_length: str
+    purchase_option: str
+    offering_class: str
+    hourly: float
+    upfront: float
+
+    @property
+    def effective_hourly(self) -> float:
+        """Hourly price with the upfront fee spread over the lease"""
+        hours = _LEASE_HOURS.get(self.lease_length)
+        return self.hourly + self.upfront / hours if hours else self.hourly
+
+
+class PriceDocument(NamedTuple):
+    """
+    What we read from one Price List document
+
+    Attributes:
+        attributes: The requested product attributes that were present
+        on_demand: First-tier on-demand USD unit price (None if not listed)
+        reserved: Reserved offerings (empty unless requested)
+    """
+    attributes: Dict[str, str]
+    on_demand: Optional[float]
+    reserved: Tuple[ReservedPrice, ...] = ()
+
+
+class SavingsPlanRate(NamedTuple):
+    """
+    One usage type's rate under a Savings Plan
+
+    Attributes:
+        plan_sku: Savings Plan SKU
+        discounted_sku: On-demand SKU the rate applies to
+        usage_type: Discounted usage type (e.g. "USE1-BoxUsage:t3.micro")
+        operation: Discounted operation (e.g. "RunInstances")
+        service_code: Discounted service (e.g. "AmazonEC2")
+        unit: Rate unit (e.g. "Hrs")
+        rate: USD per unit
+    """
+    plan_sku: str
+    discounted_sku: str
+    usage_type: str
+    operation: str
+    service_code: str
+    unit: str
+    rate: float
+
+
+class JsonStream:
+    """
+    Minimal incremental JSON reader
+
+    Walks the top-level structure of an offer file while only decoding the
+    small per-SKU objects, so multi-GB files are processed in bounded memory.
+    """
+
+    _decoder = json.JSONDecoder()
+    _WHITESPACE = re.compile(r'[ \t\n\r]*')
+    _STRUCTURAL = re.compile(r'["{}\[\]]')
+    _STRING_TAIL = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+
+    def __init__(self, fh, chunk_size: int = 1 << 20):
+        self._fh = fh
+        self._chunk_size = chunk_size
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Read another chunk, dropping what's already consumed"""
+        if self._eof:
+            return False
+        data = self._fh.read(self._chunk_size)
+        if not data:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it"""
+        while True:
+            self._pos = self._WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON document, found {found!r}")
+        self._pos += 1
+
+    def decode(self):
+        """Decode the value at the cursor"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may be truncated
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def skip(self) -> None:
+        """Skip the value at the cursor without decoding it"""
+        if self.peek() not in '{[':
+            self.decode()
+            return
+
+        depth = 0
+        while True:
+            match = self._STRUCTURAL.search(self._buf, self._pos)
+            if match is None:
+                self._pos = len(self._buf)
+                if not self._fill():
+                    raise ValueError("Unexpected end of JSON document")
+                continue
+
+            char = match.group()
+            self._pos = match.end()
+            if char == '"':
+                self._skip_string_tail()
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def _skip_string_tail(self) -> None:
+        while True:
+            match = self._STRING_TAIL.match(self._buf, self._pos)
+            if match is not None:
+                self._pos = match.end()
+                return
+            if not self._fill():
+                raise ValueError("Unterminated string in JSON document")
+
+    def iter_object(self) -> Iterator[str]:
+        """
+        Yield the keys of the object at the cursor
+
+        The caller must consume (decode, skip or iterate) each value before
+        asking for the next key.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.decode()
+            self.expect(':')
+            yield key
+            char = self.peek()
+            self._pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f"Expected ',' or '}}' in JSON object, found {char!r}")
+
+    def iter_array(self) -> Iterator[int]:
+        """
+        Yield the indexes of the array at the cursor
+
+        The caller must consume each element before asking for the next.
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            char = self.peek()
+            self._pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' in JSON array, found {char!r}")
+
+
+def first_tier_price(offers: Dict) -> Optional[Tuple[float, str]]:
+    """
+    Pick the first-tier USD price from a SKU's OnDemand offers
+
+    Returns:
+        (price, unit), or None if no USD price is listed
+    """
+    for offer in offers.values():
+        for dimension in offer.get('priceDimensions', {}).values():
+            if dimension.get('beginRange', '0') != '0':
+                continue
+            usd = dimension.get('pricePerUnit', {}).get('USD')
+            if usd is not None:
+                return float(usd), dimension.get('unit', '')
+    return None
+
+
+def _reserved_prices(offers: Dict) -> Tuple[ReservedPrice, ...]:
+    """Reserved offerings of one SKU, in document order"""
+    prices = []
+    for offer in offers.values():
+        hourly = upfront = 0.0
+        for dimension in offer.get('priceDimensions', {}).values():
+            usd = dimension.get('pricePerUnit', {}).get('USD')
+            if usd is None:
+                continue
+            if dimension.get('unit') == 'Quantity':
+                upfront += float(usd)
+            else:
+                hourly += float(usd)
+        terms = offer.get('termAttributes', {})
+        prices.append(ReservedPrice(
+            lease_length=terms.get('LeaseContractLength', ''),
+            purchase_option=terms.get('PurchaseOption', ''),
+            offering_class=terms.get('OfferingClass', ''),
+            hourly=hourly,
+            upfront=upfront,
+        ))
+    return tuple(prices)
+
+
+def _price_document(
+    sections: Dict[str, Any],
+    attributes: Iterable[str],
+    reserved: bool,
+) -> PriceDocument:
+    product_attributes = sections.get('attributes') or {}
+    on_demand = first_tier_price(sections.get('OnDemand') or {})
+    return PriceDocument(
+        attributes={
+            name: product_attributes[name] for name in attributes if name in product_attributes
+        },
+        on_demand=on_demand[0] if on_demand is not None else None,
+        reserved=_reserved_prices(sections.get('Reserved') or {}) if reserved else (),
+    )
+
+
+def extract_price_document(
+    document: str,
+    attributes: Iterable[str] = (),
+    reserved: bool = False,
+) -> PriceDocument:
+    """
+    Read the on-demand price (and optionally more) from a Price List document
+
+    Only the product attributes block and the wanted term types are
+    decoded. Reserved terms, which make up most of an EC2 or RDS
+    document, are skipped unless asked for. Anything unexpected falls back
+    to decoding the whole document.
+
+    Args:
+        document: One entry of a get_products 'PriceList'
+        attributes: Product attributes to return (e.g. "instanceType")
+        reserved: Also read Reserved terms
+
+    Returns:
+        Extracted prices and attributes
+    """
+    attributes = tuple(attributes)
+    wanted = {'OnDemand'}
+    if attributes:
+        wanted.add('attributes')
+    if reserved:
+        wanted.add('Reserved')
+
+    sections: Dict[str, Any] = {}
+    position = 0
+    while len(sections) < len(wanted):
+        match = _SECTION.search(document, position)
+        if match is None:
+            break
+        position = match.end()
+        name = match.group(1)
+        # Skip keys we don't want and look-alikes inside string values
+        if name not in wanted or name in sections or document[match.start() - 1] == '\\':
+            continue
+        try:
+            value, position = _decoder.raw_decode(document, position)
+        except ValueError:
+            value = None
+        if not isinstance(value, dict):
+            sections = _decoded_sections(json.loads(document))
+            break
+        sections[name] = value
+    return _price_document(sections, attributes, reserved)
+
+
+def _decoded_sections(item: Dict) -> Dict[str, Any]:
+    """The sections extract_price_document reads, from a fully decoded document"""
+    terms = item.get('terms', {})
+    return {
+        'attributes': item.get('product', {}).get('attributes', {}),
+        'OnDemand': terms.get('OnDemand', {}),
+        'Reserved': terms.get('Reserved', {}),
+    }
+
+
+def iter_savings_plan_rates(fh, chunk_size: int = 1 << 20) -> Iterator[SavingsPlanRate]:
+    """
+    Stream the USD rates out of a Savings Plans offer file
+
+    Each plan is decoded on its own, so a regional file of any size is
+    read in bounded memory.
+
+    Args:
+        fh: Text file of a Savings Plans offer (savingsPlan index.json)
+        chunk_size: Characters read per chunk
+    """
+    stream = JsonStream(fh, chunk_size=chunk_size)
+    for section in stream.iter_object():
+        if section != 'terms':
+            stream.skip()
+            continue
+        for term_type in stream.iter_object():
+            if term_type != 'savingsPlan':
+                stream.skip()
+                continue
+            for _ in stream.iter_array():
+                plan = stream.decode()
+                for rate in plan.get('rates', ()):
+                    price = rate.get('discountedRate', {})
+                    if price.get('currency', 'USD') != 'USD' or 'price' not in price:
+                        continue
+                    yield SavingsPlanRate(
+                        plan_sku=plan.get('sku', ''),
+                        discounted_sku=rate.get('discountedSku', ''),
+                        usage_type=rate.get('discountedUsageType', ''),
+                        operation=rate.get('discountedOperation', ''),
+                        service_code=rate.get('discountedServiceCode', ''),
+                        unit=rate.get('unit', ''),
+                        rate=float(price['price']),
+                    )
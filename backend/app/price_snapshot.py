@@ -0,0 +1,136 @@
+"""
+Persistent on-disk pricing snapshot
+Lets new processes serve live prices instantly and lets workers on the
+same host share one refresh instead of each calling the Pricing API
+"""
+
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+from app.aws_pricing import PriceKey
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lease, every worker refreshes
+    fcntl = None
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(
+    tempfile.gettempdir(), "aws-budget-planner", "pricing-snapshot.json"
+)
+
+
+@dataclass(frozen=True)
+class PriceSnapshot:
+    """
+    Unit prices captured at a point in time
+
+    Attributes:
+        prices: Unit price for every PriceKey the templates need
+        pricing_source: "live" or "fallback"
+        priced_at: Unix timestamp the prices were fetched
+    """
+    prices: Dict[PriceKey, float]
+    pricing_source: str
+    priced_at: float
+
+    @property
+    def age_seconds(self) -> float:
+        return max(0.0, time.time() - self.priced_at)
+
+
+class PriceSnapshotFile:
+    """Versioned JSON price snapshot, written atomically"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Snapshot file (its directory is created if missing)
+        """
+        self.path = path
+        self.lock_path = path + ".lock"
+
+    @classmethod
+    def from_env(cls) -> Optional["PriceSnapshotFile"]:
+        """
+        Snapshot file named by PRICING_SNAPSHOT_PATH (default: under the
+        system temp dir). Set PRICING_SNAPSHOT_PATH to an empty string to
+        disable persistence.
+        """
+        path = os.environ.get("PRICING_SNAPSHOT_PATH", DEFAULT_SNAPSHOT_PATH)
+        return cls(path) if path else None
+
+    def load(self) -> Optional[PriceSnapshot]:
+        """
+        Read the snapshot
+
+        Returns:
+            The snapshot, or None if it's missing, unreadable or written
+            by an incompatible format version
+        """
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                data = json.load(fh)
+            if data.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+                return None
+            return PriceSnapshot(
+                prices={PriceKey(*row[:4]): float(row[4]) for row in data["prices"]},
+                pricing_source=data["pricing_source"],
+                priced_at=float(data["priced_at"]),
+            )
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            return None
+
+    def save(self, snapshot: PriceSnapshot) -> None:
+        """Write the snapshot atomically (readers see the old or new file, never half of one)"""
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        data = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "pricing_source": snapshot.pricing_source,
+            "priced_at": snapshot.priced_at,
+            "prices": [list(key) + [price] for key, price in snapshot.prices.items()],
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".pricing-snapshot-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(data, fh, separators=(",", ":"))
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @contextmanager
+    def refresh_lease(self) -> Iterator[bool]:
+        """
+        Try to become the one process on this host refreshing prices
+
+        Yields:
+            True if this process holds the lease and should call the
+            Pricing API, False if another process is already refreshing
+        """
+        if fcntl is None:
+            yield True
+            return
+
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        with open(self.lock_path, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
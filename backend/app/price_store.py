@@ -0,0 +1,250 @@
+"""
+Local indexed price store built from AWS bulk offer files
+Lets the pricing client run without network access
+
+Ingest with:
+    python -m app.price_store path/to/offers [--db prices.db]
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.aws_pricing import LAMBDA_PRICE_GROUPS, REGION_NAMES, PriceKey
+from app.price_document import JsonStream, first_tier_price
+
+# Offer code -> PriceKey service name
+OFFER_SERVICES = {
+    'AmazonEC2': 'ec2',
+    'AmazonRDS': 'rds',
+    'AWSLambda': 'lambda',
+}
+
+_LOCATION_REGIONS = {name: code for code, name in REGION_NAMES.items()}
+_LAMBDA_GROUP_SKUS = {group: sku for sku, group in LAMBDA_PRICE_GROUPS.items()}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    service TEXT NOT NULL,
+    region TEXT NOT NULL,
+    instance_type TEXT NOT NULL,
+    engine TEXT NOT NULL DEFAULT '',
+    os TEXT NOT NULL DEFAULT '',
+    tenancy TEXT NOT NULL DEFAULT '',
+    price REAL NOT NULL,
+    unit TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (service, region, instance_type, engine, os, tenancy)
+) WITHOUT ROWID
+"""
+
+_INSERT_BATCH_SIZE = 5000
+
+# (service, region, instance_type, engine, os, tenancy)
+IndexKey = Tuple[str, str, str, str, str, str]
+
+
+def _product_index_key(product: Dict) -> Optional[IndexKey]:
+    """
+    Map an offer-file product to its price-store key
+
+    Returns:
+        Index key, or None if the product isn't one we price
+    """
+    attributes = product.get('attributes', {})
+    service = OFFER_SERVICES.get(attributes.get('servicecode', ''))
+    region = attributes.get('regionCode') or _LOCATION_REGIONS.get(attributes.get('location', ''))
+    if service is None or region is None:
+        return None
+
+    if service == 'ec2':
+        if (
+            product.get('productFamily') != 'Compute Instance'
+            or attributes.get('preInstalledSw') != 'NA'
+            or attributes.get('capacitystatus') != 'Used'
+        ):
+            return None
+        return (
+            service, region, attributes.get('instanceType', ''), '',
+            attributes.get('operatingSystem', ''), attributes.get('tenancy', ''),
+        )
+
+    if service == 'rds':
+        if attributes.get('deploymentOption') != 'Single-AZ' or 'instanceType' not in attributes:
+            return None
+        return (
+            service, region, attributes['instanceType'],
+            attributes.get('databaseEngine', ''), '', '',
+        )
+
+    sku = _LAMBDA_GROUP_SKUS.get(attributes.get('group', ''))
+    if sku is None:
+        return None
+    return (service, region, sku, '', '', '')
+
+
+def _lookup_columns(key: PriceKey) -> IndexKey:
+    """Map a PriceKey to the store's index columns"""
+    if key.service == 'ec2':
+        return (key.service, key.region, key.sku, '', 'Linux', 'Shared')
+    if key.service == 'rds':
+        return (key.service, key.region, key.sku, key.variant or 'MySQL', '', '')
+    return (key.service, key.region, key.sku, key.variant, '', '')
+
+
+class PriceStore:
+    """SQLite-backed price index keyed on (service, region, instance type, engine, os, tenancy)"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def get_price(self, key: PriceKey) -> Optional[float]:
+        """
+        Look up an on-demand unit price
+
+        Returns:
+            Price per unit in USD, or None if the store doesn't have it
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT price FROM prices WHERE service = ? AND region = ? "
+                "AND instance_type = ? AND engine = ? AND os = ? AND tenancy = ?",
+                _lookup_columns(key),
+            ).fetchone()
+        return row[0] if row else None
+
+    def count(self) -> int:
+        """Number of indexed prices"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM prices").fetchone()[0]
+
+    def ingest(self, path: str) -> int:
+        """
+        Ingest an offer file, or every *.json offer file under a directory
+
+        Returns:
+            Number of prices written
+        """
+        if not os.path.isdir(path):
+            return self.ingest_offer_file(path)
+
+        written = 0
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.endswith('.json'):
+                    written += self.ingest_offer_file(os.path.join(root, name))
+        return written
+
+    def ingest_offer_file(self, path: str, chunk_size: int = 1 << 20) -> int:
+        """
+        Stream-parse one AWS offer file into the store
+
+        Products and OnDemand terms are staged in temporary tables and
+        joined at the end, so their order in the file doesn't matter and
+        neither is held in memory.
+
+        Args:
+            path: Offer file (e.g. AmazonEC2/current/index.json)
+            chunk_size: Characters read per chunk
+
+        Returns:
+            Number of prices written
+        """
+        with self._lock:
+            conn = self._conn
+            conn.execute("DROP TABLE IF EXISTS temp.staged_products")
+            conn.execute("DROP TABLE IF EXISTS temp.staged_terms")
+            conn.execute(
+                "CREATE TEMP TABLE staged_products (sku TEXT PRIMARY KEY, service TEXT, "
+                "region TEXT, instance_type TEXT, engine TEXT, os TEXT, tenancy TEXT)"
+            )
+            conn.execute("CREATE TEMP TABLE staged_terms (sku TEXT PRIMARY KEY, price REAL, unit TEXT)")
+
+            with open(path, encoding='utf-8') as fh:
+                stream = JsonStream(fh, chunk_size=chunk_size)
+                for section in stream.iter_object():
+                    if section == 'products':
+                        self._stage_products(stream)
+                    elif section == 'terms':
+                        self._stage_terms(stream)
+                    else:
+                        stream.skip()
+
+            cursor = conn.execute(
+                "INSERT OR REPLACE INTO prices "
+                "(service, region, instance_type, engine, os, tenancy, price, unit) "
+                "SELECT p.service, p.region, p.instance_type, p.engine, p.os, p.tenancy, t.price, t.unit "
+                "FROM staged_products p JOIN staged_terms t ON t.sku = p.sku"
+            )
+            written = cursor.rowcount
+            conn.execute("DROP TABLE temp.staged_products")
+            conn.execute("DROP TABLE temp.staged_terms")
+            conn.commit()
+            return written
+
+    def _stage_products(self, stream: JsonStream) -> None:
+        batch: List[Tuple] = []
+        for sku in stream.iter_object():
+            index_key = _product_index_key(stream.decode())
+            if index_key is None:
+                continue
+            batch.append((sku,) + index_key)
+            if len(batch) >= _INSERT_BATCH_SIZE:
+                self._flush(
+                    "INSERT OR REPLACE INTO staged_products VALUES (?, ?, ?, ?, ?, ?, ?)", batch
+                )
+        self._flush("INSERT OR REPLACE INTO staged_products VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+
+    def _stage_terms(self, stream: JsonStream) -> None:
+        for term_type in stream.iter_object():
+            if term_type != 'OnDemand':
+                stream.skip()
+                continue
+
+            batch: List[Tuple] = []
+            for sku in stream.iter_object():
+                price = first_tier_price(stream.decode())
+                if price is None:
+                    continue
+                batch.append((sku,) + price)
+                if len(batch) >= _INSERT_BATCH_SIZE:
+                    self._flush("INSERT OR REPLACE INTO staged_terms VALUES (?, ?, ?)", batch)
+            self._flush("INSERT OR REPLACE INTO staged_terms VALUES (?, ?, ?)", batch)
+
+    def _flush(self, sql: str, batch: List[Tuple]) -> None:
+        if batch:
+            self._conn.executemany(sql, batch)
+            batch.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest AWS offer files into a local price store")
+    parser.add_argument("path", help="Offer file or directory of offer files")
+    parser.add_argument(
+        "--db",
+        default=os.environ.get("PRICE_STORE_PATH", "prices.db"),
+        help="SQLite price store to write (default: $PRICE_STORE_PATH or prices.db)",
+    )
+    args = parser.parse_args()
+
+    store = PriceStore(args.db)
+    written = store.ingest(args.path)
+    print(f"✅ Indexed {written} prices ({store.count()} total) in {args.db}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
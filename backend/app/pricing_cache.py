@@ -0,0 +1,278 @@
+"""
+In-memory pricing cache with per-entry TTL and LRU eviction
+Shared by the pricing clients so prices expire and failures are retried,
+and concurrent misses for one price share a single fetch
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Prices change a few times a year; a few hours is plenty fresh
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+
+# Failed or empty lookups are retried quickly so one network blip
+# doesn't pin fallback pricing for the life of the process
+DEFAULT_NEGATIVE_TTL_SECONDS = 60
+
+DEFAULT_MAXSIZE = 512
+
+_MISSING = object()
+
+
+class _Flight:
+    """A load in progress that other threads asking for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class PricingCache:
+    """
+    Thread-safe TTL + LRU cache for pricing lookups
+
+    `None` values are treated as negative results (lookup failed or no
+    product matched) and expire after `negative_ttl_seconds` instead of
+    `ttl_seconds`.
+
+    Loads are single-flight: while one caller is fetching a key, other
+    callers that miss on it wait for that fetch instead of starting their
+    own, so N users hitting a cold cache cost one Pricing API call per
+    price, not N.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_MAXSIZE,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        negative_ttl_seconds: float = DEFAULT_NEGATIVE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            maxsize: Maximum number of entries before LRU eviction
+            ttl_seconds: Lifetime of a successful lookup
+            negative_ttl_seconds: Lifetime of a `None` (failed) lookup
+            clock: Monotonic time source (injectable for tests)
+        """
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expires_at, value), ordered from least to most recently used
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # key -> load in progress (threads) or its task (coroutines)
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._async_flights: Dict[Hashable, "asyncio.Task[Any]"] = {}
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get a cached value
+
+        Returns:
+            The cached value (which may be None for a negative entry),
+            or `default` if the key is missing or expired
+        """
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > self._clock()
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Store a value, evicting the least recently used entry if full
+
+        Args:
+            key: Cache key
+            value: Value to store (None is cached as a negative result)
+            ttl_seconds: Override the default TTL for this entry
+        """
+        if ttl_seconds is None:
+            ttl_seconds = self.negative_ttl_seconds if value is None else self.ttl_seconds
+
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        refresh: bool = False,
+    ) -> Any:
+        """
+        Get a cached value, calling `loader` and caching its result on a miss
+
+        Args:
+            key: Cache key
+            loader: Zero-argument callable that fetches the value
+            refresh: Skip the cached value and always call `loader`
+
+        Returns:
+            Cached or freshly loaded value (the cached value if a forced
+            refresh found nothing)
+        """
+        with self._lock:
+            if not refresh:
+                value = self._lookup_locked(key)
+                if value is not _MISSING:
+                    return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self.store_loaded(key, loader(), refresh)
+            return flight.value
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def get_or_load_async(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        refresh: bool = False,
+    ) -> Any:
+        """
+        Async version of get_or_load for coroutine loaders
+
+        The load runs as its own task, so a caller being cancelled (e.g. a
+        timeout) doesn't cancel the fetch for the others waiting on it.
+        Only callers on the same event loop share a fetch.
+
+        Args:
+            key: Cache key
+            loader: Zero-argument coroutine function that fetches the value
+            refresh: Skip the cached value and always call `loader`
+
+        Returns:
+            Cached or freshly loaded value
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not refresh:
+                value = self._lookup_locked(key)
+                if value is not _MISSING:
+                    return value
+            task = self._async_flights.get(key)
+            if task is not None and task.get_loop() is loop:
+                self.coalesced += 1
+            else:
+                task = loop.create_task(self._load_async(key, loader, refresh))
+                self._async_flights[key] = task
+
+        return await asyncio.shield(task)
+
+    async def _load_async(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        refresh: bool,
+    ) -> Any:
+        try:
+            return self.store_loaded(key, await loader(), refresh)
+        finally:
+            with self._lock:
+                if self._async_flights.get(key) is asyncio.current_task():
+                    del self._async_flights[key]
+
+    def store_loaded(self, key: Hashable, value: Any, refresh: bool = False) -> Any:
+        """
+        Cache a value fetched outside get_or_load (e.g. by a batch query)
+
+        Args:
+            key: Cache key
+            value: Fetched value (None if the lookup failed)
+            refresh: The fetch was a forced refresh
+
+        Returns:
+            The value now cached: the good value kept in place of a failed
+            forced refresh, otherwise `value`
+        """
+        if refresh and value is None:
+            # A failed forced refresh must not clobber a good cached price.
+            # Not a cache read, so the hit/miss counters aren't touched
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > self._clock() and entry[1] is not None:
+                    return entry[1]
+        self.set(key, value)
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one entry, or everything if no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights) + len(self._async_flights),
+            }
+
+    def _lookup(self, key: Hashable) -> Any:
+        with self._lock:
+            return self._lookup_locked(key)
+
+    def _lookup_locked(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return _MISSING
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return _MISSING
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if value is None:
+            self.negative_hits += 1
+        return value
@@ -0,0 +1,85 @@
+"""
+Opt-in sampling profiler
+Samples every thread's Python stack on an interval and aggregates the
+samples as collapsed stacks, the input format of flamegraph.pl and
+speedscope. Low enough overhead to run against production traffic for a
+few seconds; enable with PROFILER_ENABLED=1 (exposes GET /debug/profile).
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+from typing import Counter, Optional
+
+DEFAULT_INTERVAL_SECONDS = 0.005
+MAX_DURATION_SECONDS = 60.0
+MAX_STACK_DEPTH = 128
+
+_busy = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already being taken"""
+
+
+def profiler_enabled() -> bool:
+    """True if PROFILER_ENABLED=1"""
+    return os.environ.get("PROFILER_ENABLED") == "1"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(
+    duration_seconds: float,
+    interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+    thread_name: Optional[str] = None,
+) -> Counter[str]:
+    """
+    Sample all threads' stacks for a while
+
+    Runs on the calling thread (which is left out of the samples), so call
+    it from a worker thread to profile the event loop.
+
+    Args:
+        duration_seconds: How long to sample
+        interval_seconds: Time between samples
+        thread_name: Only sample threads with this name (default: all)
+
+    Returns:
+        Sample count per collapsed stack ("thread;outer;...;inner")
+
+    Raises:
+        ProfilerBusy: A profile is already running
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        me = threading.get_ident()
+        counts: Counter[str] = collections.Counter()
+        deadline = time.monotonic() + min(duration_seconds, MAX_DURATION_SECONDS)
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if ident == me or (thread_name is not None and name != thread_name):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(name)
+                counts[";".join(reversed(stack))] += 1
+            time.sleep(interval_seconds)
+        return counts
+    finally:
+        _busy.release()
+
+
+def collapsed(counts: Counter[str]) -> str:
+    """Render samples as collapsed stacks, most frequent first"""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
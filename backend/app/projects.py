@@ -3,22 +3,39 @@ Project templates with AWS cost breakdowns
 Now with live AWS pricing!
 """
 
-from typing import List, Dict, Optional
-from pydantic import BaseModel
-from app.aws_pricing import (
-    AWSPricingClient, 
-    calculate_monthly_cost, 
-    calculate_lambda_cost
-)
+import asyncio
+import logging
+import os
+import time
+from typing import Annotated, List, Dict, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+from app.async_pricing import AsyncAWSPricingClient, DEFAULT_MAX_CONCURRENCY
+from app.aws_pricing import AWSPricingClient, PriceKey, REGION_NAMES
+from app.budget_index import BudgetSplit
+from app.json_encoding import RawJSON, encode_object, join_array
+from app.metrics import PRICING_FALLBACKS, TEMPLATE_BUILD_SECONDS, TEMPLATES_REPRICED, callback_metric
+from app.price_store import PriceStore
+from app.price_snapshot import PriceSnapshot, PriceSnapshotFile
+from app.pricing_cache import PricingCache, DEFAULT_TTL_SECONDS
+from app.snapshot import CatalogBuild, RefreshFailed, SnapshotStore, TemplateSnapshot, pricing_note
+from app.template_registry import PlanResult, load_template_registry
+
+logger = logging.getLogger(__name__)
 
 
 class CostComponent(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     service: str
     description: str
     cost: float
+    shared: bool = False
 
 
 class ProjectTemplate(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     id: int
     name: str
     description: str
@@ -29,231 +46,686 @@ class ProjectTemplate(BaseModel):
     pricing_source: str = "live"  # "live" or "fallback"
 
 
-# Initialize pricing client (will be reused across requests)
+# Most budgets (or regions) one batch query may ask about
+MAX_BATCH_BUDGETS = 1000
+
+
+class BudgetBatchRequest(BaseModel):
+    """Several budget queries answered from one snapshot per region"""
+    budgets: List[Annotated[float, Field(ge=1.0, le=10000.0)]] = Field(
+        min_length=1, max_length=MAX_BATCH_BUDGETS
+    )
+    regions: Optional[List[str]] = Field(default=None, min_length=1, max_length=len(REGION_NAMES))
+
+
+# Shared pricing cache (TTL + LRU, short TTL for failed lookups)
+pricing_cache = PricingCache()
+
+# Prices persisted on disk and shared by every worker on this host
+price_snapshot_file: Optional[PriceSnapshotFile] = PriceSnapshotFile.from_env()
+
+# Initialize pricing clients (will be reused across requests)
 pricing_client: Optional[AWSPricingClient] = None
+async_pricing_client: Optional[AsyncAWSPricingClient] = None
+price_store: Optional[PriceStore] = None
+
+
+def get_price_store() -> Optional[PriceStore]:
+    """Open the local price store named by PRICE_STORE_PATH, if any"""
+    global price_store
+    store_path = os.environ.get("PRICE_STORE_PATH")
+    if price_store is None and store_path:
+        price_store = PriceStore(store_path)
+    return price_store
+
 
 def get_pricing_client() -> AWSPricingClient:
-    """Get or create pricing client singleton"""
+    """
+    Get or create pricing client singleton
+    
+    Set PRICE_STORE_PATH to look prices up in a local store built by
+    `python -m app.price_store`, and PRICING_OFFLINE=1 to never call AWS.
+    """
     global pricing_client
     if pricing_client is None:
-        pricing_client = AWSPricingClient(region="us-east-1")
+        pricing_client = AWSPricingClient(
+            region="us-east-1",
+            cache=pricing_cache,
+            price_store=get_price_store(),
+            offline=os.environ.get("PRICING_OFFLINE") == "1",
+        )
     return pricing_client
 
 
-def get_live_project_templates() -> List[ProjectTemplate]:
+def get_async_pricing_client() -> AsyncAWSPricingClient:
     """
-    Generate project templates with live AWS pricing
-    Falls back to hardcoded pricing if AWS API fails
+    Get or create async pricing client singleton
+    
+    Shares the pricing cache and price store with the sync client.
+    Set PRICING_ENDPOINT_URL to point it at a stub Pricing API and
+    PRICING_MAX_CONCURRENCY to cap in-flight calls (default 8).
+    """
+    global async_pricing_client
+    if async_pricing_client is None:
+        async_pricing_client = AsyncAWSPricingClient(
+            region="us-east-1",
+            cache=pricing_cache,
+            price_store=get_price_store(),
+            offline=os.environ.get("PRICING_OFFLINE") == "1",
+            max_concurrency=int(
+                os.environ.get("PRICING_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)
+            ),
+        )
+    return async_pricing_client
+
+
+async def close_async_pricing_client() -> None:
+    """Release the async client's HTTP connections (on app shutdown)"""
+    if async_pricing_client is not None:
+        await async_pricing_client.aclose()
+
+
+# Templates are declared in app/catalog/*.json and compiled once at import
+DEFAULT_REGION = "us-east-1"
+template_registry = load_template_registry()
+
+# Always-free allowances are applied to every plan; set FREE_TIER_NEW_ACCOUNT=1
+# to also apply the 12-month offers new accounts get
+FREE_TIER_NEW_ACCOUNT = os.environ.get("FREE_TIER_NEW_ACCOUNT") == "1"
+
+TEMPLATE_PRICE_KEYS: List[PriceKey] = template_registry.price_keys(DEFAULT_REGION)
+FALLBACK_PRICES: Dict[PriceKey, float] = template_registry.fallback_prices(DEFAULT_REGION)
+
+
+def resolve_template_prices(
+    prices: Dict[PriceKey, Optional[float]],
+    region: str = DEFAULT_REGION
+) -> Tuple[Dict[PriceKey, float], str]:
     """
-    client = get_pricing_client()
-    pricing_source = "live"
+    Fill in fallback pricing for any lookups that failed
     
-    try:
-        # Fetch live pricing
-        lambda_pricing = client.get_lambda_pricing()
-        
-        # EC2 + RDS for full-stack app
-        ec2_t4g_nano_hourly = client.get_ec2_pricing("t4g.nano") or 0.0042
-        rds_t4g_micro_hourly = client.get_rds_pricing("db.t4g.micro", "MySQL") or 0.0160
-        
-        # Calculate monthly costs
-        ec2_monthly = calculate_monthly_cost(ec2_t4g_nano_hourly)
-        rds_monthly = calculate_monthly_cost(rds_t4g_micro_hourly)
+    Args:
+        prices: Fetched prices (None where the lookup failed)
+        region: Region the prices are for (fallback prices are us-east-1
+            figures, so they're only a rough guide elsewhere)
         
-        # Lambda costs for various scenarios
-        lambda_100k_128mb_200ms = calculate_lambda_cost(
-            requests=100000,
-            avg_duration_ms=200,
-            memory_mb=128,
-            pricing=lambda_pricing
+    Returns:
+        (complete price map, pricing source: "live" or "fallback")
+    """
+    fallback_prices = (
+        FALLBACK_PRICES if region == DEFAULT_REGION
+        else template_registry.fallback_prices(region)
+    )
+    resolved = {}
+    missing = []
+    for key, fallback in fallback_prices.items():
+        price = prices.get(key)
+        if price is None:
+            missing.append(key)
+            price = fallback
+        resolved[key] = price
+    
+    if missing:
+        PRICING_FALLBACKS.inc(region=region)
+        logger.warning(
+            "⚠️  Failed to fetch live pricing for %s in %s, using fallback pricing",
+            ", ".join(k.sku for k in missing), region,
         )
+        return resolved, "fallback"
+    return resolved, "live"
+
+
+def price_template_catalog(
+    prices: Dict[PriceKey, Optional[float]],
+    region: str = DEFAULT_REGION,
+    previous: Optional[TemplateSnapshot] = None
+) -> CatalogBuild:
+    """
+    Price every project template from fetched unit prices
+    
+    Args:
+        prices: Fetched prices (None where the lookup failed)
+        region: Region the prices are for
+        previous: Current snapshot for the region, if any; only templates
+            that use a price that changed since then are rebuilt
         
-        lambda_50k_512mb_2000ms = calculate_lambda_cost(
-            requests=50000,
-            avg_duration_ms=2000,
-            memory_mb=512,
-            pricing=lambda_pricing
-        )
+    Returns:
+        Priced templates plus the (fallback-filled) prices they used
+    """
+    resolved, pricing_source = resolve_template_prices(prices, region)
+    with TEMPLATE_BUILD_SECONDS.time(region=region):
+        templates, plan = reprice_project_templates(resolved, pricing_source, region, previous)
+    return CatalogBuild(
+        templates=templates,
+        prices=resolved,
+        pricing_source=pricing_source,
+        priced_at=time.time(),
+        plan=plan,
+    )
+
+
+def changed_price_keys(
+    previous: Mapping[PriceKey, float],
+    prices: Mapping[PriceKey, float]
+) -> List[PriceKey]:
+    """Keys whose price differs between two price maps (or is in only one)"""
+    changed = [key for key, price in prices.items() if previous.get(key) != price]
+    changed.extend(key for key in previous if key not in prices)
+    return changed
+
+
+def reprice_project_templates(
+    prices: Dict[PriceKey, float],
+    pricing_source: str,
+    region: str = DEFAULT_REGION,
+    previous: Optional[TemplateSnapshot] = None
+) -> Tuple[List[ProjectTemplate], PlanResult]:
+    """
+    Price every project template, reusing what a price change didn't touch
+    
+    With a previous snapshot from the same catalog and pricing source,
+    only the components that use a changed price are re-priced (see
+    TemplateRegistry.reprice) and every other template is carried over
+    as the same object, so the snapshot store can keep its encoding and
+    budget index entry too.
+    
+    Returns:
+        (priced templates, unrounded costs they were built from)
+    """
+    if (
+        previous is None
+        or previous.plan is None
+        or previous.pricing_source != pricing_source
+        or len(previous.templates) != len(template_registry.templates)
+    ):
+        plan = template_registry.evaluate(prices, region, new_account=FREE_TIER_NEW_ACCOUNT)
+        TEMPLATES_REPRICED.inc(len(template_registry.templates), region=region)
+        return _project_templates(plan, pricing_source), plan
+    
+    plan, affected = template_registry.reprice(
+        previous.plan,
+        prices,
+        region,
+        changed_price_keys(previous.prices, prices),
+        new_account=FREE_TIER_NEW_ACCOUNT,
+    )
+    templates = list(previous.templates)
+    for index in affected:
+        templates[index] = _project_template(index, plan, pricing_source)
+    TEMPLATES_REPRICED.inc(len(affected), region=region)
+    return templates, plan
+
+
+def fetch_template_catalog() -> CatalogBuild:
+    """Fetch live prices (one lookup after another) and price every template"""
+    return price_template_catalog(
+        get_pricing_client().get_prices(TEMPLATE_PRICE_KEYS), previous=template_store.current
+    )
+
+
+async def fetch_template_catalog_async(refresh_prices: bool = False) -> CatalogBuild:
+    """
+    Fetch live prices concurrently and price every template
+    
+    Coordinates with other workers through the on-disk price snapshot:
+    if another worker already saved newer live prices they're reused, and
+    only the worker holding the refresh lease calls the Pricing API.
+    
+    Args:
+        refresh_prices: Bypass the pricing cache and fetch fresh prices
         
-        lambda_20k_128mb_100ms = calculate_lambda_cost(
-            requests=20000,
-            avg_duration_ms=100,
-            memory_mb=128,
-            pricing=lambda_pricing
+    Raises:
+        RefreshFailed: Another worker is refreshing right now; its prices
+            will be on disk for the next attempt
+    """
+    if price_snapshot_file is None:
+        prices = await get_async_pricing_client().get_prices(
+            TEMPLATE_PRICE_KEYS, refresh=refresh_prices
         )
+        return price_template_catalog(prices, previous=template_store.current)
+    
+    saved = price_snapshot_file.load()
+    current = template_store.current
+    if (
+        saved is not None
+        and saved.pricing_source == "live"
+        and saved.age_seconds < DEFAULT_TTL_SECONDS
+        and (current is None or saved.priced_at > current.priced_at)
+    ):
+        return catalog_from_price_snapshot(saved, previous=current)
+    
+    with price_snapshot_file.refresh_lease() as leader:
+        if not leader and current is not None:
+            raise RefreshFailed("Another worker is refreshing prices")
         
-        lambda_daily_scraper = calculate_lambda_cost(
-            requests=30,  # Once per day
-            avg_duration_ms=300000,  # 5 minutes
-            memory_mb=256,
-            pricing=lambda_pricing
+        prices = await get_async_pricing_client().get_prices(
+            TEMPLATE_PRICE_KEYS, refresh=refresh_prices
         )
+        catalog = price_template_catalog(prices, previous=current)
+        if leader and catalog.pricing_source == "live":
+            price_snapshot_file.save(
+                PriceSnapshot(catalog.prices, catalog.pricing_source, catalog.priced_at)
+            )
+        return catalog
+
+
+def catalog_from_price_snapshot(
+    saved: PriceSnapshot,
+    previous: Optional[TemplateSnapshot] = None
+) -> CatalogBuild:
+    """Price every template from a saved price snapshot (no network)"""
+    prices = {key: saved.prices.get(key) for key in TEMPLATE_PRICE_KEYS}
+    resolved, pricing_source = resolve_template_prices(prices)
+    if saved.pricing_source != "live":
+        pricing_source = saved.pricing_source
+    templates, plan = reprice_project_templates(resolved, pricing_source, previous=previous)
+    return CatalogBuild(
+        templates=templates,
+        prices=resolved,
+        pricing_source=pricing_source,
+        priced_at=saved.priced_at,
+        plan=plan,
+    )
+
+
+def get_live_project_templates() -> List[ProjectTemplate]:
+    """
+    Generate project templates with live AWS pricing
+    Falls back to hardcoded pricing if AWS API fails
+    """
+    return fetch_template_catalog().templates
+
+
+def build_project_templates(
+    prices: Dict[PriceKey, float],
+    pricing_source: str = "live",
+    region: str = DEFAULT_REGION
+) -> List[ProjectTemplate]:
+    """
+    Price every project template
+    
+    Free-tier allowances are shared across all components of a template,
+    as they are across an AWS account.
+    
+    Args:
+        prices: Unit prices for the registry's price keys in `region`
+        pricing_source: "live" or "fallback"
+        region: Region to price the templates in
         
-    except Exception as e:
-        print(f"⚠️  Failed to fetch live pricing: {e}")
-        print("📊 Using fallback pricing")
-        pricing_source = "fallback"
+    Returns:
+        Priced project templates
+    """
+    result = template_registry.evaluate(
+        prices, region, new_account=FREE_TIER_NEW_ACCOUNT
+    )
+    return _project_templates(result, pricing_source)
+
+
+def _project_templates(plan: PlanResult, pricing_source: str) -> List[ProjectTemplate]:
+    return [
+        _project_template(index, plan, pricing_source)
+        for index in range(len(template_registry.templates))
+    ]
+
+
+def _project_template(index: int, plan: PlanResult, pricing_source: str) -> ProjectTemplate:
+    """The catalog's `index`-th template with the costs from an evaluation"""
+    spec = template_registry.templates[index]
+    return ProjectTemplate(
+        id=spec.id,
+        name=spec.name,
+        description=spec.description,
+        total_cost=round(plan.totals[index], 2),
+        components=[
+            CostComponent(
+                service=component.service,
+                description=component.description,
+                cost=round(cost, 2),
+                shared=component.shared,
+            )
+            for component, cost in zip(spec.components, plan.component_costs[index])
+        ],
+        estimated_traffic=spec.estimated_traffic,
+        complexity=spec.complexity,
+        pricing_source=pricing_source,
+    )
+
+
+# Priced templates are built once per pricing refresh and shared by every
+# request. The background refresher (see app.refresher) normally keeps this
+# fresh; snapshots older than the cache TTL are also refreshed on access.
+template_store = SnapshotStore(
+    fetch_template_catalog,
+    async_builder=lambda: fetch_template_catalog_async(refresh_prices=True),
+    max_age_seconds=DEFAULT_TTL_SECONDS,
+)
+
+
+def fallback_catalog(region: str = DEFAULT_REGION) -> CatalogBuild:
+    """Price every template in a region with the built-in fallback prices (no network)"""
+    prices = FALLBACK_PRICES if region == DEFAULT_REGION else template_registry.fallback_prices(region)
+    templates, plan = reprice_project_templates(prices, "fallback", region)
+    return CatalogBuild(
+        templates=templates,
+        prices=prices,
+        pricing_source="fallback",
+        priced_at=time.time(),
+        plan=plan,
+    )
+
+
+def seed_template_snapshot() -> TemplateSnapshot:
+    """
+    Publish a snapshot from the on-disk prices (or fallback pricing) if
+    none exists yet
+    
+    Needs no network, so the API can answer immediately at startup while
+    the first live refresh runs in the background.
+    """
+    if template_store.current is not None:
+        return template_store.current
+    
+    saved = price_snapshot_file.load() if price_snapshot_file else None
+    if saved is not None:
+        return template_store.publish(catalog_from_price_snapshot(saved))
+    return template_store.publish(fallback_catalog())
+
+
+def get_template_snapshot() -> TemplateSnapshot:
+    """Get the current template snapshot, building it on first use"""
+    return template_store.get()
+
+
+async def get_template_snapshot_async() -> TemplateSnapshot:
+    """Get the current template snapshot without blocking the event loop"""
+    return await template_store.get_async()
+
+
+def fetch_region_catalog(region: str) -> CatalogBuild:
+    """Fetch live prices for one region and price every template there"""
+    prices = get_pricing_client().get_prices(template_registry.price_keys(region))
+    return price_template_catalog(prices, region, previous=get_region_store(region).current)
+
+
+async def fetch_region_catalog_async(region: str, refresh_prices: bool = False) -> CatalogBuild:
+    """Fetch live prices for one region concurrently and price every template there"""
+    prices = await get_async_pricing_client().get_prices(
+        template_registry.price_keys(region), refresh=refresh_prices
+    )
+    return price_template_catalog(prices, region, previous=get_region_store(region).current)
+
+
+# One snapshot store per region, created on first use and seeded with
+# fallback pricing so no request waits on the Pricing API; live prices are
+# fetched in the background on first access. Each refreshes on its own
+# schedule (stale-while-revalidate), and its unit prices live under
+# region-specific PriceKeys in the shared cache.
+region_stores: Dict[str, SnapshotStore] = {}
+
+
+def get_region_store(region: str) -> SnapshotStore:
+    """Snapshot store for a region (the main template store for DEFAULT_REGION)"""
+    if region == DEFAULT_REGION:
+        return template_store
+    if region not in REGION_NAMES:
+        raise ValueError(f"Unsupported region: {region}")
+    
+    store = region_stores.get(region)
+    if store is None:
+        store = SnapshotStore(
+            lambda: fetch_region_catalog(region),
+            async_builder=lambda: fetch_region_catalog_async(region, refresh_prices=True),
+            max_age_seconds=DEFAULT_TTL_SECONDS,
+        )
+        # Seeded before it's shared, so readers never find it empty
+        store.publish(fallback_catalog(region))
+        store = region_stores.setdefault(region, store)
+    return store
+
+
+async def get_region_snapshots_async(regions: Sequence[str]) -> List[TemplateSnapshot]:
+    """
+    Get template snapshots for several regions at once
+    
+    Regions that need pricing fetch it in parallel, so a cold matrix takes
+    about as long as the slowest region rather than the sum of all of them.
+    """
+    return list(await asyncio.gather(
+        *(get_region_store(region).get_async() for region in regions)
+    ))
+
+
+def _snapshot_ages(attribute: str):
+    """(labels, age) of every published snapshot, for /metrics"""
+    for region, store in ((DEFAULT_REGION, template_store), *region_stores.items()):
+        snapshot = store.current
+        if snapshot is not None:
+            labels = {"region": region, "pricing_source": snapshot.pricing_source}
+            yield labels, getattr(snapshot, attribute)
+
+
+callback_metric(
+    "price_snapshot_age_seconds",
+    "Seconds since the current template snapshot was published",
+    "gauge",
+    lambda: _snapshot_ages("age_seconds"),
+    ("region", "pricing_source"),
+)
+callback_metric(
+    "price_data_age_seconds",
+    "Seconds since the current snapshot's prices were fetched",
+    "gauge",
+    lambda: _snapshot_ages("price_age_seconds"),
+    ("region", "pricing_source"),
+)
+for _stat, _help in (
+    ("hits", "Pricing cache lookups answered from the cache"),
+    ("negative_hits", "Cache hits on a cached failed lookup"),
+    ("misses", "Pricing cache lookups that had to fetch"),
+    ("evictions", "Entries evicted to stay under maxsize"),
+    ("expirations", "Entries dropped after their TTL"),
+    ("coalesced", "Lookups that waited on another caller's fetch"),
+):
+    callback_metric(
+        f"pricing_cache_{_stat}_total", _help, "counter",
+        lambda stat=_stat: [({}, pricing_cache.stats()[stat])],
+    )
+callback_metric(
+    "pricing_cache_entries",
+    "Prices currently cached",
+    "gauge",
+    lambda: [({}, pricing_cache.stats()["size"])],
+)
+
+
+def build_region_matrix(
+    regions: Sequence[str],
+    snapshots: Sequence[TemplateSnapshot],
+    budget: Optional[float] = None
+) -> Dict:
+    """
+    Region-by-template cost matrix
+    
+    Args:
+        regions: Region codes (at least one)
+        snapshots: Template snapshot for each region
+        budget: Also count the templates each region can run within this
         
-        # Fallback to hardcoded pricing
-        ec2_monthly = 3.07
-        rds_monthly = 11.68
-        lambda_100k_128mb_200ms = 2.00
-        lambda_50k_512mb_2000ms = 2.00
-        lambda_20k_128mb_100ms = 0.40
-        lambda_daily_scraper = 0.50
+    Returns:
+        Matrix of total costs (one row per region, one column per
+        template in catalog order) plus the cheapest region per template
+    """
+    costs = np.array(
+        [[template.total_cost for template in snapshot.templates] for snapshot in snapshots],
+        dtype=np.float64,
+    ).reshape(len(snapshots), len(template_registry.templates))
+    cheapest = costs.argmin(axis=0).tolist()
+    templates = template_registry.templates
     
-    # Build project templates with calculated pricing
-    templates = [
-        ProjectTemplate(
-            id=1,
-            name="Static Portfolio Website",
-            description="HTML/CSS/JS site with global CDN delivery",
-            total_cost=1.5,
-            components=[
-                CostComponent(service="S3", description="Storage (5GB)", cost=0.12),
-                CostComponent(service="CloudFront", description="CDN (100GB transfer)", cost=0.85),
-                CostComponent(service="Route53", description="DNS hosting", cost=0.50),
-            ],
-            estimated_traffic="~50K visitors/month",
-            complexity="Beginner",
-            pricing_source=pricing_source,
-        ),
-        ProjectTemplate(
-            id=2,
-            name="Serverless REST API",
-            description="API with database for small apps",
-            total_cost=round(lambda_100k_128mb_200ms + 1.00 + 1.25 + 0.25, 2),
-            components=[
-                CostComponent(
-                    service="Lambda", 
-                    description="100K requests, 128MB, 200ms avg", 
-                    cost=round(lambda_100k_128mb_200ms, 2)
-                ),
-                CostComponent(service="API Gateway", description="100K requests", cost=1.00),
-                CostComponent(service="DynamoDB", description="1GB storage, 100K reads/writes", cost=1.25),
-                CostComponent(service="CloudWatch", description="Basic logs", cost=0.25),
-            ],
-            estimated_traffic="~100K API calls/month",
-            complexity="Intermediate",
-            pricing_source=pricing_source,
-        ),
-        ProjectTemplate(
-            id=3,
-            name="Scheduled Data Scraper",
-            description="Run tasks on a schedule, store results",
-            total_cost=round(lambda_daily_scraper + 0.25 + 1.25, 2),
-            components=[
-                CostComponent(
-                    service="Lambda", 
-                    description="Daily runs, 5 min each", 
-                    cost=round(lambda_daily_scraper, 2)
-                ),
-                CostComponent(service="EventBridge", description="Scheduled triggers", cost=0.00),
-                CostComponent(service="S3", description="Results storage (10GB)", cost=0.25),
-                CostComponent(service="DynamoDB", description="Metadata storage", cost=1.25),
-            ],
-            estimated_traffic="Daily automated tasks",
-            complexity="Intermediate",
-            pricing_source=pricing_source,
-        ),
-        ProjectTemplate(
-            id=4,
-            name="Small Full-Stack App",
-            description="Always-on server with database",
-            total_cost=round(ec2_monthly + rds_monthly + 0.40 + 0.19, 2),
-            components=[
-                CostComponent(
-                    service="EC2", 
-                    description="t4g.nano (ARM, 2 vCPU, 0.5GB RAM)", 
-                    cost=round(ec2_monthly, 2)
-                ),
-                CostComponent(
-                    service="RDS", 
-                    description="t4g.micro MySQL (1 vCPU, 1GB RAM)", 
-                    cost=round(rds_monthly, 2)
-                ),
-                CostComponent(service="EBS", description="20GB SSD storage", cost=0.40),
-                CostComponent(service="Data Transfer", description="10GB outbound", cost=0.19),
-            ],
-            estimated_traffic="~10K users/month",
-            complexity="Advanced",
-            pricing_source=pricing_source,
-        ),
-        ProjectTemplate(
-            id=5,
-            name="Image Processing Service",
-            description="Upload images, auto-resize/optimize",
-            total_cost=round(lambda_50k_512mb_2000ms + 0.50 + 0.50 + 0.50, 2),
-            components=[
-                CostComponent(
-                    service="Lambda", 
-                    description="50K invocations, 512MB, 2s avg", 
-                    cost=round(lambda_50k_512mb_2000ms, 2)
-                ),
-                CostComponent(service="S3", description="Input/output storage (20GB)", cost=0.50),
-                CostComponent(service="S3", description="100K PUT/GET requests", cost=0.50),
-                CostComponent(service="CloudWatch", description="Logs", cost=0.50),
-            ],
-            estimated_traffic="~50K images/month",
-            complexity="Intermediate",
-            pricing_source=pricing_source,
-        ),
-        ProjectTemplate(
-            id=6,
-            name="Discord/Slack Bot",
-            description="Serverless bot responding to commands",
-            total_cost=round(lambda_20k_128mb_100ms + 0.20 + 0.40, 2),
-            components=[
-                CostComponent(
-                    service="Lambda", 
-                    description="20K invocations, 128MB, 100ms", 
-                    cost=round(lambda_20k_128mb_100ms, 2)
-                ),
-                CostComponent(service="API Gateway", description="Webhook endpoint", cost=0.20),
-                CostComponent(service="DynamoDB", description="Bot state/config", cost=0.40),
-            ],
-            estimated_traffic="~20K bot commands/month",
-            complexity="Beginner",
-            pricing_source=pricing_source,
-        ),
-    ]
+    result = {
+        "regions": list(regions),
+        "region_names": [REGION_NAMES[region] for region in regions],
+        "projects": [{"id": spec.id, "name": spec.name} for spec in templates],
+        "costs": costs.tolist(),
+        "pricing_sources": [snapshot.pricing_source for snapshot in snapshots],
+        "cheapest_region_by_project": [
+            {"id": spec.id, "region": regions[row], "cost": float(costs[row, column])}
+            for column, (spec, row) in enumerate(zip(templates, cheapest))
+        ],
+    }
+    if budget is not None:
+        result["budget"] = budget
+        result["affordable_counts"] = [
+            snapshot.budget_index.count_within(budget) for snapshot in snapshots
+        ]
+    return result
+
+
+def find_cheapest_region(
+    budget: float,
+    regions: Sequence[str],
+    snapshots: Sequence[TemplateSnapshot]
+) -> Dict:
+    """
+    Pick the region where the budget goes furthest
     
-    return templates
+    That's the region where the most templates fit, ties going to the one
+    where those templates cost least in total, then to the earlier region
+    in `regions`.
+    
+    Returns:
+        get_projects_by_budget() for the chosen region, plus the region
+        and how every other candidate compared
+    """
+    ranking = []
+    for position, (region, snapshot) in enumerate(zip(regions, snapshots)):
+        count = snapshot.budget_index.count_within(budget)
+        spend = round(sum(snapshot.budget_index.costs[:count]), 2)
+        ranking.append((-count, spend, position, region, snapshot))
+    ranking.sort(key=lambda entry: entry[:3])
+    
+    _, _, _, region, snapshot = ranking[0]
+    result = get_projects_by_budget(budget, snapshot=snapshot)
+    result["region"] = region
+    result["region_name"] = REGION_NAMES[region]
+    result["alternatives"] = [
+        {"region": other, "affordable_count": -count, "affordable_cost": spend}
+        for count, spend, _, other, _ in ranking
+    ]
+    return result
 
 
-def get_projects_by_budget(budget: float) -> Dict:
+def get_projects_by_budget(
+    budget: float,
+    snapshot: Optional[TemplateSnapshot] = None
+) -> Dict:
     """
     Filter projects that fit within the given budget
     Uses live AWS pricing when available
     
     Args:
         budget: Monthly budget in USD
+        snapshot: Template snapshot to filter (default: current snapshot)
         
     Returns:
-        Dictionary with affordable and expensive projects
+        Dictionary with affordable and expensive projects, each sorted
+        from cheapest to most expensive
     """
-    all_projects = get_live_project_templates()
+    if snapshot is None:
+        snapshot = get_template_snapshot()
     
-    affordable = [p for p in all_projects if p.total_cost <= budget]
-    too_expensive = [p for p in all_projects if p.total_cost > budget]
+    # One bisect over the snapshot's cost-sorted index
+    split = snapshot.budget_index.split(budget)
+    return _budget_response(budget, snapshot, split)
+
+
+def encode_projects_by_budget(
+    budget: float,
+    snapshot: Optional[TemplateSnapshot] = None
+) -> bytes:
+    """
+    get_projects_by_budget() as JSON bytes, looked up in the snapshot's
+    precomputed answer table (one bisect, no per-template work)
+    """
+    if snapshot is None:
+        snapshot = get_template_snapshot()
+    return snapshot.budget_answers.render(budget)
+
+
+def encode_budget_batch(
+    budgets: Sequence[float],
+    regions: Sequence[str],
+    snapshots: Sequence[TemplateSnapshot]
+) -> bytes:
+    """
+    Answer many budget queries per region in one pass
     
-    # Calculate some stats
-    cheapest = min([p.total_cost for p in affordable]) if affordable else 0
-    most_expensive_affordable = max([p.total_cost for p in affordable]) if affordable else 0
-    remaining_budget = budget - most_expensive_affordable if affordable else budget
+    Each region's templates are sent once, cheapest first; each budget's
+    partition is the ids on either side of its split point in that list,
+    found for all budgets with one vectorized search.
     
-    # Check pricing source
-    pricing_source = all_projects[0].pricing_source if all_projects else "unknown"
+    Returns:
+        JSON bytes with, per region, the projects and one answer per budget
+    """
+    results = []
+    for region, snapshot in zip(regions, snapshots):
+        index = snapshot.budget_index
+        ids = [template.id for template in index.templates]
+        counts = index.count_within_many(budgets).tolist()
+        
+        answers = []
+        for budget, count in zip(budgets, counts):
+            answers.append({
+                "budget": budget,
+                "affordable_count": count,
+                "affordable_project_ids": ids[:count],
+                "expensive_project_ids": ids[count:],
+                "stats": {
+                    "cheapest": index.costs[0] if count else 0,
+                    "remaining_budget": budget - (index.costs[count - 1] if count else 0),
+                },
+            })
+        
+        results.append(RawJSON(encode_object({
+            "region": region,
+            "pricing_source": snapshot.pricing_source,
+            "snapshot_version": snapshot.version,
+            "projects": join_array(index.fragments),
+            "answers": answers,
+        })))
+    
+    return encode_object({
+        "budgets": list(budgets),
+        "results": join_array(results),
+    })
+
+
+def encode_all_projects(snapshot: TemplateSnapshot) -> bytes:
+    """Every template in catalog order, as JSON bytes"""
+    return encode_object({
+        "count": len(snapshot.templates),
+        "projects": join_array(snapshot.encoded_templates),
+        "pricing_source": snapshot.pricing_source,
+    })
+
+
+def _budget_response(
+    budget: float,
+    snapshot: TemplateSnapshot,
+    split: BudgetSplit,
+) -> Dict:
+    """Budget query response for a split of the snapshot's templates"""
+    pricing_source = snapshot.pricing_source
     
     return {
         "budget": budget,
-        "affordable_count": len(affordable),
-        "affordable_projects": affordable,
-        "expensive_projects": too_expensive,
+        "affordable_count": len(split.affordable),
+        "affordable_projects": split.affordable,
+        "expensive_projects": split.expensive,
         "stats": {
-            "cheapest": cheapest,
-            "remaining_budget": remaining_budget,
+            "cheapest": split.cheapest,
+            "remaining_budget": budget - split.most_expensive_affordable,
         },
         "pricing_source": pricing_source,
-        "pricing_note": "Live AWS pricing" if pricing_source == "live" else "Using fallback pricing (AWS API unavailable)"
-    }
\ No newline at end of file
+        "pricing_note": pricing_note(pricing_source),
+    }
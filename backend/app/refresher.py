@@ -0,0 +1,124 @@
+"""
+Background pricing refresher
+Keeps the template snapshot fresh so user requests never wait on AWS
+"""
+
+import asyncio
+import logging
+import os
+import random
+from typing import Optional
+
+from app.metrics import PRICING_REFRESH_FAILURES
+from app.snapshot import SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_SECONDS = 60 * 60
+DEFAULT_JITTER = 0.1
+DEFAULT_RETRY_SECONDS = 30.0
+
+
+class PricingRefresher:
+    """
+    Periodically re-prices the template snapshot
+
+    Refreshes on a fixed interval with random jitter (so several workers
+    don't hit the Pricing API in lockstep). When a refresh fails or only
+    gets fallback pricing, it retries with exponential backoff, capped at
+    the regular interval. The store keeps serving the last good snapshot
+    the whole time.
+    """
+
+    def __init__(
+        self,
+        store: SnapshotStore,
+        interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+        jitter: float = DEFAULT_JITTER,
+        retry_seconds: float = DEFAULT_RETRY_SECONDS,
+    ):
+        """
+        Args:
+            store: Snapshot store to refresh
+            interval_seconds: Time between successful refreshes
+            jitter: Random +/- fraction applied to every delay
+            retry_seconds: First retry delay after a failure (doubles each time)
+        """
+        self.store = store
+        self.interval_seconds = interval_seconds
+        self.jitter = jitter
+        self.retry_seconds = retry_seconds
+        self.consecutive_failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, store: SnapshotStore) -> "PricingRefresher":
+        """Build a refresher configured by PRICING_REFRESH_INTERVAL_SECONDS"""
+        interval = float(os.environ.get("PRICING_REFRESH_INTERVAL_SECONDS", DEFAULT_INTERVAL_SECONDS))
+        return cls(store, interval_seconds=interval)
+
+    def next_delay(self) -> float:
+        """Seconds to wait before the next refresh attempt"""
+        if self.consecutive_failures == 0:
+            delay = self.interval_seconds
+        else:
+            delay = min(
+                self.retry_seconds * 2 ** (self.consecutive_failures - 1),
+                self.interval_seconds,
+            )
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def refresh_once(self) -> bool:
+        """
+        Run a single refresh
+
+        Returns:
+            True if the snapshot now carries live pricing
+        """
+        try:
+            snapshot = await self.store.refresh_async()
+            succeeded = snapshot.pricing_source == "live"
+        except Exception as e:
+            PRICING_REFRESH_FAILURES.inc()
+            logger.warning("⚠️  Pricing refresh failed: %s", e)
+            succeeded = False
+
+        self.consecutive_failures = 0 if succeeded else self.consecutive_failures + 1
+        return succeeded
+
+    def initial_delay(self) -> float:
+        """
+        Seconds to wait before the first refresh
+
+        Zero unless the store already holds live prices (e.g. loaded from
+        the on-disk snapshot), in which case the first refresh is due when
+        those prices are one interval old.
+        """
+        snapshot = self.store.current
+        if snapshot is None or snapshot.pricing_source != "live":
+            return 0.0
+        remaining = self.interval_seconds - snapshot.price_age_seconds
+        return max(0.0, remaining) * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def run(self) -> None:
+        """Refresh when due, then forever on the configured schedule"""
+        await asyncio.sleep(self.initial_delay())
+        while True:
+            await self.refresh_once()
+            await asyncio.sleep(self.next_delay())
+
+    def start(self) -> None:
+        """Start refreshing in the background on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Cancel the background task and wait for it to finish"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,363 @@
+"""
+Versioned, immutable snapshots of priced project templates
+Built once per pricing refresh and shared by every endpoint
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import (
+    Any, Awaitable, Callable, Hashable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+)
+
+from pydantic import BaseModel
+
+from app.budget_index import BudgetAnswerTable, BudgetIndex
+from app.json_encoding import encode_model
+from app.metrics import PRICING_REFRESH_FAILURES
+
+logger = logging.getLogger(__name__)
+
+
+PRICING_NOTES = {
+    "live": "Live AWS pricing",
+    "fallback": "Using fallback pricing (AWS API unavailable)",
+}
+
+
+def pricing_note(pricing_source: str) -> str:
+    """Human-readable description of a pricing source"""
+    return PRICING_NOTES.get(pricing_source, PRICING_NOTES["fallback"])
+
+
+class CatalogBuild(NamedTuple):
+    """
+    Output of a snapshot builder
+
+    Attributes:
+        templates: Priced templates, in catalog order
+        prices: Unit prices the templates were priced with
+        pricing_source: "live" or "fallback"
+        priced_at: Unix timestamp the prices were fetched
+        plan: Unrounded costs the templates were built from, kept so the
+            next build can re-price only what changed (None if unknown)
+    """
+    templates: List[BaseModel]
+    prices: Mapping[Hashable, float]
+    pricing_source: str
+    priced_at: float
+    plan: Any = None
+
+
+@dataclass(frozen=True)
+class TemplateSnapshot:
+    """
+    Priced project templates frozen at a point in time
+
+    Attributes:
+        version: Monotonic snapshot number (increments on every swap)
+        created_at: Unix timestamp the snapshot was built
+        pricing_source: "live" or "fallback"
+        templates: Priced templates, in catalog order
+        prices: Unit prices the templates were priced with (read-only)
+        priced_at: Unix timestamp the prices were fetched
+        budget_index: The templates sorted by total cost
+        fingerprint: Hash of the priced templates; equal across processes
+            (and versions) whenever the served content is equal
+        encoded_templates: Each template pre-encoded as JSON, in catalog order
+        budget_answers: Pre-serialized budget query response per cost
+            breakpoint interval
+        plan: Unrounded costs the templates were built from (see CatalogBuild)
+    """
+    version: int
+    created_at: float
+    pricing_source: str
+    templates: Tuple[BaseModel, ...] = field(default_factory=tuple)
+    prices: Mapping[Hashable, float] = field(default_factory=lambda: MappingProxyType({}))
+    priced_at: float = 0.0
+    budget_index: BudgetIndex = field(default_factory=BudgetIndex)
+    fingerprint: str = ""
+    encoded_templates: Tuple[bytes, ...] = ()
+    budget_answers: BudgetAnswerTable = field(
+        default_factory=lambda: BudgetAnswerTable.build(BudgetIndex())
+    )
+    plan: Any = None
+
+    @property
+    def age_seconds(self) -> float:
+        """Seconds since the snapshot was built"""
+        return max(0.0, time.time() - self.created_at)
+
+    @property
+    def price_age_seconds(self) -> float:
+        """Seconds since the snapshot's prices were fetched"""
+        return max(0.0, time.time() - self.priced_at)
+
+
+def fingerprint_templates(encoded_templates: Sequence[bytes]) -> str:
+    """Content hash of encoded templates"""
+    digest = hashlib.sha256()
+    for encoded in encoded_templates:
+        digest.update(encoded)
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class RefreshFailed(Exception):
+    """A refresh only produced fallback pricing; the last good snapshot was kept"""
+
+
+# (store, snapshot) pairs handed out in the current request, if recording
+_served_snapshots: ContextVar[Optional[List[Tuple["SnapshotStore", TemplateSnapshot]]]] = ContextVar(
+    "served_snapshots", default=None
+)
+
+
+@contextmanager
+def record_served_snapshots() -> Iterator[List[Tuple["SnapshotStore", TemplateSnapshot]]]:
+    """
+    Collect every snapshot SnapshotStore.get/get_async return inside the block
+
+    Tasks and threadpool calls started inside the block copy the context
+    and so append to the same list, which lets middleware report the
+    snapshots a handler actually used.
+
+    Yields:
+        List of (store, snapshot), in the order they were handed out
+    """
+    served: List[Tuple["SnapshotStore", TemplateSnapshot]] = []
+    token = _served_snapshots.set(served)
+    try:
+        yield served
+    finally:
+        _served_snapshots.reset(token)
+
+
+class SnapshotStore:
+    """
+    Holds the current template snapshot and swaps in new ones atomically
+
+    Readers grab `current` (a single attribute read) and keep using that
+    snapshot for the whole request, so a concurrent refresh can never hand
+    them a half-built catalog. A live-priced snapshot is never replaced by
+    a fallback-priced one.
+    """
+
+    def __init__(
+        self,
+        builder: Callable[[], CatalogBuild],
+        async_builder: Optional[Callable[[], Awaitable[CatalogBuild]]] = None,
+        max_age_seconds: Optional[float] = None,
+        retry_after_seconds: float = 60.0,
+    ):
+        """
+        Args:
+            builder: Returns freshly priced templates and their prices
+            async_builder: Coroutine version of `builder` used by the async methods
+            max_age_seconds: Snapshots older than this are refreshed on access
+                (None = only refresh explicitly); fallback-priced snapshots
+                are retried on access regardless of age
+            retry_after_seconds: Minimum gap between on-access refresh attempts
+        """
+        self._builder = builder
+        self._async_builder = async_builder
+        self._max_age_seconds = max_age_seconds
+        self._retry_after_seconds = retry_after_seconds
+        self._lock = threading.Lock()
+        self._async_lock: Optional[asyncio.Lock] = None
+        self._async_lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._background_refresh: Optional[asyncio.Task] = None
+        self._last_attempt = 0.0
+        self._refreshing = 0
+        self._version = 0
+        self.current: Optional[TemplateSnapshot] = None
+
+    @property
+    def refreshing(self) -> bool:
+        """Whether a refresh is in flight (or scheduled to start)"""
+        background = self._background_refresh
+        return self._refreshing > 0 or (background is not None and not background.done())
+
+    def get(self) -> TemplateSnapshot:
+        """Return the current snapshot, building it on first use"""
+        return self._served(self._get())
+
+    async def get_async(self) -> TemplateSnapshot:
+        """
+        Return the current snapshot without waiting on the Pricing API
+
+        Stale snapshots are served as-is while a background refresh runs
+        (stale-while-revalidate). Only the very first call, before any
+        snapshot exists, waits for a build.
+        """
+        return self._served(await self._get_async())
+
+    def _served(self, snapshot: Optional[TemplateSnapshot]) -> Optional[TemplateSnapshot]:
+        served = _served_snapshots.get()
+        if served is not None and snapshot is not None:
+            served.append((self, snapshot))
+        return snapshot
+
+    def _get(self) -> TemplateSnapshot:
+        snapshot = self.current
+        if snapshot is not None and not self._needs_refresh(snapshot):
+            return snapshot
+
+        with self._lock:
+            # Another thread may have rebuilt while we waited for the lock
+            snapshot = self.current
+            if snapshot is not None and not self._needs_refresh(snapshot):
+                return snapshot
+            try:
+                return self._rebuild()
+            except RefreshFailed:
+                return self.current
+
+    async def _get_async(self) -> TemplateSnapshot:
+        snapshot = self.current
+        if snapshot is None:
+            async with self._get_async_lock():
+                if self.current is None:
+                    return await self._refresh_async_locked()
+                return self.current
+
+        if self._needs_refresh(snapshot) and not self.refreshing:
+            self._last_attempt = time.monotonic()
+            self._background_refresh = asyncio.create_task(self._refresh_quietly())
+        return snapshot
+
+    async def refresh_async(self) -> TemplateSnapshot:
+        """
+        Rebuild the snapshot with `async_builder` and swap it in
+
+        Concurrent callers share the lock, so only one rebuild runs at a time.
+
+        Raises:
+            RefreshFailed: Only fallback pricing was available and a
+                live-priced snapshot was kept instead
+        """
+        async with self._get_async_lock():
+            return await self._refresh_async_locked()
+
+    def refresh(self) -> TemplateSnapshot:
+        """
+        Rebuild the snapshot unconditionally and swap it in
+
+        Raises:
+            RefreshFailed: Only fallback pricing was available and a
+                live-priced snapshot was kept instead
+        """
+        with self._lock:
+            return self._rebuild()
+
+    def publish(self, build: CatalogBuild) -> TemplateSnapshot:
+        """
+        Swap in already-priced templates as a new snapshot version
+
+        Raises:
+            RefreshFailed: The build uses fallback pricing and the current
+                snapshot is live-priced (the current snapshot is kept)
+        """
+        with self._lock:
+            return self._swap(build)
+
+    async def _refresh_async_locked(self) -> TemplateSnapshot:
+        self._last_attempt = time.monotonic()
+        self._refreshing += 1
+        try:
+            if self._async_builder is None:
+                build = await asyncio.to_thread(self._builder)
+            else:
+                build = await self._async_builder()
+            return self.publish(build)
+        finally:
+            self._refreshing -= 1
+
+    async def _refresh_quietly(self) -> None:
+        try:
+            await self.refresh_async()
+        except Exception as e:
+            PRICING_REFRESH_FAILURES.inc()
+            logger.warning("⚠️  Background pricing refresh failed: %s", e)
+
+    def _rebuild(self) -> TemplateSnapshot:
+        self._last_attempt = time.monotonic()
+        self._refreshing += 1
+        try:
+            return self._swap(self._builder())
+        finally:
+            self._refreshing -= 1
+
+    def _swap(self, build: CatalogBuild) -> TemplateSnapshot:
+        pricing_source = build.pricing_source
+        current = self.current
+        if pricing_source != "live" and current is not None and current.pricing_source == "live":
+            raise RefreshFailed("Live pricing unavailable, keeping the last good snapshot")
+
+        # Serialize once here so requests only concatenate bytes. Templates
+        # carried over from the current snapshot (the same objects, see
+        # CatalogBuild.plan) keep their encoding and place in the index.
+        templates = tuple(build.templates)
+        if current is not None and len(current.templates) == len(templates):
+            changed = [
+                i for i, (template, previous) in enumerate(zip(templates, current.templates))
+                if template is not previous
+            ]
+            encoded_list = list(current.encoded_templates)
+            for i in changed:
+                encoded_list[i] = encode_model(templates[i])
+            encoded = tuple(encoded_list)
+            budget_index = current.budget_index.updated(templates, encoded, changed)
+        else:
+            changed = list(range(len(templates)))
+            encoded = tuple(encode_model(template) for template in templates)
+            budget_index = BudgetIndex.build(templates, encoded)
+
+        if not changed and current is not None and current.pricing_source == pricing_source:
+            budget_answers = current.budget_answers
+            fingerprint = current.fingerprint
+        else:
+            budget_answers = BudgetAnswerTable.build(budget_index, {
+                "pricing_source": pricing_source,
+                "pricing_note": pricing_note(pricing_source),
+            })
+            fingerprint = fingerprint_templates(encoded)
+
+        self._version += 1
+        snapshot = TemplateSnapshot(
+            version=self._version,
+            created_at=time.time(),
+            pricing_source=pricing_source,
+            templates=templates,
+            prices=MappingProxyType(dict(build.prices)),
+            priced_at=build.priced_at,
+            budget_index=budget_index,
+            fingerprint=fingerprint,
+            encoded_templates=encoded,
+            budget_answers=budget_answers,
+            plan=build.plan,
+        )
+        self.current = snapshot
+        return snapshot
+
+    def _get_async_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._async_lock is None or self._async_lock_loop is not loop:
+            self._async_lock = asyncio.Lock()
+            self._async_lock_loop = loop
+        return self._async_lock
+
+    def _needs_refresh(self, snapshot: TemplateSnapshot) -> bool:
+        if self._max_age_seconds is None:
+            return False
+        # Fallback prices are only a stand-in: retry live pricing as soon as
+        # the retry gap allows instead of serving them for a whole max age
+        if snapshot.pricing_source == "live" and snapshot.age_seconds <= self._max_age_seconds:
+            return False
+        return time.monotonic() - self._last_attempt >= self._retry_after_seconds
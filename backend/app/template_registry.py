@@ -0,0 +1,570 @@
+"""
+Declarative project template registry
+Loads template specs from JSON data files and compiles them into an
+evaluation plan that re-prices every template in one pass
+"""
+
+import json
+import os
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field
+
+from app.aws_pricing import PriceKey
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(__file__), "catalog")
+
+
+class PriceRef(NamedTuple):
+    """A unit price independent of region (bound to one by `PriceKey`)"""
+    service: str
+    sku: str
+    variant: str = ""
+
+    def in_region(self, region: str) -> PriceKey:
+        return PriceKey(self.service, region, self.sku, self.variant)
+
+
+class PriceRefSpec(BaseModel):
+    """A unit price as written in a catalog file"""
+    model_config = ConfigDict(extra="forbid")
+
+    service: str
+    sku: str
+    variant: str = ""
+
+    @property
+    def price_ref(self) -> PriceRef:
+        return PriceRef(self.service, self.sku, self.variant)
+
+
+class UsageSpec(PriceRefSpec):
+    """
+    Quantity of a priced unit, e.g. 730 hours of t4g.nano
+
+    `scales_with_traffic` and `scales_with_duration` mark usage that a
+    forecast multiplies by its traffic and run-time scenarios.
+    """
+    quantity: float = Field(ge=0)
+    scales_with_traffic: bool = False
+    scales_with_duration: bool = False
+
+
+class LambdaUsageSpec(BaseModel):
+    """Shorthand for a Lambda function's monthly requests and compute"""
+    model_config = ConfigDict(extra="forbid")
+
+    requests: float
+    duration_ms: float
+    memory_mb: float
+
+    def to_usage(self) -> List[UsageSpec]:
+        gb_seconds = (self.memory_mb / 1024) * (self.duration_ms / 1000) * self.requests
+        return [
+            UsageSpec(service="lambda", sku="requests", quantity=self.requests, scales_with_traffic=True),
+            UsageSpec(
+                service="lambda", sku="duration", quantity=gb_seconds,
+                scales_with_traffic=True, scales_with_duration=True,
+            ),
+        ]
+
+
+class ComponentSpec(BaseModel):
+    """
+    One line of a template's cost breakdown
+
+    Cost is `cost` (a fixed monthly amount) plus the price of every
+    `usage` entry (and the `lambda` shorthand, if given). A `shared`
+    component (e.g. a Route53 hosted zone) is paid for once when several
+    projects run in the same account.
+    """
+    model_config = ConfigDict(extra="forbid", populate_by_name=True)
+
+    service: str
+    description: str
+    cost: float = 0.0
+    shared: bool = False
+    usage: List[UsageSpec] = Field(default_factory=list)
+    lambda_usage: Optional[LambdaUsageSpec] = Field(default=None, alias="lambda")
+
+    def all_usage(self) -> List[UsageSpec]:
+        usage = list(self.usage)
+        if self.lambda_usage is not None:
+            usage.extend(self.lambda_usage.to_usage())
+        return usage
+
+
+class TemplateSpec(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    id: int
+    name: str
+    description: str
+    estimated_traffic: str
+    complexity: str
+    components: List[ComponentSpec] = Field(min_length=1)
+
+
+class FallbackPriceSpec(PriceRefSpec):
+    price: float
+
+
+class FreeTierSpec(BaseModel):
+    """
+    Monthly free allowance, e.g. 1M Lambda requests
+
+    The allowance is per account, so it is shared by every component of
+    a plan that uses any of the `applies_to` prices.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    name: str
+    quantity: float = Field(ge=0)
+    applies_to: List[PriceRefSpec] = Field(min_length=1)
+    new_accounts_only: bool = False
+
+
+class PriceTierSpec(PriceRefSpec):
+    """Volume discount: monthly usage beyond `above` units costs `price_factor` x the unit price"""
+    above: float = Field(ge=0)
+    price_factor: float = Field(ge=0)
+
+
+class CatalogFile(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    fallback_prices: List[FallbackPriceSpec] = Field(default_factory=list)
+    free_tier: List[FreeTierSpec] = Field(default_factory=list)
+    price_tiers: List[PriceTierSpec] = Field(default_factory=list)
+    templates: List[TemplateSpec] = Field(default_factory=list)
+
+
+class PlanResult(NamedTuple):
+    """
+    Unrounded costs from one evaluation
+
+    Attributes:
+        component_costs: Per template, the cost of each component
+        totals: Per template, the total monthly cost
+    """
+    component_costs: List[List[float]]
+    totals: List[float]
+
+
+class TemplateRegistry:
+    """
+    Compiled template catalog
+
+    A component's cost is a fixed amount plus its share of the plan's
+    bill for each unit price it uses. The bill is worked out per plan
+    (template), as AWS does per account: usage of a price is summed over
+    all components, free-tier allowances are taken off the total, and
+    volume tiers are applied to what's left. Each component is then
+    charged in proportion to the usage it contributed.
+
+    The catalog is compiled once into flat NumPy arrays (usage terms, a
+    template x price usage grid, pool and tier matrices), so re-pricing
+    every template is a handful of vectorized operations. It also records
+    which components each price feeds, so after a refresh only the
+    components whose prices moved are re-priced (see reprice()).
+    """
+
+    def __init__(
+        self,
+        templates: List[TemplateSpec],
+        fallback_prices: Dict[PriceRef, float],
+        free_tier: Sequence[FreeTierSpec] = (),
+        price_tiers: Sequence[PriceTierSpec] = (),
+    ):
+        """
+        Args:
+            templates: Template specs, in catalog order
+            fallback_prices: Unit prices used when a live lookup fails
+            free_tier: Free allowances shared across each plan
+            price_tiers: Volume discount tiers
+
+        Raises:
+            ValueError: Duplicate template ids, a referenced price has no
+                fallback, or a price is covered by two free-tier pools
+        """
+        ids = [template.id for template in templates]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Duplicate template ids in catalog")
+
+        self.templates = templates
+        self.fallback = dict(fallback_prices)
+
+        self.price_refs: List[PriceRef] = []
+        price_index: Dict[PriceRef, int] = {}
+        component_fixed: List[float] = []
+        component_template: List[int] = []
+        template_offsets: List[int] = [0]
+        term_component: List[int] = []
+        term_price: List[int] = []
+        term_quantity: List[float] = []
+        term_scaling: List[Tuple[bool, bool]] = []
+
+        component_term_offsets: List[int] = [0]
+
+        for template_index, template in enumerate(templates):
+            for component in template.components:
+                component_index = len(component_fixed)
+                component_fixed.append(component.cost)
+                component_template.append(template_index)
+                for usage in component.all_usage():
+                    ref = usage.price_ref
+                    if ref not in price_index:
+                        if ref not in self.fallback:
+                            raise ValueError(
+                                f"Template {template.id} uses {ref} which has no fallback price"
+                            )
+                        price_index[ref] = len(self.price_refs)
+                        self.price_refs.append(ref)
+                    term_component.append(component_index)
+                    term_price.append(price_index[ref])
+                    term_quantity.append(usage.quantity)
+                    term_scaling.append((usage.scales_with_traffic, usage.scales_with_duration))
+                component_term_offsets.append(len(term_component))
+            template_offsets.append(len(component_fixed))
+
+        # Compiled plan
+        self.component_fixed = np.asarray(component_fixed, dtype=np.float64)
+        self.component_template = np.asarray(component_template, dtype=np.intp)
+        self.template_offsets = np.asarray(template_offsets, dtype=np.intp)
+        self.term_component = np.asarray(term_component, dtype=np.intp)
+        self.term_price = np.asarray(term_price, dtype=np.intp)
+        self.term_quantity = np.asarray(term_quantity, dtype=np.float64)
+        scaling = np.asarray(term_scaling, dtype=bool).reshape(len(term_scaling), 2)
+        self.term_traffic = scaling[:, 0]
+        self.term_duration = scaling[:, 1]
+        # Terms are compiled component by component, so each component's
+        # terms are one contiguous slice
+        self.component_term_offsets = np.asarray(component_term_offsets, dtype=np.intp)
+        self.price_index = price_index
+
+        # Dependency graph: the components each price feeds into
+        self.price_components: List[np.ndarray] = [
+            np.unique(self.term_component[self.term_price == price])
+            for price in range(len(self.price_refs))
+        ]
+
+        # Flat index of each term's cell in the (template, price) usage grid
+        self.term_cell = (
+            self.component_template[self.term_component] * len(self.price_refs) + self.term_price
+        )
+
+        self._compile_free_tier(free_tier, price_index)
+        self._compile_price_tiers(price_tiers, price_index)
+        self._term_units: Dict[bool, np.ndarray] = {}
+
+    def _compile_free_tier(self, pools: Sequence[FreeTierSpec], price_index: Dict[PriceRef, int]) -> None:
+        """Pool coverage matrix (pool x price) for the prices the catalog uses"""
+        self.free_tier: List[FreeTierSpec] = []
+        rows = []
+        covered: Dict[PriceRef, str] = {}
+        for pool in pools:
+            row = np.zeros(len(self.price_refs))
+            for spec in pool.applies_to:
+                ref = spec.price_ref
+                if ref in covered:
+                    raise ValueError(f"{ref} is in free tier pools {covered[ref]} and {pool.name}")
+                covered[ref] = pool.name
+                if ref in price_index:
+                    row[price_index[ref]] = 1.0
+            if row.any():
+                self.free_tier.append(pool)
+                rows.append(row)
+
+        self.pool_cover = np.array(rows).reshape(len(rows), len(self.price_refs))
+        self.pool_allowance = np.array([pool.quantity for pool in self.free_tier], dtype=np.float64)
+        self.pool_new_accounts_only = np.array(
+            [pool.new_accounts_only for pool in self.free_tier], dtype=bool
+        )
+
+    def _compile_price_tiers(self, tiers: Sequence[PriceTierSpec], price_index: Dict[PriceRef, int]) -> None:
+        """
+        Tier arrays for the prices the catalog uses
+
+        Stored as marginal factor changes, so the price-weighted units of a
+        quantity q are q + sum(delta * max(0, q - above)) over its tiers.
+        """
+        tiers = sorted(
+            (tier for tier in tiers if tier.price_ref in price_index),
+            key=lambda tier: (price_index[tier.price_ref], tier.above),
+        )
+        previous_factor: Dict[PriceRef, float] = {}
+        tier_price, tier_above, tier_delta = [], [], []
+        for tier in tiers:
+            ref = tier.price_ref
+            tier_price.append(price_index[ref])
+            tier_above.append(tier.above)
+            tier_delta.append(tier.price_factor - previous_factor.get(ref, 1.0))
+            previous_factor[ref] = tier.price_factor
+
+        self.tier_price = np.asarray(tier_price, dtype=np.intp)
+        self.tier_above = np.asarray(tier_above, dtype=np.float64)
+        self.tier_delta = np.asarray(tier_delta, dtype=np.float64)
+
+    def price_keys(self, region: str) -> List[PriceKey]:
+        """Every unit price the catalog needs in a region"""
+        return [ref.in_region(region) for ref in self.price_refs]
+
+    def fallback_prices(self, region: str) -> Dict[PriceKey, float]:
+        """Fallback unit prices keyed for a region"""
+        return {ref.in_region(region): self.fallback[ref] for ref in self.price_refs}
+
+    def evaluate(
+        self,
+        prices: Mapping[PriceKey, float],
+        region: str,
+        new_account: bool = False,
+    ) -> PlanResult:
+        """
+        Price every template in one pass
+
+        Args:
+            prices: Unit price for every key in `price_keys(region)`
+            region: Region the prices are for
+            new_account: Also apply free-tier offers limited to an
+                account's first 12 months
+
+        Returns:
+            Unrounded component costs and totals per template
+        """
+        costs = self.component_costs(self.price_vector(prices, region), new_account)
+        totals = np.bincount(
+            self.component_template, weights=costs, minlength=len(self.templates)
+        )
+
+        offsets = self.template_offsets.tolist()
+        flat = costs.tolist()
+        component_costs = [flat[offsets[i]:offsets[i + 1]] for i in range(len(self.templates))]
+        return PlanResult(component_costs, totals.tolist())
+
+    def price_vector(self, prices: Mapping[PriceKey, float], region: str) -> np.ndarray:
+        """Unit prices in plan order"""
+        return np.fromiter(
+            (prices[ref.in_region(region)] for ref in self.price_refs),
+            dtype=np.float64,
+            count=len(self.price_refs),
+        )
+
+    def usage(self) -> np.ndarray:
+        """Monthly usage of every price, summed per template (template x price)"""
+        shape = (len(self.templates), len(self.price_refs))
+        return np.bincount(
+            self.term_cell, weights=self.term_quantity, minlength=shape[0] * shape[1]
+        ).reshape(shape)
+
+    def billable_usage(self, usage: np.ndarray, new_account: bool = False) -> np.ndarray:
+        """
+        Usage left after free-tier allowances
+
+        Each pool's allowance is split across the prices it covers in
+        proportion to their usage.
+        """
+        pools = self.pool_cover
+        allowance = self.pool_allowance
+        if not new_account:
+            pools = pools[~self.pool_new_accounts_only]
+            allowance = allowance[~self.pool_new_accounts_only]
+        if len(allowance) == 0:
+            return usage
+
+        covered = usage @ pools.T
+        free = np.minimum(covered, allowance)
+        free_fraction = np.divide(free, covered, out=np.zeros_like(covered), where=covered > 0)
+        return usage * (1.0 - free_fraction @ pools)
+
+    def weighted_usage(self, billable: np.ndarray) -> np.ndarray:
+        """Billable usage expressed in first-tier units (volume discounts applied)"""
+        if len(self.tier_price) == 0:
+            return billable
+        weighted = billable.copy()
+        discounts = self.tier_delta * np.maximum(billable[:, self.tier_price] - self.tier_above, 0.0)
+        np.add.at(weighted.T, self.tier_price, discounts.T)
+        return weighted
+
+    def term_units(self, new_account: bool = False) -> np.ndarray:
+        """
+        Billable first-tier units of every usage term
+
+        Free tier and volume tiers depend on usage only, never on prices,
+        so this is worked out once and every (re)pricing is a dot product.
+        """
+        units = self._term_units.get(new_account)
+        if units is None:
+            usage = self.usage()
+            weighted = self.weighted_usage(self.billable_usage(usage, new_account))
+            # Billable units per unit of usage in each (template, price) cell
+            ratio = np.divide(weighted, usage, out=np.zeros_like(weighted), where=usage > 0)
+            units = self._term_units[new_account] = self.term_quantity * ratio.ravel()[self.term_cell]
+        return units
+
+    def component_costs(self, price_vector: np.ndarray, new_account: bool = False) -> np.ndarray:
+        """Cost of every component in the catalog for one price vector"""
+        return self.component_fixed + np.bincount(
+            self.term_component,
+            weights=self.term_units(new_account) * price_vector[self.term_price],
+            minlength=self.component_fixed.size,
+        )
+
+    def dependent_components(self, keys: Iterable[PriceKey], region: str) -> np.ndarray:
+        """Components whose cost depends on any of the given prices in `region`"""
+        indexes = [
+            self.price_index[ref]
+            for ref in (PriceRef(key.service, key.sku, key.variant) for key in keys if key.region == region)
+            if ref in self.price_index
+        ]
+        if not indexes:
+            return np.zeros(0, dtype=np.intp)
+        return np.unique(np.concatenate([self.price_components[index] for index in indexes]))
+
+    def reprice(
+        self,
+        previous: PlanResult,
+        prices: Mapping[PriceKey, float],
+        region: str,
+        changed: Iterable[PriceKey],
+        new_account: bool = False,
+    ) -> Tuple[PlanResult, List[int]]:
+        """
+        Update an evaluation after some prices changed
+
+        Only the components that use a changed price are re-priced, and
+        only their templates' totals are re-summed; everything else is
+        carried over from `previous`.
+
+        Args:
+            previous: evaluate() (or reprice()) result for the old prices
+            prices: Unit price for every key in `price_keys(region)`
+            region: Region the prices are for
+            changed: Keys whose price differs from the ones `previous` used
+            new_account: As for evaluate(); must match `previous`
+
+        Returns:
+            (updated costs, indexes of the templates that were re-priced)
+        """
+        components = self.dependent_components(changed, region)
+        if components.size == 0:
+            return previous, []
+
+        offsets = self.component_term_offsets
+        terms = np.concatenate([np.arange(offsets[c], offsets[c + 1]) for c in components])
+        term_prices = np.fromiter(
+            (prices[self.price_refs[price].in_region(region)] for price in self.term_price[terms]),
+            dtype=np.float64,
+            count=terms.size,
+        )
+        costs = self.component_fixed[components] + np.bincount(
+            np.searchsorted(components, self.term_component[terms]),
+            weights=self.term_units(new_account)[terms] * term_prices,
+            minlength=components.size,
+        )
+
+        component_costs = list(previous.component_costs)
+        totals = list(previous.totals)
+        template_offsets = self.template_offsets
+        affected: Dict[int, List[float]] = {}
+        for component, cost in zip(components.tolist(), costs.tolist()):
+            template = int(self.component_template[component])
+            row = affected.get(template)
+            if row is None:
+                row = affected[template] = list(component_costs[template])
+            row[component - template_offsets[template]] = cost
+        for template, row in affected.items():
+            component_costs[template] = row
+            totals[template] = sum(row)
+        return PlanResult(component_costs, totals), sorted(affected)
+
+    def sample_totals(
+        self,
+        template: int,
+        prices: Mapping[PriceKey, float],
+        region: str,
+        traffic: np.ndarray,
+        duration: Optional[np.ndarray] = None,
+        new_account: bool = False,
+    ) -> np.ndarray:
+        """
+        Total monthly cost of one template under many usage scenarios
+
+        Usage marked `scales_with_traffic` is multiplied by each scenario's
+        traffic, and usage marked `scales_with_duration` (Lambda GB-seconds)
+        by its duration too. Free tier and volume tiers are applied to
+        every scenario's usage, all scenarios at once.
+
+        Args:
+            template: Index of the template in catalog order
+            prices: Unit price for every key in `price_keys(region)`
+            region: Region the prices are for
+            traffic: Traffic multiplier per scenario (1 = as estimated)
+            duration: Run-time multiplier per scenario (default: 1)
+            new_account: As for evaluate()
+
+        Returns:
+            Monthly cost per scenario
+        """
+        traffic = np.asarray(traffic, dtype=np.float64)
+        duration = np.ones_like(traffic) if duration is None else np.asarray(duration, dtype=np.float64)
+        components = slice(self.template_offsets[template], self.template_offsets[template + 1])
+        terms = slice(
+            self.component_term_offsets[components.start], self.component_term_offsets[components.stop]
+        )
+
+        # Usage per (scenario, price): one outer product per scaling combination
+        usage = np.zeros((traffic.size, len(self.price_refs)))
+        term_traffic = self.term_traffic[terms]
+        term_duration = self.term_duration[terms]
+        for scales_traffic, scales_duration in ((False, False), (True, False), (False, True), (True, True)):
+            selected = (term_traffic == scales_traffic) & (term_duration == scales_duration)
+            if not selected.any():
+                continue
+            quantities = np.bincount(
+                self.term_price[terms][selected],
+                weights=self.term_quantity[terms][selected],
+                minlength=len(self.price_refs),
+            )
+            factor = np.ones_like(traffic)
+            if scales_traffic:
+                factor = factor * traffic
+            if scales_duration:
+                factor = factor * duration
+            usage += np.outer(factor, quantities)
+
+        weighted = self.weighted_usage(self.billable_usage(usage, new_account))
+        return self.component_fixed[components].sum() + weighted @ self.price_vector(prices, region)
+
+
+def load_template_registry(path: Optional[str] = None) -> TemplateRegistry:
+    """
+    Load and compile a template catalog
+
+    Args:
+        path: JSON catalog file, or a directory whose *.json files are
+            merged in name order (default: $TEMPLATE_CATALOG_PATH or the
+            bundled app/catalog directory)
+
+    Returns:
+        Compiled registry
+    """
+    path = path or os.environ.get("TEMPLATE_CATALOG_PATH") or DEFAULT_CATALOG_PATH
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".json")]
+    else:
+        files = [path]
+
+    templates: List[TemplateSpec] = []
+    fallback: Dict[PriceRef, float] = {}
+    free_tier: List[FreeTierSpec] = []
+    price_tiers: List[PriceTierSpec] = []
+    for file_path in files:
+        with open(file_path, encoding="utf-8") as fh:
+            catalog = CatalogFile.model_validate(json.load(fh))
+        templates.extend(catalog.templates)
+        fallback.update((spec.price_ref, spec.price) for spec in catalog.fallback_prices)
+        free_tier.extend(catalog.free_tier)
+        price_tiers.extend(catalog.price_tiers)
+
+    return TemplateRegistry(templates, fallback, free_tier, price_tiers)
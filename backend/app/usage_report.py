@@ -0,0 +1,595 @@
+"""
+AWS Cost and Usage Report (CUR) ingestion
+Streams local CUR files (CSV, CSV.gz or Parquet) into monthly spend per
+service, so actual spend can be compared with the project estimates
+
+Ingest with:
+    python -m app.usage_report path/to/cur [--db usage.db]
+
+Only new or changed files are read on each run, so it can run from cron
+against a directory kept in sync with the report bucket. Where the report's
+manifests are synced too, files of superseded report versions are ignored.
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from pydantic import BaseModel
+
+from app.optimizer import shared_costs
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet reports need pyarrow; CSV reports work without it
+    pq = None
+
+# CUR product code -> CostComponent service name
+PRODUCT_SERVICES = {
+    'AmazonEC2': 'EC2',
+    'AmazonRDS': 'RDS',
+    'AWSLambda': 'Lambda',
+    'AmazonS3': 'S3',
+    'AmazonDynamoDB': 'DynamoDB',
+    'AmazonApiGateway': 'API Gateway',
+    'AmazonCloudFront': 'CloudFront',
+    'AmazonCloudWatch': 'CloudWatch',
+    'AmazonRoute53': 'Route53',
+    'AWSEvents': 'EventBridge',
+    'AWSDataTransfer': 'Data Transfer',
+}
+
+# Columns read from each report, by normalized name (see column_name)
+MONTH_COLUMNS = ('bill_billing_period_start_date', 'line_item_usage_start_date')
+PRODUCT_COLUMN = 'line_item_product_code'
+USAGE_TYPE_COLUMN = 'line_item_usage_type'
+LINE_ITEM_TYPE_COLUMN = 'line_item_line_item_type'
+COST_COLUMN = 'line_item_unblended_cost'
+
+# Line item types that aren't usage; everything else (Usage, Fee, RIFee,
+# SavingsPlanCoveredUsage, ...) is spend on the service
+ADJUSTMENT_KINDS = {
+    'Credit': 'credit',
+    'Refund': 'refund',
+    'Tax': 'tax',
+}
+USAGE_KIND = 'usage'
+
+CUR_SUFFIXES = ('.csv', '.csv.gz', '.parquet')
+MANIFEST_SUFFIX = 'Manifest.json'
+
+# Rows aggregated per chunk; memory stays bounded whatever the file size
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Bumped when the tables change; older stores are rebuilt on the next ingest
+_SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingested_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS file_spend (
+    path TEXT NOT NULL,
+    month TEXT NOT NULL,
+    service TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (path, month, service, kind)
+) WITHOUT ROWID;
+"""
+
+# (month, product code, usage type, line item type, cost)
+UsageRow = Tuple[str, str, str, str, float]
+
+
+class IngestResult(NamedTuple):
+    """
+    Outcome of one ingestion run
+
+    Attributes:
+        files_ingested: New or changed files read
+        files_skipped: Files unchanged since the last run
+        files_removed: Previously ingested files that no longer exist or
+            have been superseded
+        rows: Line items read
+        files_superseded: Files of earlier report versions, per the manifests
+    """
+    files_ingested: int = 0
+    files_skipped: int = 0
+    files_removed: int = 0
+    rows: int = 0
+    files_superseded: int = 0
+
+
+def column_name(name: str) -> str:
+    """
+    Normalize a CUR column name
+
+    The legacy CSV format uses "lineItem/UnblendedCost", Parquet and CUR 2.0
+    use "line_item_unblended_cost"; both normalize to the latter.
+    """
+    name = re.sub(r'(?<=[a-z0-9])(?=[A-Z])', '_', name.replace('/', '_'))
+    return name.lower()
+
+
+def service_name(product_code: str, usage_type: str = '') -> str:
+    """
+    Map a line item to the service name used in project templates
+
+    EBS volumes and EC2 data transfer are billed under AmazonEC2 but
+    budgeted as their own components.
+    """
+    if product_code == 'AmazonEC2':
+        if 'EBS:' in usage_type:
+            return 'EBS'
+        if 'DataTransfer' in usage_type:
+            return 'Data Transfer'
+    return PRODUCT_SERVICES.get(product_code, product_code or 'Other')
+
+
+def line_item_kind(line_item_type: str) -> str:
+    """Classify a line item as usage, or as a credit, refund or tax"""
+    return ADJUSTMENT_KINDS.get(line_item_type, USAGE_KIND)
+
+
+def is_usage_report(path: str) -> bool:
+    return path.endswith(CUR_SUFFIXES)
+
+
+def _read_manifest(path: str) -> Optional[Tuple[str, List[str]]]:
+    """
+    Billing period and report files listed by a CUR manifest
+
+    Legacy reports list S3 keys under "reportKeys", CUR 2.0 exports list
+    S3 URIs under "dataFiles".
+    """
+    try:
+        with open(path, encoding='utf-8') as fh:
+            document = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(document, dict):
+        return None
+    keys = document.get('reportKeys', document.get('dataFiles'))
+    if not isinstance(keys, list):
+        return None
+    period = document.get('billingPeriod')
+    start = period.get('start') if isinstance(period, dict) else period
+    return str(start or os.path.dirname(path)), [str(key) for key in keys]
+
+
+def superseded_reports(root: str, files: Iterable[str], manifests: Iterable[str]) -> Set[str]:
+    """
+    Report files that a newer delivery of their billing period replaced
+
+    AWS writes each revision of a month's report to a new assembly
+    directory and points the billing period's manifest at it; the old
+    assemblies stay in the bucket. Per billing period the manifest nearest
+    the root (the period's own, not an assembly's copy), then the newest,
+    is current. A file listed only by other manifests is superseded; files
+    no manifest mentions are kept.
+
+    Args:
+        root: Directory the files and manifests were found under
+        files: Report file paths
+        manifests: Manifest file paths
+
+    Returns:
+        The superseded file paths
+    """
+    current: Dict[str, Tuple[Tuple[int, int], List[str]]] = {}
+    # Basename -> listed keys, so each file is only checked against its namesakes
+    listed: Dict[str, List[str]] = {}
+    for path in manifests:
+        manifest = _read_manifest(path)
+        if manifest is None:
+            continue
+        period, keys = manifest
+        for key in keys:
+            listed.setdefault(key.rsplit('/', 1)[-1], []).append(key)
+        rank = (-path.count(os.sep), os.stat(path).st_mtime_ns)
+        if period not in current or rank > current[period][0]:
+            current[period] = (rank, keys)
+    if not listed:
+        return set()
+
+    current_keys = {key for _, keys in current.values() for key in keys}
+    superseded = set()
+    for path in files:
+        # Keys are full S3 keys; the local copy is synced from some prefix of them
+        relative = os.path.relpath(path, root).replace(os.sep, '/')
+        matches = [
+            key for key in listed.get(os.path.basename(path), [])
+            if key == relative or key.endswith('/' + relative)
+        ]
+        if matches and not any(key in current_keys for key in matches):
+            superseded.add(path)
+    return superseded
+
+
+def _column_indexes(path: str, header: Sequence[str]) -> Tuple[int, int, Optional[int], Optional[int], int]:
+    """Positions of the month, product, usage type, line item type and cost columns"""
+    names = [column_name(name) for name in header]
+    missing = [column for column in (PRODUCT_COLUMN, COST_COLUMN) if column not in names]
+    month = next((names.index(column) for column in MONTH_COLUMNS if column in names), None)
+    if missing or month is None:
+        raise ValueError(f"{path} is not a Cost and Usage Report (missing {', '.join(missing) or 'dates'})")
+    usage_type = names.index(USAGE_TYPE_COLUMN) if USAGE_TYPE_COLUMN in names else None
+    line_item_type = names.index(LINE_ITEM_TYPE_COLUMN) if LINE_ITEM_TYPE_COLUMN in names else None
+    return month, names.index(PRODUCT_COLUMN), usage_type, line_item_type, names.index(COST_COLUMN)
+
+
+def _cost(value) -> float:
+    try:
+        return float(value) if value not in (None, '') else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _iter_csv_chunks(path: str, chunk_rows: int) -> Iterator[List[UsageRow]]:
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as fh:
+        reader = csv.reader(fh)
+        header = next(reader, None)
+        if header is None:
+            return
+        month, product, usage_type, line_item_type, cost = _column_indexes(path, header)
+        chunk: List[UsageRow] = []
+        for row in reader:
+            if len(row) <= max(month, product, cost):
+                continue
+            chunk.append((
+                row[month][:7],
+                row[product],
+                row[usage_type] if usage_type is not None and usage_type < len(row) else '',
+                row[line_item_type] if line_item_type is not None and line_item_type < len(row) else '',
+                _cost(row[cost]),
+            ))
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _iter_parquet_chunks(path: str, chunk_rows: int) -> Iterator[List[UsageRow]]:
+    if pq is None:
+        raise RuntimeError(f"Reading {path} requires pyarrow (pip install pyarrow)")
+    parquet = pq.ParquetFile(path)
+    header = parquet.schema_arrow.names
+    indexes = _column_indexes(path, header)
+    columns = [header[index] if index is not None else None for index in indexes]
+    wanted = [column for column in columns if column is not None]
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=wanted):
+        values = {column: batch.column(column).to_pylist() for column in wanted}
+        months, products, costs = (values[columns[0]], values[columns[1]], values[columns[4]])
+        usage_types = values[columns[2]] if columns[2] is not None else [''] * len(products)
+        line_item_types = values[columns[3]] if columns[3] is not None else [''] * len(products)
+        yield [
+            (str(month or '')[:7], product or '', usage_type or '', line_item_type or '', _cost(cost))
+            for month, product, usage_type, line_item_type, cost
+            in zip(months, products, usage_types, line_item_types, costs)
+        ]
+
+
+def iter_usage_chunks(path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[List[UsageRow]]:
+    """
+    Stream a CUR file's line items in chunks
+
+    Args:
+        path: CSV, CSV.gz or Parquet report file
+        chunk_rows: Line items per chunk
+
+    Returns:
+        Iterator of chunks of (month, product code, usage type, line item
+        type, cost)
+
+    Raises:
+        ValueError: The file isn't a Cost and Usage Report
+        RuntimeError: A Parquet file and pyarrow isn't installed
+    """
+    if path.endswith('.parquet'):
+        return _iter_parquet_chunks(path, chunk_rows)
+    return _iter_csv_chunks(path, chunk_rows)
+
+
+def aggregate_usage_file(
+    path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Tuple[Dict[Tuple[str, str, str], float], int]:
+    """
+    Sum one report file's cost by billing month, service and kind
+
+    Credits, refunds and tax are kept apart from usage (see line_item_kind)
+    so they don't offset or inflate a service's spend.
+
+    Returns:
+        ({(month, service, kind): cost}, number of line items)
+    """
+    spend: Dict[Tuple[str, str, str], float] = {}
+    # A report has millions of line items but only a few hundred usage types
+    services: Dict[Tuple[str, str], str] = {}
+    rows = 0
+    for chunk in iter_usage_chunks(path, chunk_rows):
+        rows += len(chunk)
+        for month, product, usage_type, line_item_type, cost in chunk:
+            service = services.get((product, usage_type))
+            if service is None:
+                service = services[(product, usage_type)] = service_name(product, usage_type)
+            key = (month, service, line_item_kind(line_item_type))
+            spend[key] = spend.get(key, 0.0) + cost
+    return spend, rows
+
+
+class UsageStore:
+    """SQLite-backed monthly spend per service, with per-file ingestion state"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version < _SCHEMA_VERSION:
+            # Derived data only: dropping it makes the next ingest read every file again
+            self._conn.executescript("DROP TABLE IF EXISTS file_spend; DROP TABLE IF EXISTS ingested_files;")
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        self._conn.commit()
+
+    def ingest(self, path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> IngestResult:
+        """
+        Ingest a report file, or every report file under a directory
+
+        Files are identified by path, size and modification time; unchanged
+        files are skipped, and a changed file (AWS rewrites the current
+        month's report during the month) replaces its previous totals.
+        Files under `path` that have disappeared, or that the billing
+        period's manifest no longer lists (see superseded_reports), are
+        dropped.
+
+        Returns:
+            What was read, skipped and removed
+        """
+        root = os.path.abspath(path)
+        superseded: Set[str] = set()
+        if os.path.isdir(root):
+            files, manifests = [], []
+            for directory, _, names in os.walk(root):
+                for name in names:
+                    if is_usage_report(name):
+                        files.append(os.path.join(directory, name))
+                    elif name.endswith(MANIFEST_SUFFIX):
+                        manifests.append(os.path.join(directory, name))
+            superseded = superseded_reports(root, files, manifests)
+            files = sorted(file_path for file_path in files if file_path not in superseded)
+        else:
+            files = [root]
+
+        ingested = skipped = rows = 0
+        for file_path in files:
+            stat = os.stat(file_path)
+            if self._is_current(file_path, stat.st_size, stat.st_mtime_ns):
+                skipped += 1
+                continue
+            spend, file_rows = aggregate_usage_file(file_path, chunk_rows)
+            self._replace_file(file_path, stat.st_size, stat.st_mtime_ns, file_rows, spend)
+            ingested += 1
+            rows += file_rows
+
+        removed = self._remove_missing(root, set(files)) if os.path.isdir(root) else 0
+        return IngestResult(ingested, skipped, removed, rows, len(superseded))
+
+    def _is_current(self, path: str, size: int, mtime_ns: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns FROM ingested_files WHERE path = ?", (path,)
+            ).fetchone()
+        return row == (size, mtime_ns)
+
+    def _replace_file(
+        self,
+        path: str,
+        size: int,
+        mtime_ns: int,
+        rows: int,
+        spend: Dict[Tuple[str, str, str], float],
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM file_spend WHERE path = ?", (path,))
+            self._conn.executemany(
+                "INSERT INTO file_spend (path, month, service, kind, cost) VALUES (?, ?, ?, ?, ?)",
+                [(path, month, service, kind, cost) for (month, service, kind), cost in spend.items()],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingested_files (path, size, mtime_ns, rows, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, rows, time.time()),
+            )
+
+    def _remove_missing(self, root: str, present: set) -> int:
+        prefix = os.path.join(root, '')
+        with self._lock, self._conn:
+            known = [
+                path for (path,) in self._conn.execute("SELECT path FROM ingested_files")
+                if path.startswith(prefix) and path not in present
+            ]
+            for path in known:
+                self._conn.execute("DELETE FROM file_spend WHERE path = ?", (path,))
+                self._conn.execute("DELETE FROM ingested_files WHERE path = ?", (path,))
+        return len(known)
+
+    def months(self) -> List[str]:
+        """Billing months with spend, oldest first"""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT month FROM file_spend ORDER BY month").fetchall()
+        return [month for (month,) in rows]
+
+    def monthly_spend(self, month: str) -> Dict[str, float]:
+        """Actual usage spend per service in a billing month ("YYYY-MM")"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT service, SUM(cost) FROM file_spend WHERE month = ? AND kind = ? GROUP BY service",
+                (month, USAGE_KIND),
+            ).fetchall()
+        return dict(rows)
+
+    def monthly_adjustments(self, month: str) -> Dict[str, float]:
+        """Credits, refunds and tax in a billing month, by kind (credits are negative)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, SUM(cost) FROM file_spend WHERE month = ? AND kind != ? GROUP BY kind",
+                (month, USAGE_KIND),
+            ).fetchall()
+        return dict(rows)
+
+    def summary(self) -> Dict:
+        """Files and line items ingested so far"""
+        with self._lock:
+            files, rows, last = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(rows), 0), MAX(ingested_at) FROM ingested_files"
+            ).fetchone()
+        return {"files": files, "rows": rows, "last_ingested_at": last}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+usage_store: Optional[UsageStore] = None
+
+
+def get_usage_store() -> Optional[UsageStore]:
+    """Open the usage store named by CUR_STATE_PATH, if any"""
+    global usage_store
+    store_path = os.environ.get("CUR_STATE_PATH")
+    if usage_store is None and store_path:
+        usage_store = UsageStore(store_path)
+    return usage_store
+
+
+def planned_spend(templates: Sequence[BaseModel]) -> Dict[str, float]:
+    """
+    Estimated monthly spend per service for projects run in one account
+
+    Shared components (e.g. a Route53 hosted zone) are paid for once, as
+    in the optimizer.
+    """
+    planned: Dict[str, float] = {}
+    shared: Dict[str, float] = {}
+    for template in templates:
+        for component in template.components:
+            if not component.shared:
+                planned[component.service] = planned.get(component.service, 0.0) + component.cost
+        for service, cost in shared_costs(template).items():
+            shared[service] = max(shared.get(service, 0.0), cost)
+    for service, cost in shared.items():
+        planned[service] = planned.get(service, 0.0) + cost
+    return planned
+
+
+def compare_spend(
+    templates: Sequence[BaseModel],
+    actual: Dict[str, float],
+    budget: Optional[float] = None,
+    adjustments: Optional[Dict[str, float]] = None,
+) -> Dict:
+    """
+    Compare a month's actual spend with the estimates of the projects run
+
+    Args:
+        templates: Priced templates of the projects running in the account
+        actual: Actual usage spend per service (from UsageStore.monthly_spend)
+        budget: Optional monthly budget in USD
+        adjustments: Credits, refunds and tax by kind (from
+            UsageStore.monthly_adjustments)
+
+    Returns:
+        Planned vs actual spend per service and in total, and per project
+        its estimate next to the account's spend on the services it uses
+        (services are account-wide, so projects sharing a service see the
+        same actual spend). Adjustments are listed apart; the net total,
+        which the budget is checked against, includes them.
+    """
+    adjustments = adjustments or {}
+    planned = planned_spend(templates)
+    services = sorted(
+        set(planned) | set(actual),
+        key=lambda service: (-actual.get(service, 0.0), service),
+    )
+    planned_total = sum(planned.values())
+    actual_total = sum(actual.values())
+    net_total = actual_total + sum(adjustments.values())
+
+    result = {
+        "planned_total": round(planned_total, 2),
+        "actual_total": round(actual_total, 2),
+        "difference": round(actual_total - planned_total, 2),
+        "adjustments": {kind: round(cost, 2) for kind, cost in sorted(adjustments.items())},
+        "net_total": round(net_total, 2),
+        "services": [
+            {
+                "service": service,
+                "planned": round(planned.get(service, 0.0), 2),
+                "actual": round(actual.get(service, 0.0), 2),
+                "difference": round(actual.get(service, 0.0) - planned.get(service, 0.0), 2),
+            }
+            for service in services
+        ],
+        "projects": [
+            {
+                "id": template.id,
+                "name": template.name,
+                "estimated_cost": template.total_cost,
+                "actual_cost_of_services": round(
+                    sum(actual.get(service, 0.0) for service in
+                        {component.service for component in template.components}),
+                    2,
+                ),
+            }
+            for template in templates
+        ],
+    }
+    if budget is not None:
+        result["budget"] = budget
+        result["budget_remaining"] = round(budget - net_total, 2)
+        result["over_budget"] = net_total > budget
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest AWS Cost and Usage Report files")
+    parser.add_argument("path", help="Report file or directory of report files")
+    parser.add_argument(
+        "--db",
+        default=os.environ.get("CUR_STATE_PATH", "usage.db"),
+        help="SQLite usage store to write (default: $CUR_STATE_PATH or usage.db)",
+    )
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Line items per chunk")
+    args = parser.parse_args()
+
+    store = UsageStore(args.db)
+    result = store.ingest(args.path, args.chunk_rows)
+    print(
+        f"✅ Ingested {result.files_ingested} files ({result.rows:,} line items), "
+        f"skipped {result.files_skipped} unchanged and {result.files_superseded} superseded, "
+        f"removed {result.files_removed} in {args.db}"
+    )
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""
+Benchmarks and load tests
+Run from backend/ against a local Pricing API stand-in, no AWS account needed:
+
+    python -m benchmarks.micro
+    python -m benchmarks.load
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
@@ -0,0 +1,63 @@
+"""
+Compare two benchmark result files
+
+Run from backend/:
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.10]
+
+Exits with status 1 if any benchmark's p50 or p99 got slower by more than
+the threshold, so it can gate CI.
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+METRICS = ("p50_us", "p99_us")
+
+
+def load(path: str) -> Dict[str, Dict]:
+    with open(path, encoding="utf-8") as fh:
+        return {result["name"]: result for result in json.load(fh)["results"]}
+
+
+def compare(baseline: Dict[str, Dict], candidate: Dict[str, Dict]) -> List[Tuple[str, str, float, float]]:
+    """
+    Per benchmark and metric: (name, metric, baseline, candidate)
+
+    Only benchmarks present in both runs are compared.
+    """
+    rows = []
+    for name, before in baseline.items():
+        after = candidate.get(name)
+        if after is None:
+            continue
+        for metric in METRICS:
+            rows.append((name, metric, before[metric], after[metric]))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    regressions = 0
+    for name, metric, before, after in compare(load(args.baseline), load(args.candidate)):
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > args.threshold:
+            regressions += 1
+            flag = "  ⚠️ slower"
+        print(f"  {name:42} {metric:7} {before:>12.1f} -> {after:>12.1f} us  {change:>+8.1%}{flag}")
+
+    if regressions:
+        print(f"❌ {regressions} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+    print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Load test for the FastAPI endpoints
+Starts the API under uvicorn (priced by the local Pricing API stub), fires
+concurrent requests per scenario and reports p50/p95/p99 latency and
+requests per second
+
+Run from backend/:
+    python -m benchmarks.load [--requests 2000] [--concurrency 32] [--workers 1]
+    python -m benchmarks.load --url http://127.0.0.1:8000   # an already running API
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+from benchmarks.pricing_stub import StubPricingAPI, serve
+from benchmarks.results import save_results, timing_stats
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Scenario(NamedTuple):
+    """
+    One kind of request
+
+    Attributes:
+        name: Name in the results
+        build: Returns (method, path, JSON body or None, headers) for the
+            i-th request
+    """
+    name: str
+    build: Callable[[int], tuple]
+
+
+def scenarios(rng: random.Random, etag: Optional[str]) -> List[Scenario]:
+    """The default request mix, one scenario per endpoint"""
+    budgets = [round(rng.uniform(1, 100), 2) for _ in range(512)]
+    revalidate = {"If-None-Match": etag} if etag else {}
+    return [
+        Scenario(
+            "GET /api/projects",
+            lambda i: ("GET", f"/api/projects?budget={budgets[i % len(budgets)]}", None, {}),
+        ),
+        Scenario(
+            "GET /api/projects [If-None-Match]",
+            lambda i: ("GET", "/api/projects?budget=10", None, revalidate),
+        ),
+        Scenario("GET /api/projects/all", lambda i: ("GET", "/api/projects/all", None, {})),
+        Scenario(
+            "POST /api/projects/batch",
+            lambda i: ("POST", "/api/projects/batch", {"budgets": budgets[:50]}, {}),
+        ),
+        Scenario(
+            "GET /api/projects/cheapest-region",
+            lambda i: ("GET", "/api/projects/cheapest-region?budget=20&regions=us-east-1,eu-west-1,ap-south-1", None, {}),
+        ),
+        Scenario(
+            "POST /api/projects/optimize",
+            lambda i: ("POST", "/api/projects/optimize", {"budget": budgets[i % len(budgets)], "top_k": 5}, {}),
+        ),
+        Scenario(
+            "POST /api/costs/lambda",
+            lambda i: ("POST", "/api/costs/lambda", {
+                "requests": [100_000, 1_000_000, 10_000_000],
+                "avg_duration_ms": [50, 200, 800],
+                "memory_mb": [128, 512, 1024],
+                "grid": True,
+                "budget": 5.0,
+            }, {}),
+        ),
+    ]
+
+
+async def run_scenario(
+    http: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+) -> Dict:
+    """
+    Send `requests` requests with `concurrency` in flight
+
+    Returns:
+        Result entry with latency stats, throughput and status counts
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, path, body, headers = scenario.build(i)
+            started = time.perf_counter()
+            try:
+                response = await http.request(method, path, json=body, headers=headers)
+                await response.aread()
+                status = str(response.status_code)
+            except httpx.HTTPError:
+                errors += 1
+                status = "error"
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stats = timing_stats(latencies)
+    return {
+        "name": scenario.name,
+        **stats,
+        "p50_ms": stats["p50_us"] / 1000,
+        "p95_ms": stats["p95_us"] / 1000,
+        "p99_ms": stats["p99_us"] / 1000,
+        "requests_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "statuses": statuses,
+        "errors": errors,
+    }
+
+
+async def run_load(url: str, requests: int, concurrency: int, seed: int = 0) -> List[Dict]:
+    """Run every scenario against the API at `url`"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as http:
+        etag = (await http.get("/api/projects?budget=10")).headers.get("etag")
+        results = []
+        for scenario in scenarios(random.Random(seed), etag):
+            # Warm up connections and any per-region snapshots first
+            await run_scenario(http, scenario, min(concurrency, requests), concurrency)
+            results.append(await run_scenario(http, scenario, requests, concurrency))
+        return results
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api(pricing_url: str, workers: int) -> tuple:
+    """
+    Start the API under uvicorn in a subprocess, priced by the stub
+
+    Returns:
+        (process, base URL) once the API answers
+    """
+    port = free_port()
+    env = {
+        **os.environ,
+        "PRICING_ENDPOINT_URL": pricing_url,
+        "PRICING_SNAPSHOT_PATH": "",
+        # The stub ignores signatures, but the client still signs requests
+        "AWS_ACCESS_KEY_ID": os.environ.get("AWS_ACCESS_KEY_ID", "benchmark"),
+        "AWS_SECRET_ACCESS_KEY": os.environ.get("AWS_SECRET_ACCESS_KEY", "benchmark"),
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API exited during startup (code {process.returncode})")
+        try:
+            if httpx.get(f"{url}/api/health", timeout=1.0).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("API did not start within 30 seconds")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the API endpoints")
+    parser.add_argument("--url", help="Test an already running API instead of starting one")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (when starting the API)")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Stub Pricing API latency per call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Stub Pricing API failure rate")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/load-<time>.json)")
+    args = parser.parse_args()
+
+    stub_server = process = None
+    stub = None
+    url = args.url
+    if url is None:
+        stub = StubPricingAPI(latency_seconds=args.latency_ms / 1000, failure_rate=args.failure_rate)
+        stub_server, pricing_url = serve(stub)
+        process, url = start_api(pricing_url, args.workers)
+
+    try:
+        results = asyncio.run(run_load(url, args.requests, args.concurrency))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        if stub_server is not None:
+            stub_server.shutdown()
+
+    for result in results:
+        print(
+            f"  {result['name']:36} p50 {result['p50_ms']:>8.2f} ms   p95 {result['p95_ms']:>8.2f} ms"
+            f"   p99 {result['p99_ms']:>8.2f} ms   {result['requests_per_second']:>9,.0f} req/s"
+        )
+
+    settings = {
+        "url": args.url or "local",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "stub_latency_ms": args.latency_ms,
+        "stub_failure_rate": args.failure_rate,
+        "pricing_api_calls": stub.calls if stub is not None else None,
+    }
+    path = save_results("load", results, settings, args.output)
+    print(f"✅ Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
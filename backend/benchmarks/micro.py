@@ -0,0 +1,120 @@
+"""
+Microbenchmarks for the pricing hot paths
+Prices come from the in-process Pricing API stub, so no AWS access is used
+
+Run from backend/:
+    python -m benchmarks.micro [--iterations 2000] [--latency-ms 0] [--output FILE]
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Callable, Dict, List
+
+# Never let a benchmark read or write the shared on-disk price snapshot
+os.environ.setdefault("PRICING_SNAPSHOT_PATH", "")
+
+from app import projects  # noqa: E402
+from app.aws_pricing import LAMBDA_FALLBACK_PRICING, AWSPricingClient, calculate_lambda_cost  # noqa: E402
+from benchmarks.pricing_stub import StubPricingAPI  # noqa: E402
+from benchmarks.results import save_results, timing_stats  # noqa: E402
+
+
+def measure(name: str, fn: Callable[[], object], iterations: int, batch: int = 1) -> Dict:
+    """
+    Time `fn`
+
+    Args:
+        name: Benchmark name in the results
+        fn: Zero-argument callable to time
+        iterations: Number of timed samples
+        batch: Calls per sample (for calls too fast to time one by one)
+
+    Returns:
+        Result entry with per-call latency stats
+    """
+    fn()  # warm up
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        samples.append((time.perf_counter() - started) / batch)
+
+    stats = timing_stats(samples)
+    mean = stats["mean_us"] / 1e6
+    return {"name": name, "calls": iterations * batch, **stats, "ops_per_second": 1 / mean if mean else 0.0}
+
+
+def run(iterations: int, latency_seconds: float, seed: int = 0) -> List[Dict]:
+    """Run every microbenchmark"""
+    rng = random.Random(seed)
+    budgets = [round(rng.uniform(1, 100), 2) for _ in range(1024)]
+
+    stub = StubPricingAPI(latency_seconds=latency_seconds, regions=[projects.DEFAULT_REGION])
+    client = AWSPricingClient(region=projects.DEFAULT_REGION, cache=projects.pricing_cache)
+    client.pricing_client = stub
+    projects.pricing_client = client
+    projects.seed_template_snapshot()
+    snapshot = projects.get_template_snapshot()
+
+    def live_templates_cold():
+        projects.pricing_cache.invalidate()
+        return projects.get_live_project_templates()
+
+    budget_cycle = iter(budgets * (iterations * 64 // len(budgets) + 2))
+
+    results = [
+        measure(
+            "calculate_lambda_cost",
+            lambda: calculate_lambda_cost(250_000, 120, 256, LAMBDA_FALLBACK_PRICING),
+            iterations, batch=100,
+        ),
+    ]
+    for name, fn, samples in (
+        ("get_live_project_templates[cold cache]", live_templates_cold, max(iterations // 20, 10)),
+        ("get_live_project_templates[warm cache]", projects.get_live_project_templates, max(iterations // 4, 1)),
+    ):
+        calls_before = stub.calls
+        result = measure(name, fn, samples)
+        result["pricing_api_calls_per_call"] = (stub.calls - calls_before) / (samples + 1)
+        results.append(result)
+
+    results += [
+        measure(
+            "get_projects_by_budget",
+            lambda: projects.get_projects_by_budget(next(budget_cycle), snapshot),
+            iterations, batch=32,
+        ),
+        measure(
+            "encode_projects_by_budget",
+            lambda: projects.encode_projects_by_budget(next(budget_cycle), snapshot),
+            iterations, batch=32,
+        ),
+    ]
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the pricing microbenchmarks")
+    parser.add_argument("--iterations", type=int, default=2000, help="Timed samples per benchmark")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Stub Pricing API latency per call")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/micro-<time>.json)")
+    args = parser.parse_args()
+
+    results = run(args.iterations, args.latency_ms / 1000)
+    for result in results:
+        print(
+            f"  {result['name']:42} p50 {result['p50_us']:>10.1f} us"
+            f"   p99 {result['p99_us']:>10.1f} us   {result['ops_per_second']:>12,.0f} ops/s"
+        )
+
+    path = save_results(
+        "micro", results, {"iterations": args.iterations, "stub_latency_ms": args.latency_ms}, args.output
+    )
+    print(f"✅ Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
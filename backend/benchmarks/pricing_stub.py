@@ -0,0 +1,256 @@
+"""
+Local stand-in for the AWS Pricing API
+Serves canned GetProducts responses, built from the catalog's fallback
+prices, with configurable latency and failure rate
+
+Use it in-process in place of boto3's pricing client:
+
+    client = AWSPricingClient()
+    client.pricing_client = StubPricingAPI(latency_seconds=0.05)
+
+or over HTTP for the async client (PRICING_ENDPOINT_URL):
+
+    python -m benchmarks.pricing_stub --port 8001 --latency-ms 50 --failure-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.aws_pricing import PRODUCTS_PAGE_SIZE, REGION_NAMES, PriceKey, build_product_query
+from app.projects import template_registry
+
+# Reserved offerings per EC2/RDS product, so documents weigh about what real
+# ones do (reserved terms are most of a real document)
+DEFAULT_RESERVED_OFFERS = 6
+
+# Extra us-east-1 EC2 instance types, so batch queries have pages to walk
+DEFAULT_EXTRA_INSTANCE_TYPES = 300
+
+
+class StubThrottled(Exception):
+    """Injected failure, raised like botocore's ThrottlingException"""
+
+
+def price_document(
+    key: PriceKey,
+    price: float,
+    reserved_offers: int = DEFAULT_RESERVED_OFFERS,
+) -> Tuple[str, Dict[str, str], str]:
+    """
+    A PriceList document for one price
+
+    The product attributes are exactly what build_product_query filters
+    on, so every client query finds it.
+
+    Returns:
+        (service code, product attributes, document JSON)
+    """
+    location = REGION_NAMES[key.region]
+    service_code, filters = build_product_query(key, location)
+    attributes = {f['Field']: f['Value'] for f in filters}
+    sku = f"STUB{zlib.crc32(repr(key).encode()):010d}"
+
+    reserved = {}
+    if key.service != 'lambda':
+        for index in range(reserved_offers):
+            lease = '1yr' if index % 2 == 0 else '3yr'
+            reserved[f"{sku}.RI{index}"] = {
+                'offerTermCode': f"RI{index}",
+                'sku': sku,
+                'priceDimensions': {
+                    f"{sku}.RI{index}.UPFRONT": {
+                        'unit': 'Quantity',
+                        'description': 'Upfront Fee',
+                        'pricePerUnit': {'USD': f"{price * 3000:.4f}"},
+                    },
+                    f"{sku}.RI{index}.HOURLY": {
+                        'unit': 'Hrs',
+                        'description': f"{attributes.get('instanceType', '')} reserved instance applied",
+                        'pricePerUnit': {'USD': f"{price * 0.4:.10f}"},
+                    },
+                },
+                'termAttributes': {
+                    'LeaseContractLength': lease,
+                    'OfferingClass': 'standard',
+                    'PurchaseOption': 'Partial Upfront',
+                },
+            }
+
+    document = {
+        'product': {
+            'productFamily': 'Stub Product',
+            'attributes': {**attributes, 'servicecode': service_code, 'usagetype': f"Stub:{key.sku}"},
+            'sku': sku,
+        },
+        'serviceCode': service_code,
+        'terms': {
+            'OnDemand': {
+                f"{sku}.JRTCKXETXF": {
+                    'offerTermCode': 'JRTCKXETXF',
+                    'sku': sku,
+                    'priceDimensions': {
+                        f"{sku}.JRTCKXETXF.6YS6EN2CT7": {
+                            'unit': 'Hrs',
+                            'beginRange': '0',
+                            'endRange': 'Inf',
+                            'description': f"Stub price for {key.sku}",
+                            'pricePerUnit': {'USD': f"{price:.10f}"},
+                        }
+                    },
+                    'termAttributes': {},
+                }
+            },
+            'Reserved': reserved,
+        },
+        'version': 'stub',
+        'publicationDate': '2024-01-01T00:00:00Z',
+    }
+    return service_code, attributes, json.dumps(document)
+
+
+class StubPricingAPI:
+    """
+    In-memory GetProducts with injected latency and failures
+
+    Has the same get_products signature as boto3's pricing client, so it
+    can stand in for AWSPricingClient.pricing_client directly.
+    """
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.0,
+        failure_rate: float = 0.0,
+        regions: Optional[Iterable[str]] = None,
+        extra_instance_types: int = DEFAULT_EXTRA_INSTANCE_TYPES,
+        reserved_offers: int = DEFAULT_RESERVED_OFFERS,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            latency_seconds: Delay added to every call
+            failure_rate: Fraction of calls that fail (0..1)
+            regions: Regions to serve prices for (default: all)
+            extra_instance_types: Synthetic us-east-1 EC2 types added on top
+                of the catalog's own prices
+            reserved_offers: Reserved offerings per EC2/RDS product
+            seed: Seed for the failure injection
+        """
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+        prices: Dict[PriceKey, float] = {}
+        for region in regions or REGION_NAMES:
+            prices.update(template_registry.fallback_prices(region))
+        for index in range(extra_instance_types):
+            prices[PriceKey('ec2', 'us-east-1', f"stub{index // 8}.size{index % 8}")] = 0.01 * (index + 1)
+
+        # (service code, location) -> [(attributes, document)]
+        self._products: Dict[Tuple[str, str], List[Tuple[Dict[str, str], str]]] = {}
+        for key, price in prices.items():
+            service_code, attributes, document = price_document(key, price, reserved_offers)
+            self._products.setdefault((service_code, attributes['location']), []).append(
+                (attributes, document)
+            )
+
+    def get_products(
+        self,
+        ServiceCode: str,
+        Filters: List[Dict[str, str]],
+        MaxResults: int = PRODUCTS_PAGE_SIZE,
+        NextToken: Optional[str] = None,
+        **kwargs,
+    ) -> Dict:
+        """Answer one GetProducts call (boto3 keyword arguments)"""
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if failed:
+            raise StubThrottled("Rate exceeded (injected by StubPricingAPI)")
+
+        wanted = {f['Field']: f['Value'] for f in Filters}
+        candidates = self._products.get((ServiceCode, wanted.get('location')), [])
+        matches = [
+            document for attributes, document in candidates
+            if all(attributes.get(field) == value for field, value in wanted.items())
+        ]
+
+        start = int(NextToken or 0)
+        end = start + min(MaxResults, PRODUCTS_PAGE_SIZE)
+        response = {'FormatVersion': 'aws_v1', 'PriceList': matches[start:end]}
+        if end < len(matches):
+            response['NextToken'] = str(end)
+        return response
+
+
+def serve(api: StubPricingAPI, host: str = '127.0.0.1', port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serve a stub over the Pricing API's JSON protocol, in a background thread
+
+    Returns:
+        (server, endpoint URL); call server.shutdown() when done
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            try:
+                body = api.get_products(
+                    ServiceCode=payload['ServiceCode'],
+                    Filters=payload.get('Filters', []),
+                    MaxResults=payload.get('MaxResults', PRODUCTS_PAGE_SIZE),
+                    NextToken=payload.get('NextToken'),
+                )
+                status = 200
+            except StubThrottled as e:
+                body = {'__type': 'ThrottlingException', 'message': str(e)}
+                status = 400
+
+            encoded = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/x-amz-json-1.1')
+            self.send_header('Content-Length', str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local AWS Pricing API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of calls that fail")
+    args = parser.parse_args()
+
+    api = StubPricingAPI(latency_seconds=args.latency_ms / 1000, failure_rate=args.failure_rate)
+    server, url = serve(api, args.host, args.port)
+    print(f"🧪 Stub Pricing API on {url} (PRICING_ENDPOINT_URL={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark result files
+Every run is saved as JSON (environment + one entry per benchmark) so two
+runs can be diffed with `python -m benchmarks.compare`
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(sorted_samples: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_samples) + 0.5 - 1e-9)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def timing_stats(samples_seconds: Sequence[float]) -> Dict[str, float]:
+    """
+    Summarize latencies
+
+    Args:
+        samples_seconds: One duration per call, in seconds
+
+    Returns:
+        count plus min/mean/p50/p95/p99/max in microseconds
+    """
+    ordered = sorted(samples_seconds)
+    to_us = 1e6
+    return {
+        "count": len(ordered),
+        "min_us": ordered[0] * to_us if ordered else 0.0,
+        "mean_us": sum(ordered) / len(ordered) * to_us if ordered else 0.0,
+        "p50_us": percentile(ordered, 0.50) * to_us,
+        "p95_us": percentile(ordered, 0.95) * to_us,
+        "p99_us": percentile(ordered, 0.99) * to_us,
+        "max_us": ordered[-1] * to_us if ordered else 0.0,
+    }
+
+
+def environment() -> Dict[str, str]:
+    """What the numbers were measured on"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": str(os.cpu_count()),
+        "git_commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def save_results(
+    suite: str,
+    results: List[Dict],
+    settings: Dict,
+    output: Optional[str] = None,
+) -> str:
+    """
+    Write a run to disk
+
+    Args:
+        suite: "micro" or "load"
+        results: One dict per benchmark, each with a unique "name"
+        settings: Run parameters (iterations, latency, concurrency, ...)
+        output: File to write (default: benchmarks/results/<suite>-<time>.json)
+
+    Returns:
+        Path written
+    """
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{suite}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(
+            {"suite": suite, "environment": environment(), "settings": settings, "results": results},
+            fh,
+            indent=2,
+        )
+    return output
@@ -0,0 +1,239 @@
+"""
+Tests for HTTP behaviour of the API endpoints
+Run with: python -m pytest test_api.py
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from app import projects
+from app.main import app
+from app.snapshot import SnapshotStore
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = SnapshotStore(lambda: projects.price_template_catalog(dict(projects.FALLBACK_PRICES)))
+    monkeypatch.setattr(projects, "template_store", store)
+    return TestClient(app), store
+
+
+def test_projects_support_conditional_get(client):
+    client, _ = client
+
+    first = client.get("/api/projects?budget=10")
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    assert "max-age" in first.headers["cache-control"]
+
+    repeat = client.get("/api/projects?budget=10.00", headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.headers["etag"] == etag
+    assert repeat.content == b""
+
+    other_budget = client.get("/api/projects?budget=5", headers={"If-None-Match": etag})
+    assert other_budget.status_code == 200
+    assert other_budget.headers["etag"] != etag
+
+
+def test_budgets_sharing_an_etag_share_a_body(client):
+    client, _ = client
+
+    bodies = {}
+    for budget in ["10", "10.0", "10.001", "10.004", "10.006", "9.999", "7.5"]:
+        response = client.get(f"/api/projects?budget={budget}")
+        bodies.setdefault(response.headers["etag"], set()).add(response.content)
+
+    assert all(len(contents) == 1 for contents in bodies.values())
+    assert len(bodies) == 3
+
+
+def test_etag_changes_with_prices(client):
+    client, store = client
+
+    etag = client.get("/api/projects/all").headers["etag"]
+    assert client.get("/api/projects/all", headers={"If-None-Match": f'W/{etag}'}).status_code == 304
+
+    # Same prices, new version: still the same content and ETag
+    store.refresh()
+    assert client.get("/api/projects/all").headers["etag"] == etag
+
+    cheaper = {key: price / 2 for key, price in projects.FALLBACK_PRICES.items()}
+    store.publish(projects.price_template_catalog(cheaper))
+    response = client.get("/api/projects/all", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.parametrize("budget", [0.5, 2.5, 10.0, 100.0])
+def test_pre_encoded_body_matches_models(client, budget):
+    _, store = client
+    snapshot = store.get()
+
+    encoded = json.loads(projects.encode_projects_by_budget(budget, snapshot))
+    assert encoded == jsonable_encoder(projects.get_projects_by_budget(budget, snapshot))
+
+    all_projects = json.loads(projects.encode_all_projects(snapshot))
+    assert all_projects["projects"] == jsonable_encoder(list(snapshot.templates))
+
+
+def test_answer_table_covers_every_breakpoint(client):
+    _, store = client
+    snapshot = store.get()
+
+    for cost in snapshot.budget_index.costs:
+        for budget in (cost - 0.01, cost, cost + 0.01):
+            encoded = json.loads(projects.encode_projects_by_budget(budget, snapshot))
+            assert encoded == jsonable_encoder(projects.get_projects_by_budget(budget, snapshot))
+
+
+def test_batch_budgets_match_single_queries(client):
+    client, store = client
+    budgets = [1.0, 2.5, 10.0, 10000.0]
+
+    response = client.post("/api/projects/batch", json={"budgets": budgets})
+    assert response.status_code == 200
+
+    (result,) = response.json()["results"]
+    assert result["region"] == projects.DEFAULT_REGION
+    by_id = {project["id"]: project for project in result["projects"]}
+    for budget, answer in zip(budgets, result["answers"]):
+        single = client.get(f"/api/projects?budget={budget}").json()
+        assert answer["affordable_count"] == single["affordable_count"]
+        assert answer["stats"] == single["stats"]
+        assert [by_id[i] for i in answer["affordable_project_ids"]] == single["affordable_projects"]
+        assert [by_id[i] for i in answer["expensive_project_ids"]] == single["expensive_projects"]
+
+    assert client.post("/api/projects/batch", json={"budgets": []}).status_code == 422
+    assert client.post("/api/projects/batch", json={"budgets": [5], "regions": ["mars-1"]}).status_code == 400
+
+
+class SlowAsyncPricingClient:
+    """Pricing API that takes seconds to answer and then has no prices"""
+
+    def __init__(self):
+        self.answered = 0
+
+    async def get_prices(self, keys, refresh=False):
+        await asyncio.sleep(2)
+        self.answered += 1
+        return {}
+
+
+def test_cold_regions_do_not_wait_on_pricing(client, monkeypatch):
+    client, _ = client
+    pricing = SlowAsyncPricingClient()
+    monkeypatch.setattr(projects, "async_pricing_client", pricing)
+    monkeypatch.setattr(projects, "region_stores", {})
+
+    started = time.perf_counter()
+    response = client.get("/api/projects/regions")
+    elapsed = time.perf_counter() - started
+
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["regions"]) == len(projects.REGION_NAMES)
+    sources = dict(zip(body["regions"], body["pricing_sources"]))
+    del sources[projects.DEFAULT_REGION]
+    assert set(sources.values()) == {"fallback"}
+    # Served from the fallback seeds; live prices are fetched in the background
+    assert pricing.answered == 0
+    assert elapsed < 1.0
+
+
+def test_snapshot_headers_describe_the_snapshots_used(client, monkeypatch):
+    client, store = client
+    region_store = SnapshotStore(lambda: projects.price_template_catalog(dict(projects.FALLBACK_PRICES)))
+    for _ in range(3):
+        region_store.refresh()
+    monkeypatch.setattr(projects, "region_stores", {"eu-west-1": region_store})
+
+    assert client.get("/api/projects?budget=5").headers["X-Pricing-Snapshot-Version"] == "1"
+    response = client.get("/api/projects/regions?regions=eu-west-1")
+    assert response.headers["X-Pricing-Snapshot-Version"] == "3"
+    assert response.headers["X-Pricing-Refreshing"] == "false"
+    response = client.get("/api/projects/regions?regions=us-east-1,eu-west-1")
+    assert response.headers["X-Pricing-Snapshot-Version"] == "1,3"
+
+    # Routes that price nothing carry no snapshot headers
+    assert "X-Pricing-Snapshot-Version" not in client.get("/api/spend").headers
+
+
+def test_metrics_endpoint_reports_request_timing(client):
+    client, _ = client
+    client.get("/api/projects?budget=12")
+
+    response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/projects",status="200"}' in response.text
+    assert "pricing_cache_hits_total" in response.text
+    assert "# TYPE price_snapshot_age_seconds gauge" in response.text
+
+
+def test_profiler_is_opt_in(client, monkeypatch):
+    client, _ = client
+    assert client.get("/debug/profile?seconds=0.05").status_code == 404
+
+    monkeypatch.setenv("PROFILER_ENABLED", "1")
+    response = client.get("/debug/profile?seconds=0.05&interval_ms=1")
+    assert response.status_code == 200
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in response.text.splitlines())
+
+
+def test_actual_spend_needs_ingested_report(client, monkeypatch, tmp_path):
+    from app import usage_report
+
+    client, _ = client
+    monkeypatch.setattr(usage_report, "usage_store", None)
+    monkeypatch.delenv("CUR_STATE_PATH", raising=False)
+    assert client.get("/api/spend").status_code == 404
+
+    store = usage_report.UsageStore(str(tmp_path / "usage.db"))
+    store._replace_file("/cur/report.csv.gz", 1, 1, 3, {
+        ("2024-05", "S3", "usage"): 0.5,
+        ("2024-05", "Lambda", "usage"): 2.0,
+        ("2024-05", "Lambda", "credit"): -0.25,
+    })
+    monkeypatch.setattr(usage_report, "usage_store", store)
+
+    response = client.get("/api/spend?projects=1&budget=2")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["month"] == "2024-05"
+    assert body["actual_total"] == 2.5
+    assert body["adjustments"] == {"credit": -0.25}
+    assert body["net_total"] == 2.25
+    assert body["over_budget"] is True
+    assert [project["id"] for project in body["projects"]] == [1]
+
+    assert client.get("/api/spend?month=2024-06").status_code == 404
+    assert client.get("/api/spend?projects=1,999").status_code == 400
+
+
+def test_forecast_endpoint(client):
+    client, _ = client
+
+    response = client.post("/api/projects/forecast", json={
+        "project_id": 5,
+        "budget": 3.0,
+        "traffic": {"kind": "triangular", "low": 2, "high": 20, "mode": 5},
+        "samples": 5000,
+        "seed": 1,
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["project"] == "Image Processing Service"
+    assert body["samples"] == 5000
+    assert body["percentiles"]["p5"] <= body["percentiles"]["p50"] <= body["percentiles"]["p99"]
+    assert 0.0 <= body["probability_over_budget"] <= 1.0
+
+    assert client.post("/api/projects/forecast", json={"project_id": 999, "budget": 10}).status_code == 404
+    assert client.post("/api/projects/forecast", json={
+        "project_id": 5, "budget": 10, "traffic": {"low": 5, "high": 2},
+    }).status_code == 422
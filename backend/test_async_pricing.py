@@ -0,0 +1,152 @@
+"""
+Tests for the async pricing client against a local stub Pricing API
+Run with: python -m pytest test_async_pricing.py
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.async_pricing import AsyncAWSPricingClient
+from app.aws_pricing import PriceKey
+
+STUB_PRICES = {
+    'AmazonEC2': '0.0042',
+    'AmazonRDS': '0.0160',
+    'AWS-Lambda-Requests': '0.0000002',
+    'AWS-Lambda-Duration': '0.0000166667',
+}
+
+
+class StubPricingHandler(BaseHTTPRequestHandler):
+    """Answers GetProducts with a canned price after a fixed delay"""
+
+    delay_seconds = 0.2
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.delay_seconds)
+
+        filters = {f['Field']: f['Value'] for f in payload['Filters']}
+        price = STUB_PRICES.get(filters.get('group', payload['ServiceCode']))
+        document = {'terms': {'OnDemand': {'T': {'priceDimensions': {
+            'D': {'pricePerUnit': {'USD': price}}
+        }}}}}
+
+        body = json.dumps({'PriceList': [json.dumps(document)]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-amz-json-1.1')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubPricingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+KEYS = [
+    PriceKey('lambda', 'us-east-1', 'requests'),
+    PriceKey('lambda', 'us-east-1', 'duration'),
+    PriceKey('ec2', 'us-east-1', 't4g.nano'),
+    PriceKey('rds', 'us-east-1', 'db.t4g.micro', 'MySQL'),
+]
+
+
+def test_lookups_run_concurrently():
+    server, url = run_stub_server()
+    client = AsyncAWSPricingClient(endpoint_url=url, sign_requests=False)
+
+    try:
+        started = time.perf_counter()
+        prices = asyncio.run(client.get_prices(KEYS))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+
+    assert prices[KEYS[2]] == 0.0042
+    assert prices[KEYS[0]] == 0.0000002
+    # Four 200ms lookups in parallel, not back to back
+    assert elapsed < 0.6
+
+
+def test_slow_lookups_time_out():
+    server, url = run_stub_server()
+    client = AsyncAWSPricingClient(endpoint_url=url, sign_requests=False, timeout_seconds=0.05)
+
+    try:
+        price = asyncio.run(client.get_ec2_pricing('t4g.nano'))
+    finally:
+        server.shutdown()
+
+    assert price is None
+
+
+def test_cancelled_leader_does_not_fail_coalesced_callers():
+    server, url = run_stub_server()
+    client = AsyncAWSPricingClient(endpoint_url=url, sign_requests=False, max_concurrency=1)
+
+    async def scenario():
+        # Hold the only slot so the leader's fetch waits on the semaphore
+        busy = asyncio.create_task(client.get_prices([KEYS[0]]))
+        await asyncio.sleep(0.05)
+        leader = asyncio.create_task(client.get_ec2_pricing('t4g.nano'))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(client.get_ec2_pricing('t4g.nano'))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        try:
+            return await follower
+        finally:
+            await busy
+            await client.aclose()
+
+    try:
+        price = asyncio.run(scenario())
+    finally:
+        server.shutdown()
+
+    assert price == 0.0042
+    assert client.cache.get(KEYS[2]) == 0.0042
+
+
+class PagedAsyncClient(AsyncAWSPricingClient):
+    """Serves GetProducts from a product list instead of HTTP"""
+
+    def __init__(self, products, **kwargs):
+        super().__init__(sign_requests=False, **kwargs)
+        self.products = products
+        self.pages = 0
+
+    async def _get_products(self, http, payload):
+        self.pages += 1
+        start = int(payload.get('NextToken', 0))
+        end = start + payload['MaxResults']
+        response = {'PriceList': self.products[start:end]}
+        if end < len(self.products):
+            response['NextToken'] = str(end)
+        return response
+
+
+def test_batched_lookups_stop_paging_once_found():
+    products = [
+        json.dumps({
+            'product': {'attributes': {'instanceType': f"db.m{i}.large"}},
+            'terms': {'OnDemand': {'T': {'priceDimensions': {'D': {'pricePerUnit': {'USD': str(i)}}}}}},
+        })
+        for i in range(300)
+    ]
+    client = PagedAsyncClient(products)
+    keys = [PriceKey('rds', 'us-east-1', f"db.m{i}.large", 'MySQL') for i in range(10)]
+
+    prices = asyncio.run(client.get_prices(keys))
+
+    assert prices[keys[9]] == 9.0
+    assert client.pages == 1
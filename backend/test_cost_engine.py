@@ -0,0 +1,154 @@
+"""
+Tests for the vectorized cost engine
+Run with: python -m pytest test_cost_engine.py
+"""
+
+import warnings
+
+import numpy as np
+import pytest
+
+from app.aws_pricing import LAMBDA_FALLBACK_PRICING, calculate_lambda_cost
+from app import projects
+from app.cost_engine import (
+    Distribution,
+    ForecastRequest,
+    LambdaBatchRequest,
+    evaluate_lambda_batch,
+    forecast_costs,
+    lambda_costs,
+    lambda_pricing_from,
+    max_affordable_requests,
+)
+
+
+def test_lambda_costs_match_scalar_calculation():
+    requests = np.array([0, 1_000, 250_000, 5_000_000])
+    duration_ms = np.array([50, 120, 300, 1_000])
+    memory_mb = np.array([128, 256, 512, 1_769])
+
+    costs = lambda_costs(requests, duration_ms, memory_mb, LAMBDA_FALLBACK_PRICING)
+    expected = [
+        calculate_lambda_cost(int(r), float(d), int(m), LAMBDA_FALLBACK_PRICING)
+        for r, d, m in zip(requests, duration_ms, memory_mb)
+    ]
+
+    assert costs.tolist() == pytest.approx(expected)
+
+
+def test_grid_batch_and_budget():
+    batch = LambdaBatchRequest(
+        requests=[100_000, 1_000_000],
+        avg_duration_ms=[100, 200, 400],
+        memory_mb=[128],
+        grid=True,
+        budget=5.0,
+    )
+    result = evaluate_lambda_batch(batch, LAMBDA_FALLBACK_PRICING)
+
+    assert result["count"] == 6
+    assert result["requests"][:3] == [100_000.0] * 3
+    assert result["avg_duration_ms"][:3] == [100.0, 200.0, 400.0]
+
+    # Spending the affordable requests stays within budget; one more doesn't
+    for max_requests, duration, memory in zip(
+        result["max_requests_within_budget"], result["avg_duration_ms"], result["memory_mb"]
+    ):
+        cost = calculate_lambda_cost(max_requests, duration, memory, LAMBDA_FALLBACK_PRICING)
+        assert cost <= 5.0
+        assert calculate_lambda_cost(max_requests + 1, duration, memory, LAMBDA_FALLBACK_PRICING) > 5.0 - 1e-9
+
+
+def test_mismatched_columns_rejected():
+    with pytest.raises(ValueError):
+        LambdaBatchRequest(requests=[1, 2], avg_duration_ms=[1, 2, 3], memory_mb=[128])
+
+
+def test_out_of_range_columns_rejected():
+    with pytest.raises(ValueError):
+        LambdaBatchRequest(requests=[1], avg_duration_ms=[-100], memory_mb=[128])
+    with pytest.raises(ValueError):
+        LambdaBatchRequest(requests=[1], avg_duration_ms=[100], memory_mb=[0])
+    with pytest.raises(ValueError):
+        LambdaBatchRequest(requests=[100] * 50, avg_duration_ms=[100] * 50, memory_mb=[128] * 50, grid=True)
+
+
+def test_zero_duration_with_free_tier_is_quiet():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        max_requests = max_affordable_requests(
+            2.0, np.array([0.0, 100.0]), np.array([128, 128]), LAMBDA_FALLBACK_PRICING, apply_free_tier=True
+        )
+    # Compute is free, so only requests are billed past the 1M allowance
+    assert max_requests[0] == 1_000_000 + 2.0 // LAMBDA_FALLBACK_PRICING['per_request']
+
+
+def test_max_affordable_requests_with_free_tier():
+    duration_ms = np.array([10, 200, 3000])
+    memory_mb = np.array([128, 512, 1024])
+
+    max_requests = max_affordable_requests(
+        2.0, duration_ms, memory_mb, LAMBDA_FALLBACK_PRICING, apply_free_tier=True
+    )
+
+    within = lambda_costs(max_requests, duration_ms, memory_mb, LAMBDA_FALLBACK_PRICING, True)
+    over = lambda_costs(max_requests + 1, duration_ms, memory_mb, LAMBDA_FALLBACK_PRICING, True)
+    assert np.all(within <= 2.0 + 1e-9)
+    assert np.all(over > 2.0 - 1e-9)
+    assert lambda_costs(1_000_000, 10, 128, LAMBDA_FALLBACK_PRICING, True) == 0.0
+
+
+def test_distributions_sample_within_their_ranges():
+    rng = np.random.default_rng(0)
+
+    assert Distribution().sample(rng, 3).tolist() == [1.0, 1.0, 1.0]
+    uniform = Distribution(low=2, high=5).sample(rng, 10_000)
+    assert uniform.min() >= 2 and uniform.max() <= 5
+    triangular = Distribution(kind="triangular", low=1, high=3, mode=1.5).sample(rng, 10_000)
+    assert triangular.min() >= 1 and triangular.max() <= 3
+    lognormal = Distribution(kind="lognormal", low=2, high=5).sample(rng, 100_000)
+    assert np.percentile(lognormal, [5, 95]) == pytest.approx([2, 5], rel=0.02)
+
+    with pytest.raises(ValueError):
+        Distribution(low=5, high=2)
+    with pytest.raises(ValueError):
+        Distribution(kind="lognormal", low=0, high=2)
+
+
+def test_forecast_matches_point_estimate_and_scales_with_traffic():
+    registry = projects.template_registry
+    prices = projects.FALLBACK_PRICES
+    region = projects.DEFAULT_REGION
+    # Image Processing Service: Lambda usage beyond the free tier
+    index = next(i for i, spec in enumerate(registry.templates) if spec.id == 5)
+    estimate = registry.evaluate(prices, region).totals[index]
+
+    as_estimated = forecast_costs(
+        ForecastRequest(project_id=5, budget=estimate + 0.01, samples=500), registry, index, prices, region
+    )
+    assert as_estimated["percentiles"]["p5"] == as_estimated["percentiles"]["p99"] == round(estimate, 2)
+    assert as_estimated["probability_over_budget"] == 0.0
+
+    # 5-20x traffic runs past the Lambda free tier
+    request = ForecastRequest(
+        project_id=5, budget=3.0, samples=20_000, seed=7,
+        traffic=Distribution(low=5, high=20), duration=Distribution(kind="lognormal", low=0.8, high=1.5),
+    )
+    result = forecast_costs(request, registry, index, prices, region)
+    assert result == forecast_costs(request, registry, index, prices, region)
+    percentiles = list(result["percentiles"].values())
+    assert percentiles == sorted(percentiles)
+    assert percentiles[0] >= round(estimate, 2) < percentiles[-1]
+    assert 0.0 < result["probability_over_budget"] < 1.0
+    assert sum(result["histogram"]["counts"]) == 20_000
+
+    # Each sample is priced like calculate_lambda_cost on the scaled usage
+    traffic, duration = np.array([1.0, 8.0, 20.0]), np.array([1.0, 1.2, 0.9])
+    spec = registry.templates[index]
+    fn = spec.components[0].lambda_usage
+    fixed = sum(component.cost for component in spec.components)
+    expected = fixed + lambda_costs(
+        fn.requests * traffic, fn.duration_ms * duration, fn.memory_mb,
+        lambda_pricing_from(prices, region), apply_free_tier=True,
+    )
+    assert registry.sample_totals(index, prices, region, traffic, duration) == pytest.approx(expected)
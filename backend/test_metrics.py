@@ -0,0 +1,37 @@
+"""
+Tests for the Prometheus metrics registry
+Run with: python -m pytest test_metrics.py
+"""
+
+import pytest
+
+from app.metrics import Counter, Histogram, Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.register(Histogram("call_seconds", "Call latency", ("outcome",), buckets=(0.1, 1.0)))
+    latency.observe(0.05, outcome="ok")
+    latency.observe(0.5, outcome="ok")
+    with latency.time(outcome="ok") as labels:
+        labels["outcome"] = "error"
+
+    text = registry.render()
+
+    assert "# TYPE call_seconds histogram" in text
+    assert 'call_seconds_bucket{outcome="ok",le="0.1"} 1' in text
+    assert 'call_seconds_bucket{outcome="ok",le="1"} 2' in text
+    assert 'call_seconds_bucket{outcome="ok",le="+Inf"} 2' in text
+    assert 'call_seconds_count{outcome="ok"} 2' in text
+    assert latency.count(outcome="error") == 1
+
+
+def test_counter_labels_are_checked_and_escaped():
+    registry = Registry()
+    fallbacks = registry.register(Counter("fallbacks_total", "Fallbacks", ("region",)))
+    fallbacks.inc(region='us-"east"-1')
+    fallbacks.inc(2, region='us-"east"-1')
+
+    assert 'fallbacks_total{region="us-\\"east\\"-1"} 3' in registry.render()
+    with pytest.raises(ValueError):
+        fallbacks.inc(zone="a")
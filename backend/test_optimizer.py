@@ -0,0 +1,98 @@
+"""
+Tests for the multi-project budget optimizer
+Run with: python -m pytest test_optimizer.py
+"""
+
+import random
+from itertools import combinations
+
+import pytest
+
+from app.optimizer import BudgetPacker, PackingRequest, optimize_projects
+from app.projects import CostComponent, ProjectTemplate
+
+
+def make_template(template_id, own_cost, shared=()):
+    components = [CostComponent(service="EC2", description="Server", cost=own_cost)]
+    components += [
+        CostComponent(service=service, description="Shared", cost=cost, shared=True)
+        for service, cost in shared
+    ]
+    return ProjectTemplate(
+        id=template_id,
+        name=f"Project {template_id}",
+        description="",
+        total_cost=round(sum(c.cost for c in components), 2),
+        components=components,
+        estimated_traffic="",
+        complexity="Beginner",
+    )
+
+
+def combined_cost(templates):
+    own = 0.0
+    shared = {}
+    for template in templates:
+        for component in template.components:
+            if component.shared:
+                shared[component.service] = max(shared.get(component.service, 0.0), component.cost)
+            else:
+                own += component.cost
+    return own + sum(shared.values())
+
+
+def test_shared_components_are_paid_once():
+    templates = [
+        make_template(1, 2.0, [("Route53", 0.5)]),
+        make_template(2, 2.0, [("Route53", 0.5), ("CloudWatch", 0.25)]),
+        make_template(3, 2.6),
+    ]
+
+    # 1 + 2 fit only because the hosted zone is shared: 4.75 vs 5.25 standalone
+    result = optimize_projects(PackingRequest(budget=5.0, top_k=1), templates)
+
+    best = result["combinations"][0]
+    assert best["project_ids"] == [1, 2]
+    assert best["total_cost"] == 4.75
+    assert best["shared_savings"] == 0.5
+    assert result["optimal"]
+
+
+def test_large_catalogs_do_not_exhaust_the_stack():
+    # Every template fits, so the search goes one level deeper per template
+    templates = [make_template(i, 0.01 + (i % 7) / 100) for i in range(1200)]
+
+    result = BudgetPacker(templates).solve(10000.0, top_k=1)
+
+    assert result.optimal
+    assert len(result.combinations[0].templates) == 1200
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_brute_force(seed):
+    rng = random.Random(seed)
+    services = ["Route53", "CloudWatch"]
+    templates = [
+        make_template(
+            i,
+            round(rng.uniform(0.1, 6.0), 2),
+            [(service, round(rng.uniform(0.1, 1.0), 2)) for service in services if rng.random() < 0.5],
+        )
+        for i in range(12)
+    ]
+    values = {template.id: rng.uniform(1, 10) for template in templates}
+    budget = 12.0
+
+    expected = max(
+        sum(values[t.id] for t in subset)
+        for size in range(1, len(templates) + 1)
+        for subset in combinations(templates, size)
+        if combined_cost(subset) <= budget + 1e-9
+    )
+
+    result = BudgetPacker(templates, values).solve(budget, top_k=3)
+    assert result.optimal
+    assert result.combinations[0].value == pytest.approx(expected)
+    for combination in result.combinations:
+        assert combination.total_cost == pytest.approx(combined_cost(combination.templates))
+        assert combination.total_cost <= budget + 1e-9
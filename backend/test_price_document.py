@@ -0,0 +1,101 @@
+"""
+Tests for Price List document extraction
+Run with: python -m pytest test_price_document.py
+"""
+
+import io
+import json
+
+import pytest
+
+from app.price_document import extract_price_document, iter_savings_plan_rates
+
+
+def price_dimension(price, unit="Hrs", begin_range="0"):
+    return {"beginRange": begin_range, "unit": unit, "pricePerUnit": {"USD": price}}
+
+
+def price_list_document(**terms):
+    return json.dumps({
+        "product": {
+            "productFamily": "Compute Instance",
+            "attributes": {
+                "instanceType": "m5.large",
+                "location": "US East (N. Virginia)",
+                "note": "a value mentioning \"OnDemand\": {} must not confuse the extractor",
+            },
+        },
+        "serviceCode": "AmazonEC2",
+        "terms": terms,
+    })
+
+
+def test_reads_first_tier_on_demand_price_and_attributes():
+    document = price_list_document(OnDemand={"SKU.OD": {"priceDimensions": {
+        "SKU.OD.2": price_dimension("0.0800", begin_range="750"),
+        "SKU.OD.1": price_dimension("0.0960"),
+    }}})
+
+    extracted = extract_price_document(document, ("instanceType", "vcpu"))
+
+    assert extracted.on_demand == 0.096
+    assert extracted.attributes == {"instanceType": "m5.large"}
+    assert extracted.reserved == ()
+
+
+def test_reserved_terms_only_when_asked():
+    document = price_list_document(
+        Reserved={"SKU.RI": {
+            "priceDimensions": {
+                "SKU.RI.1": price_dimension("438", unit="Quantity"),
+                "SKU.RI.2": price_dimension("0.0500"),
+            },
+            "termAttributes": {
+                "LeaseContractLength": "1yr",
+                "OfferingClass": "standard",
+                "PurchaseOption": "Partial Upfront",
+            },
+        }},
+        OnDemand={"SKU.OD": {"priceDimensions": {"SKU.OD.1": price_dimension("0.0960")}}},
+    )
+
+    (offering,) = extract_price_document(document, reserved=True).reserved
+
+    assert extract_price_document(document).on_demand == 0.096
+    assert (offering.hourly, offering.upfront) == (0.05, 438.0)
+    assert offering.effective_hourly == pytest.approx(0.05 + 438 / 8760)
+
+
+def test_missing_on_demand_price():
+    assert extract_price_document(price_list_document(Reserved={})).on_demand is None
+
+
+def test_savings_plan_rates_stream():
+    offer = {
+        "version": "20240101",
+        "products": [{"sku": "PLAN1", "productFamily": "ComputeSavingsPlans"}],
+        "terms": {"savingsPlan": [
+            {
+                "sku": "PLAN1",
+                "leaseContractLength": {"duration": 1, "unit": "year"},
+                "rates": [
+                    {
+                        "discountedSku": "SKU123",
+                        "discountedUsageType": "BoxUsage:m5.large",
+                        "discountedOperation": "RunInstances",
+                        "discountedServiceCode": "AmazonEC2",
+                        "unit": "Hrs",
+                        "discountedRate": {"price": "0.0620", "currency": "USD"},
+                    },
+                    {"discountedSku": "SKU456", "discountedRate": {"price": "0.4", "currency": "CNY"}},
+                ],
+            },
+            {"sku": "PLAN2", "rates": []},
+        ]},
+    }
+
+    rates = list(iter_savings_plan_rates(io.StringIO(json.dumps(offer)), chunk_size=16))
+
+    assert [(rate.plan_sku, rate.discounted_sku, rate.rate) for rate in rates] == [
+        ("PLAN1", "SKU123", 0.062)
+    ]
@@ -0,0 +1,117 @@
+"""
+Tests for offline offer-file ingestion
+Run with: python -m pytest test_price_store.py
+"""
+
+import json
+
+from app.aws_pricing import AWSPricingClient, PriceKey
+from app.price_store import PriceStore
+
+
+def on_demand(sku, price, unit="Hrs", begin_range="0"):
+    return {
+        sku: {
+            f"{sku}.JRTCKXETXF": {
+                "priceDimensions": {
+                    f"{sku}.JRTCKXETXF.6YS6EN2CT7": {
+                        "beginRange": begin_range,
+                        "unit": unit,
+                        "pricePerUnit": {"USD": price},
+                    }
+                }
+            }
+        }
+    }
+
+
+def write_offer_file(path):
+    offer = {
+        "formatVersion": "v1.0",
+        "disclaimer": "Brackets [like {these}] and \"quotes\" must not confuse the parser",
+        "offerCode": "AmazonEC2",
+        "products": {
+            "EC2NANO": {
+                "sku": "EC2NANO",
+                "productFamily": "Compute Instance",
+                "attributes": {
+                    "servicecode": "AmazonEC2",
+                    "location": "US East (N. Virginia)",
+                    "instanceType": "t4g.nano",
+                    "operatingSystem": "Linux",
+                    "tenancy": "Shared",
+                    "preInstalledSw": "NA",
+                    "capacitystatus": "Used",
+                },
+            },
+            "EC2RESERVED": {
+                "sku": "EC2RESERVED",
+                "productFamily": "Compute Instance",
+                "attributes": {
+                    "servicecode": "AmazonEC2",
+                    "regionCode": "us-east-1",
+                    "instanceType": "t4g.nano",
+                    "operatingSystem": "Linux",
+                    "tenancy": "Shared",
+                    "preInstalledSw": "NA",
+                    "capacitystatus": "AllocatedCapacityReservation",
+                },
+            },
+            "RDSMICRO": {
+                "sku": "RDSMICRO",
+                "productFamily": "Database Instance",
+                "attributes": {
+                    "servicecode": "AmazonRDS",
+                    "regionCode": "eu-west-1",
+                    "instanceType": "db.t4g.micro",
+                    "databaseEngine": "PostgreSQL",
+                    "deploymentOption": "Single-AZ",
+                },
+            },
+            "LAMBDAREQ": {
+                "sku": "LAMBDAREQ",
+                "productFamily": "Serverless",
+                "attributes": {
+                    "servicecode": "AWSLambda",
+                    "regionCode": "us-east-1",
+                    "group": "AWS-Lambda-Requests",
+                },
+            },
+        },
+        "terms": {
+            "OnDemand": {
+                **on_demand("EC2NANO", "0.0042000000"),
+                **on_demand("EC2RESERVED", "0.0000000000"),
+                **on_demand("RDSMICRO", "0.0170000000"),
+                **on_demand("LAMBDAREQ", "0.0000002000", unit="Requests"),
+            },
+            "Reserved": {"EC2NANO": {"ignored": {"priceDimensions": {}}}},
+        },
+    }
+    path.write_text(json.dumps(offer, indent=2))
+
+
+def test_ingest_offer_file_in_small_chunks(tmp_path):
+    offer_path = tmp_path / "index.json"
+    write_offer_file(offer_path)
+    store = PriceStore(str(tmp_path / "prices.db"))
+
+    written = store.ingest_offer_file(str(offer_path), chunk_size=7)
+
+    assert written == 3
+    assert store.get_price(PriceKey("ec2", "us-east-1", "t4g.nano")) == 0.0042
+    assert store.get_price(PriceKey("rds", "eu-west-1", "db.t4g.micro", "PostgreSQL")) == 0.017
+    assert store.get_price(PriceKey("lambda", "us-east-1", "requests")) == 0.0000002
+    assert store.get_price(PriceKey("ec2", "us-west-2", "t4g.nano")) is None
+
+
+def test_offline_client_uses_store_only(tmp_path):
+    write_offer_file(tmp_path / "index.json")
+    store = PriceStore(str(tmp_path / "prices.db"))
+    store.ingest(str(tmp_path))
+
+    client = AWSPricingClient(region="us-east-1", price_store=store, offline=True)
+    client.pricing_client = None  # Any API call would fail loudly
+
+    assert client.get_ec2_pricing("t4g.nano") == 0.0042
+    assert client.get_ec2_pricing("t3.micro") is None
@@ -3,7 +3,7 @@ Test script to verify AWS pricing API integration
 Run with: python test_pricing.py
 """
 
-from app.aws_pricing import AWSPricingClient, calculate_monthly_cost, calculate_lambda_cost
+from app.aws_pricing import AWSPricingClient, PriceKey, calculate_monthly_cost, calculate_lambda_cost
 
 
 def test_pricing():
@@ -19,9 +19,11 @@ def test_pricing():
     print("\n📦 EC2 Pricing:")
     print("-" * 50)
     
+    # Looked up together, so a long list shares one paginated query
     ec2_instances = ['t3.nano', 't3.micro', 't4g.nano', 't4g.micro']
+    ec2_prices = client.get_prices([PriceKey('ec2', 'us-east-1', i) for i in ec2_instances])
     for instance in ec2_instances:
-        price = client.get_ec2_pricing(instance)
+        price = ec2_prices[PriceKey('ec2', 'us-east-1', instance)]
         if price:
             monthly = calculate_monthly_cost(price)
             print(f"  {instance:15} ${price:.4f}/hour → ${monthly:.2f}/month")
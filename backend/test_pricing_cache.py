@@ -0,0 +1,216 @@
+"""
+Tests for the TTL + LRU pricing cache
+Run with: python -m pytest test_pricing_cache.py
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+from app.aws_pricing import PRODUCTS_PAGE_SIZE, AWSPricingClient, PriceKey
+from app.pricing_cache import PricingCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBotoPricing:
+    """Stands in for boto3's pricing client"""
+
+    def __init__(self, price_list):
+        self.price_list = price_list
+        self.calls = 0
+
+    def get_products(self, **kwargs):
+        self.calls += 1
+        if isinstance(self.price_list, Exception):
+            raise self.price_list
+        return {'PriceList': self.price_list}
+
+
+class FakePagedPricing:
+    """get_products over a product list, PageSize products per page"""
+
+    def __init__(self, products):
+        self.products = products
+        self.calls = 0
+
+    def get_products(self, ServiceCode, Filters, MaxResults, NextToken=None, **kwargs):
+        self.calls += 1
+        start = int(NextToken or 0)
+        page = self.products[start:start + MaxResults]
+        response = {'PriceList': page}
+        if start + MaxResults < len(self.products):
+            response['NextToken'] = str(start + MaxResults)
+        return response
+
+
+def product_document(instance_type, price):
+    return json.dumps({
+        'product': {'attributes': {'instanceType': instance_type}},
+        'terms': {'OnDemand': {'X': {'priceDimensions': {'Y': {'pricePerUnit': {'USD': str(price)}}}}}},
+    })
+
+
+def on_demand_document(price):
+    return (
+        '{"terms": {"OnDemand": {"X.JRTCKXETXF": {"priceDimensions": '
+        '{"X.JRTCKXETXF.6YS6EN2CT7": {"pricePerUnit": {"USD": "%s"}}}}}}}' % price
+    )
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = PricingCache(ttl_seconds=10, clock=clock)
+    cache.set("a", 1.0)
+
+    assert cache.get("a") == 1.0
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_negative_results_use_short_ttl():
+    clock = FakeClock()
+    cache = PricingCache(ttl_seconds=100, negative_ttl_seconds=5, clock=clock)
+    cache.set("missing", None)
+
+    assert "missing" in cache
+    clock.now = 6
+    assert "missing" not in cache
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = PricingCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+
+def test_client_caches_prices_and_retries_failures():
+    clock = FakeClock()
+    cache = PricingCache(ttl_seconds=100, negative_ttl_seconds=5, clock=clock)
+    client = AWSPricingClient(region="us-east-1", cache=cache)
+
+    client.pricing_client = FakeBotoPricing(RuntimeError("throttled"))
+    assert client.get_ec2_pricing("t4g.nano") is None
+    assert client.get_ec2_pricing("t4g.nano") is None
+    assert client.pricing_client.calls == 1
+
+    # Once the negative entry expires, the lookup is retried
+    clock.now = 6
+    client.pricing_client = FakeBotoPricing([on_demand_document("0.0042")])
+    assert client.get_ec2_pricing("t4g.nano") == 0.0042
+    assert client.get_ec2_pricing("t4g.nano") == 0.0042
+    assert client.pricing_client.calls == 1
+    assert cache.stats()["hits"] >= 2
+
+
+def test_failed_forced_refresh_keeps_cached_value():
+    cache = PricingCache()
+    cache.set("a", 1.0)
+    before = cache.stats()
+
+    assert cache.get_or_load("a", lambda: None, refresh=True) == 1.0
+    assert asyncio.run(cache.get_or_load_async("a", lambda: asyncio.sleep(0), refresh=True)) == 1.0
+    assert cache.get_or_load("a", lambda: 2.0, refresh=True) == 2.0
+
+    after = cache.stats()
+    assert (after["hits"], after["misses"]) == (before["hits"], before["misses"])
+    assert cache.get("a") == 2.0
+
+
+def test_concurrent_threads_share_one_load():
+    cache = PricingCache()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(timeout=5)
+        return 0.0042
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_load("t4g.nano", loader)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["coalesced"] < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == [0.0042] * 8
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_concurrent_coroutines_share_one_load():
+    cache = PricingCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 0.0042
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load_async("t4g.nano", loader) for _ in range(8)))
+
+    assert asyncio.run(main()) == [0.0042] * 8
+    assert calls == [1]
+    assert cache.stats()["coalesced"] == 7
+
+
+def test_waiters_see_the_loader_error():
+    cache = PricingCache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("throttled")
+
+    async def main():
+        return await asyncio.gather(
+            *(cache.get_or_load_async("t4g.nano", loader) for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert "t4g.nano" not in cache
+
+
+def test_many_prices_share_paginated_queries():
+    products = [product_document(f"m{i}.large", i / 1000) for i in range(250)]
+    client = AWSPricingClient(region="us-east-1")
+    client.pricing_client = FakePagedPricing(products)
+
+    keys = [PriceKey('ec2', 'us-east-1', f"m{i}.large") for i in range(0, 250, 5)]
+    keys.append(PriceKey('ec2', 'us-east-1', 'no.such.type'))
+    prices = client.get_prices(keys)
+
+    assert prices[PriceKey('ec2', 'us-east-1', 'm245.large')] == 0.245
+    assert prices[PriceKey('ec2', 'us-east-1', 'no.such.type')] is None
+    # 51 prices, one pass over the product pages
+    assert client.pricing_client.calls == -(-len(products) // PRODUCTS_PAGE_SIZE)
+
+    # Now cached, including the miss
+    client.get_prices(keys)
+    assert client.pricing_client.calls == 3
@@ -0,0 +1,56 @@
+"""
+Tests for the benchmark Pricing API stand-in
+Run with: python -m pytest test_pricing_stub.py
+"""
+
+import asyncio
+
+from app.async_pricing import AsyncAWSPricingClient
+from app.aws_pricing import AWSPricingClient, PriceKey
+from app.pricing_cache import PricingCache
+from benchmarks.pricing_stub import StubPricingAPI, serve
+from benchmarks.results import timing_stats
+
+KEYS = [
+    PriceKey('ec2', 'eu-west-1', 't4g.nano'),
+    PriceKey('rds', 'eu-west-1', 'db.t4g.micro', 'MySQL'),
+    PriceKey('lambda', 'eu-west-1', 'requests'),
+]
+
+
+def test_sync_client_prices_from_stub():
+    client = AWSPricingClient(region='eu-west-1', cache=PricingCache())
+    client.pricing_client = StubPricingAPI(regions=['eu-west-1'])
+
+    prices = client.get_prices(KEYS)
+
+    assert all(price is not None and price > 0 for price in prices.values())
+    assert client.pricing_client.calls == len(KEYS)
+
+
+def test_injected_failures_become_missing_prices():
+    client = AWSPricingClient(region='eu-west-1', cache=PricingCache())
+    client.pricing_client = StubPricingAPI(regions=['eu-west-1'], failure_rate=1.0)
+
+    assert client.get_prices(KEYS) == {key: None for key in KEYS}
+
+
+def test_async_client_pages_through_served_stub():
+    stub = StubPricingAPI(regions=['us-east-1'], extra_instance_types=250)
+    server, url = serve(stub)
+    client = AsyncAWSPricingClient(endpoint_url=url, sign_requests=False, cache=PricingCache())
+    keys = [PriceKey('ec2', 'us-east-1', f"stub{i // 8}.size{i % 8}") for i in range(0, 250, 10)]
+
+    try:
+        prices = asyncio.run(client.get_prices(keys))
+    finally:
+        server.shutdown()
+
+    assert prices[keys[-1]] == 2.41
+    assert stub.calls == 3
+
+
+def test_timing_stats_percentiles():
+    stats = timing_stats([i / 1e6 for i in range(1, 101)])
+
+    assert (stats["p50_us"], stats["p95_us"], stats["p99_us"]) == (50, 95, 99)
@@ -0,0 +1,363 @@
+"""
+Tests for project template snapshots and budget filtering
+Run with: python -m pytest test_projects.py
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from app import projects
+from app.aws_pricing import calculate_lambda_cost
+from app.price_snapshot import PriceSnapshot, PriceSnapshotFile
+from app.projects import SnapshotStore, get_projects_by_budget
+from app.refresher import PricingRefresher
+from app.template_registry import load_template_registry
+
+
+class StubPricingClient:
+    """Pricing client that never touches the network"""
+
+    def __init__(self, prices=None):
+        self.prices = dict(projects.FALLBACK_PRICES) if prices is None else prices
+        self.calls = 0
+
+    def get_prices(self, keys, refresh=False):
+        self.calls += 1
+        return {key: self.prices.get(key) for key in keys}
+
+
+class StubAsyncPricingClient(StubPricingClient):
+    async def get_prices(self, keys, refresh=False):
+        return super().get_prices(keys)
+
+
+def make_store(monkeypatch):
+    stub = StubPricingClient()
+    monkeypatch.setattr(projects, "pricing_client", stub)
+    return stub, SnapshotStore(projects.fetch_template_catalog)
+
+
+def test_snapshot_is_built_once(monkeypatch):
+    stub, store = make_store(monkeypatch)
+
+    first = store.get()
+    calls = stub.calls
+    second = store.get()
+
+    assert first is second
+    assert stub.calls == calls
+    assert first.version == 1
+    assert len(first.templates) == 6
+
+
+def test_refresh_swaps_in_new_version(monkeypatch):
+    _, store = make_store(monkeypatch)
+
+    old = store.get()
+    new = store.refresh()
+
+    assert new.version == old.version + 1
+    assert store.get() is new
+    # Readers holding the old snapshot keep a consistent view
+    assert len(old.templates) == len(new.templates)
+
+
+def test_budget_filter_uses_snapshot(monkeypatch):
+    _, store = make_store(monkeypatch)
+    snapshot = store.get()
+
+    result = get_projects_by_budget(5.0, snapshot=snapshot)
+
+    costs = [p.total_cost for p in snapshot.templates]
+    assert result["affordable_count"] == sum(1 for c in costs if c <= 5.0)
+    assert len(result["expensive_projects"]) == sum(1 for c in costs if c > 5.0)
+    assert result["stats"]["cheapest"] == min(c for c in costs if c <= 5.0)
+
+    # Budgets are inclusive and both partitions come back cheapest first
+    cutoff = sorted(costs)[2]
+    exact = get_projects_by_budget(cutoff, snapshot=snapshot)
+    assert exact["affordable_count"] == sum(1 for c in costs if c <= cutoff)
+    assert exact["stats"]["remaining_budget"] == 0
+    ordered = [p.total_cost for p in exact["affordable_projects"] + exact["expensive_projects"]]
+    assert ordered == sorted(costs)
+
+
+def test_missing_prices_fall_back(monkeypatch):
+    stub, store = make_store(monkeypatch)
+    stub.prices = {}
+
+    snapshot = store.get()
+
+    assert snapshot.pricing_source == "fallback"
+    assert len(snapshot.templates) == 6
+
+
+def test_fallback_refresh_keeps_last_good_snapshot(monkeypatch):
+    stub, store = make_store(monkeypatch)
+    good = store.get()
+
+    stub.prices = {}
+    refresher = PricingRefresher(store, retry_seconds=10, interval_seconds=3600, jitter=0)
+    succeeded = asyncio.run(refresher.refresh_once())
+
+    assert not succeeded
+    assert store.current is good
+    assert refresher.next_delay() == 10
+    asyncio.run(refresher.refresh_once())
+    assert refresher.next_delay() == 20
+
+
+def test_stale_snapshot_is_served_while_revalidating(monkeypatch):
+    stub, _ = make_store(monkeypatch)
+    store = SnapshotStore(
+        projects.fetch_template_catalog, max_age_seconds=0, retry_after_seconds=0
+    )
+    stale = store.get()
+
+    async def read_twice():
+        first = await store.get_async()
+        refreshing = store.refreshing
+        await asyncio.sleep(0.1)
+        return first, refreshing
+
+    first, refreshing = asyncio.run(read_twice())
+
+    assert first is stale
+    assert refreshing
+    assert store.current.version == stale.version + 1
+
+
+def test_region_recovers_after_failed_first_fetch(monkeypatch):
+    prices = projects.template_registry.fallback_prices("eu-west-1")
+    stub = StubAsyncPricingClient({})
+    monkeypatch.setattr(projects, "async_pricing_client", stub)
+    monkeypatch.setattr(projects, "region_stores", {})
+    store = projects.get_region_store("eu-west-1")
+    store._retry_after_seconds = 0
+
+    async def read_after_recovery():
+        # The fallback seed is served while the first live fetch fails
+        first = await store.get_async()
+        await asyncio.sleep(0.05)
+        stub.prices = prices
+        await store.get_async()
+        await asyncio.sleep(0.05)
+        return first, await store.get_async()
+
+    first, recovered = asyncio.run(read_after_recovery())
+
+    assert first.pricing_source == "fallback"
+    assert recovered.pricing_source == "live"
+    assert stub.calls == 2
+
+
+def test_price_snapshot_round_trip(tmp_path):
+    snapshot_file = PriceSnapshotFile(str(tmp_path / "snapshot.json"))
+    saved = PriceSnapshot(dict(projects.FALLBACK_PRICES), "live", 1700000000.0)
+
+    snapshot_file.save(saved)
+
+    assert snapshot_file.load() == saved
+    with snapshot_file.refresh_lease() as leader:
+        with PriceSnapshotFile(snapshot_file.path).refresh_lease() as other:
+            assert leader and not other
+
+
+def test_new_process_reuses_saved_prices(monkeypatch, tmp_path):
+    snapshot_file = PriceSnapshotFile(str(tmp_path / "snapshot.json"))
+    snapshot_file.save(PriceSnapshot(dict(projects.FALLBACK_PRICES), "live", time.time()))
+    stub = StubAsyncPricingClient()
+    monkeypatch.setattr(projects, "price_snapshot_file", snapshot_file)
+    monkeypatch.setattr(projects, "async_pricing_client", stub)
+    monkeypatch.setattr(projects, "template_store", SnapshotStore(projects.fetch_template_catalog))
+
+    catalog = asyncio.run(projects.fetch_template_catalog_async(refresh_prices=True))
+
+    assert catalog.pricing_source == "live"
+    assert stub.calls == 0
+
+
+def test_registry_compiles_usage_into_linear_plan(tmp_path):
+    catalog = {
+        "fallback_prices": [
+            {"service": "ec2", "sku": "t4g.nano", "price": 0.01},
+            {"service": "lambda", "sku": "requests", "price": 0.0000002},
+            {"service": "lambda", "sku": "duration", "price": 0.0000166667},
+        ],
+        "templates": [{
+            "id": 7,
+            "name": "Worker",
+            "description": "Queue worker",
+            "estimated_traffic": "n/a",
+            "complexity": "Beginner",
+            "components": [
+                {"service": "EC2", "description": "Box", "cost": 1.0,
+                 "usage": [{"service": "ec2", "sku": "t4g.nano", "quantity": 730}]},
+                {"service": "Lambda", "description": "Fn",
+                 "lambda": {"requests": 100000, "duration_ms": 200, "memory_mb": 128}},
+            ],
+        }],
+    }
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(catalog))
+
+    registry = load_template_registry(str(path))
+    prices = registry.fallback_prices("eu-west-1")
+    result = registry.evaluate(prices, "eu-west-1")
+
+    lambda_pricing = {"per_request": 0.0000002, "per_gb_second": 0.0000166667}
+    assert result.component_costs[0][0] == pytest.approx(1.0 + 7.3)
+    assert result.component_costs[0][1] == pytest.approx(
+        calculate_lambda_cost(100000, 200, 128, lambda_pricing)
+    )
+    assert len(registry.price_keys("eu-west-1")) == 3
+
+
+def test_registry_rejects_prices_without_fallback(tmp_path):
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps({"templates": [{
+        "id": 1, "name": "x", "description": "x", "estimated_traffic": "x", "complexity": "x",
+        "components": [{"service": "EC2", "description": "x",
+                        "usage": [{"service": "ec2", "sku": "m5.large", "quantity": 730}]}],
+    }]}))
+
+    with pytest.raises(ValueError):
+        load_template_registry(str(path))
+
+
+def test_free_tier_is_shared_across_a_plan(tmp_path):
+    def function(requests):
+        return {"service": "Lambda", "description": "Fn",
+                "usage": [{"service": "lambda", "sku": "requests", "quantity": requests}]}
+
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps({
+        "fallback_prices": [
+            {"service": "lambda", "sku": "requests", "price": 0.0000002},
+            {"service": "rds", "sku": "db.t4g.micro", "variant": "MySQL", "price": 0.016},
+        ],
+        "free_tier": [
+            {"name": "requests", "quantity": 1000000,
+             "applies_to": [{"service": "lambda", "sku": "requests"}]},
+            {"name": "rds", "quantity": 750, "new_accounts_only": True,
+             "applies_to": [{"service": "rds", "sku": "db.t4g.micro", "variant": "MySQL"}]},
+        ],
+        "price_tiers": [
+            {"service": "lambda", "sku": "requests", "above": 1000000, "price_factor": 0.5},
+        ],
+        "templates": [
+            {"id": 1, "name": "Two functions", "description": "x", "estimated_traffic": "x",
+             "complexity": "x", "components": [function(600000), function(1800000)]},
+            {"id": 2, "name": "Database", "description": "x", "estimated_traffic": "x",
+             "complexity": "x", "components": [
+                 {"service": "RDS", "description": "x",
+                  "usage": [{"service": "rds", "sku": "db.t4g.micro", "variant": "MySQL", "quantity": 730}]},
+             ]},
+        ],
+    }))
+
+    registry = load_template_registry(str(path))
+    prices = registry.fallback_prices("us-east-1")
+    result = registry.evaluate(prices, "us-east-1")
+
+    # 2.4M requests, 1M free, 1.4M billed: 1M at full price, 0.4M at half
+    assert result.totals[0] == pytest.approx((1_000_000 + 200_000) * 0.0000002)
+    # Split 1:3 by usage
+    assert result.component_costs[0][1] == pytest.approx(3 * result.component_costs[0][0])
+
+    assert result.totals[1] == pytest.approx(730 * 0.016)
+    assert registry.evaluate(prices, "us-east-1", new_account=True).totals[1] == 0.0
+
+
+def test_reprice_only_touches_templates_using_changed_prices():
+    registry = projects.template_registry
+    region = projects.DEFAULT_REGION
+    prices = dict(projects.FALLBACK_PRICES)
+    before = registry.evaluate(prices, region)
+
+    rds = next(key for key in prices if key.service == "rds")
+    prices[rds] *= 1.5
+    after, affected = registry.reprice(before, prices, region, [rds])
+
+    assert [registry.templates[i].name for i in affected] == ["Small Full-Stack App"]
+    full = registry.evaluate(prices, region)
+    assert after.totals == pytest.approx(full.totals)
+    for costs, expected in zip(after.component_costs, full.component_costs):
+        assert costs == pytest.approx(expected)
+    # Untouched templates share their cost rows with the previous plan
+    assert all(
+        after.component_costs[i] is before.component_costs[i]
+        for i in range(len(before.totals)) if i not in affected
+    )
+    assert registry.reprice(before, prices, "eu-west-1", [rds]) == (before, [])
+
+
+def test_refresh_reuses_unchanged_templates(monkeypatch):
+    stub, store = make_store(monkeypatch)
+    # The builder diffs against the store it publishes to
+    monkeypatch.setattr(projects, "template_store", store)
+    old = store.get()
+
+    rds = next(key for key in stub.prices if key.service == "rds")
+    stub.prices[rds] = 0.5
+    new = store.refresh()
+
+    changed = [i for i, template in enumerate(new.templates) if template is not old.templates[i]]
+    assert [new.templates[i].name for i in changed] == ["Small Full-Stack App"]
+    assert new.templates[changed[0]].total_cost > old.templates[changed[0]].total_cost
+
+    # Same encodings, index and ETag as building everything from scratch
+    rebuilt = SnapshotStore(lambda: projects.price_template_catalog(stub.prices)).get()
+    assert new.encoded_templates == rebuilt.encoded_templates
+    assert new.budget_index.costs == rebuilt.budget_index.costs
+    assert new.budget_index.order == rebuilt.budget_index.order
+    assert new.budget_answers.render(12.5) == rebuilt.budget_answers.render(12.5)
+    assert new.fingerprint == rebuilt.fingerprint
+
+    # Nothing changed: the whole snapshot content is carried over
+    unchanged = store.refresh()
+    assert unchanged.templates == new.templates
+    assert unchanged.budget_answers is new.budget_answers
+
+
+def test_region_matrix_and_cheapest_region(monkeypatch):
+    # Everything costs twice as much in eu-west-1
+    prices = {}
+    for region, factor in (("us-east-1", 1.0), ("eu-west-1", 2.0)):
+        for key, price in projects.template_registry.fallback_prices(region).items():
+            prices[key] = price * factor
+    stub = StubAsyncPricingClient(prices)
+    monkeypatch.setattr(projects, "async_pricing_client", stub)
+    monkeypatch.setattr(projects, "region_stores", {})
+    monkeypatch.setattr(projects, "template_store", SnapshotStore(
+        projects.fetch_template_catalog,
+        async_builder=lambda: projects.fetch_region_catalog_async(projects.DEFAULT_REGION),
+    ))
+
+    regions = ["eu-west-1", "us-east-1"]
+
+    async def after_background_refresh():
+        # New region stores serve fallback prices until live ones arrive
+        await projects.get_region_snapshots_async(regions)
+        await asyncio.sleep(0.05)
+        return await projects.get_region_snapshots_async(regions)
+
+    snapshots = asyncio.run(after_background_refresh())
+    matrix = projects.build_region_matrix(regions, snapshots, budget=16.0)
+
+    assert [s.pricing_source for s in snapshots] == ["live", "live"]
+    eu, us = matrix["costs"]
+    assert all(e >= u for e, u in zip(eu, us))
+    for entry, e, u in zip(matrix["cheapest_region_by_project"], eu, us):
+        assert entry["region"] == ("us-east-1" if e > u else "eu-west-1")
+    assert matrix["affordable_counts"][0] < matrix["affordable_counts"][1]
+
+    best = projects.find_cheapest_region(16.0, regions, snapshots)
+    assert best["region"] == "us-east-1"
+    assert best["affordable_count"] == matrix["affordable_counts"][1]
+
+    with pytest.raises(ValueError):
+        projects.get_region_store("mars-1")
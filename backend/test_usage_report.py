@@ -0,0 +1,182 @@
+"""
+Tests for Cost and Usage Report ingestion
+Run with: python -m pytest test_usage_report.py
+"""
+
+import csv
+import gzip
+import json
+import os
+
+import pytest
+
+from app import projects
+from app.usage_report import UsageStore, column_name, compare_spend, iter_usage_chunks, service_name
+
+LEGACY_HEADER = [
+    "identity/LineItemId",
+    "bill/BillingPeriodStartDate",
+    "lineItem/UsageStartDate",
+    "lineItem/ProductCode",
+    "lineItem/UsageType",
+    "lineItem/UnblendedCost",
+]
+TYPED_HEADER = LEGACY_HEADER + ["lineItem/LineItemType"]
+
+
+def write_report(path, rows, header=LEGACY_HEADER):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, "wt", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(header)
+        for i, (month, product, usage_type, cost, *line_item_type) in enumerate(rows):
+            writer.writerow(
+                [f"id{i}", f"{month}-01T00:00:00Z", f"{month}-03T00:00:00Z", product, usage_type, cost]
+                + line_item_type
+            )
+
+
+def write_manifest(path, period_start, report_keys):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fh:
+        json.dump({"billingPeriod": {"start": period_start}, "reportKeys": report_keys}, fh)
+
+
+def test_column_names_and_services():
+    assert column_name("lineItem/UnblendedCost") == "line_item_unblended_cost"
+    assert column_name("bill/BillingPeriodStartDate") == "bill_billing_period_start_date"
+    assert column_name("line_item_product_code") == "line_item_product_code"
+
+    assert service_name("AWSLambda", "USE1-Request") == "Lambda"
+    assert service_name("AmazonEC2", "USE1-EBS:VolumeUsage.gp3") == "EBS"
+    assert service_name("AmazonEC2", "USE1-DataTransfer-Out-Bytes") == "Data Transfer"
+    assert service_name("AmazonEC2", "USE1-BoxUsage:t4g.nano") == "EC2"
+    assert service_name("AWSKMS") == "AWSKMS"
+
+
+def test_streams_in_bounded_chunks(tmp_path):
+    path = str(tmp_path / "cur" / "report-1.csv.gz")
+    write_report(path, [("2024-05", "AmazonS3", "TimedStorage-ByteHrs", "0.01")] * 25)
+
+    chunks = list(iter_usage_chunks(path, chunk_rows=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert chunks[0][0] == ("2024-05", "AmazonS3", "TimedStorage-ByteHrs", "", 0.01)
+
+
+def test_ingest_is_incremental(tmp_path):
+    root = tmp_path / "cur"
+    may = str(root / "20240501-20240601" / "report-1.csv.gz")
+    june = str(root / "20240601-20240701" / "report-1.csv.gz")
+    write_report(may, [
+        ("2024-05", "AWSLambda", "USE1-Request", "0.20"),
+        ("2024-05", "AWSLambda", "USE1-Lambda-GB-Second", "1.30"),
+        ("2024-05", "AmazonEC2", "USE1-EBS:VolumeUsage.gp3", "0.40"),
+        ("2024-05", "AmazonRoute53", "HostedZone", "0.50"),
+    ])
+    write_report(june, [("2024-06", "AmazonS3", "TimedStorage-ByteHrs", "0.12")])
+    (root / "manifest.json").write_text("{}")
+
+    store = UsageStore(str(tmp_path / "usage.db"))
+    first = store.ingest(str(root), chunk_rows=2)
+    assert (first.files_ingested, first.files_skipped, first.rows) == (2, 0, 5)
+    assert store.months() == ["2024-05", "2024-06"]
+    assert store.monthly_spend("2024-05") == pytest.approx({"Lambda": 1.5, "EBS": 0.4, "Route53": 0.5})
+
+    # Nothing changed: nothing is read again
+    assert store.ingest(str(root)).files_skipped == 2
+
+    # AWS rewrites the current month's report; its old totals are replaced
+    write_report(june, [("2024-06", "AmazonS3", "TimedStorage-ByteHrs", "0.30")] * 2)
+    os.utime(june, ns=(os.stat(june).st_atime_ns, os.stat(june).st_mtime_ns + 1))
+    second = store.ingest(str(root))
+    assert (second.files_ingested, second.files_skipped) == (1, 1)
+    assert store.monthly_spend("2024-06") == pytest.approx({"S3": 0.6})
+
+    os.remove(may)
+    assert store.ingest(str(root)).files_removed == 1
+    assert store.months() == ["2024-06"]
+    assert store.summary()["files"] == 1
+
+
+def test_superseded_assemblies_are_not_counted(tmp_path):
+    root = tmp_path / "cur"
+    period = root / "cost" / "20240501-20240601"
+    key_prefix = "reports/cost/20240501-20240601"
+    first = str(period / "a1" / "cost-1.csv.gz")
+    write_report(first, [("2024-05", "AWSLambda", "USE1-Request", "1.00")])
+    write_manifest(str(period / "a1" / "cost-Manifest.json"), "20240501T000000.000Z", [f"{key_prefix}/a1/cost-1.csv.gz"])
+    write_manifest(str(period / "cost-Manifest.json"), "20240501T000000.000Z", [f"{key_prefix}/a1/cost-1.csv.gz"])
+
+    store = UsageStore(str(tmp_path / "usage.db"))
+    assert store.ingest(str(root)).files_ingested == 1
+    assert store.monthly_spend("2024-05") == pytest.approx({"Lambda": 1.0})
+
+    # AWS redelivers the month to a new assembly; the old one stays in the bucket
+    second = str(period / "a2" / "cost-1.csv.gz")
+    write_report(second, [("2024-05", "AWSLambda", "USE1-Request", "1.50")])
+    write_manifest(str(period / "a2" / "cost-Manifest.json"), "20240501T000000.000Z", [f"{key_prefix}/a2/cost-1.csv.gz"])
+    write_manifest(str(period / "cost-Manifest.json"), "20240501T000000.000Z", [f"{key_prefix}/a2/cost-1.csv.gz"])
+
+    result = store.ingest(str(root))
+    assert (result.files_ingested, result.files_superseded, result.files_removed) == (1, 1, 1)
+    assert store.monthly_spend("2024-05") == pytest.approx({"Lambda": 1.5})
+    assert store.summary()["files"] == 1
+
+
+def test_credits_refunds_and_tax_are_broken_out(tmp_path):
+    path = str(tmp_path / "cur" / "report-1.csv.gz")
+    write_report(path, [
+        ("2024-05", "AWSLambda", "USE1-Request", "2.00", "Usage"),
+        ("2024-05", "AWSLambda", "USE1-Request", "-2.00", "Credit"),
+        ("2024-05", "AmazonS3", "TimedStorage-ByteHrs", "1.00", "Usage"),
+        ("2024-05", "AmazonS3", "TimedStorage-ByteHrs", "-0.25", "Refund"),
+        ("2024-05", "AWSLambda", "", "0.30", "Tax"),
+    ], header=TYPED_HEADER)
+
+    store = UsageStore(str(tmp_path / "usage.db"))
+    store.ingest(str(tmp_path / "cur"))
+    actual = store.monthly_spend("2024-05")
+    adjustments = store.monthly_adjustments("2024-05")
+    assert actual == pytest.approx({"Lambda": 2.0, "S3": 1.0})
+    assert adjustments == pytest.approx({"credit": -2.0, "refund": -0.25, "tax": 0.3})
+
+    result = compare_spend([], actual, budget=2.0, adjustments=adjustments)
+    assert result["actual_total"] == 3.0
+    assert result["net_total"] == 1.05
+    assert result["budget_remaining"] == 0.95
+    assert result["over_budget"] is False
+
+
+def test_compare_spend_counts_shared_components_once():
+    templates = projects.build_project_templates(dict(projects.FALLBACK_PRICES), "fallback")
+    static_site = next(template for template in templates if template.id == 1)
+    pair = [static_site, static_site.model_copy(update={"id": 99})]
+
+    result = compare_spend(pair, {"S3": 0.30, "Route53": 0.50, "KMS": 1.00}, budget=2.0)
+
+    planned = {row["service"]: row["planned"] for row in result["services"]}
+    shared = sum(component.cost for component in static_site.components if component.shared)
+    assert result["planned_total"] == pytest.approx(2 * static_site.total_cost - shared, abs=0.011)
+    assert planned["KMS"] == 0.0
+    assert result["services"][0]["service"] == "KMS"
+    assert result["actual_total"] == 1.8
+    assert result["budget_remaining"] == 0.2
+    assert result["over_budget"] is False
+    assert result["projects"][0]["actual_cost_of_services"] == 0.8
+
+
+def test_parquet_reports(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "cur" / "BILLING_PERIOD=2024-05" / "part-0.snappy.parquet")
+    os.makedirs(os.path.dirname(path))
+    pq.write_table(pa.table({
+        "bill_billing_period_start_date": ["2024-05-01 00:00:00"] * 3,
+        "line_item_product_code": ["AmazonDynamoDB", "AmazonDynamoDB", "AmazonApiGateway"],
+        "line_item_usage_type": ["ReadRequestUnits", "WriteRequestUnits", "ApiGatewayRequest"],
+        "line_item_unblended_cost": [0.25, 0.5, 1.0],
+    }), path)
+
+    store = UsageStore(str(tmp_path / "usage.db"))
+    assert store.ingest(str(tmp_path / "cur")).rows == 3
+    assert store.monthly_spend("2024-05") == pytest.approx({"DynamoDB": 0.75, "API Gateway": 1.0})
@@ -1,8 +1,92 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 
 // API configuration
 const API_BASE_URL = 'http://127.0.0.1:8000';
 
+// Wait this long after the last budget change before asking the API
+const DEBOUNCE_MS = 250;
+
+// Budget responses kept in memory (least recently used evicted first)
+const RESPONSE_CACHE_SIZE = 100;
+
+// Fetch the whole catalog once and split it by budget in the browser;
+// set VITE_FILTER_LOCALLY=false to query the API per budget instead
+const FILTER_LOCALLY = import.meta.env.VITE_FILTER_LOCALLY !== 'false';
+
+// How often a loaded catalog is revalidated (a 304 when prices haven't
+// changed); sooner while it only has fallback prices
+const REVALIDATE_MS = 60_000;
+const FALLBACK_REVALIDATE_MS = 15_000;
+
+// Budgets are compared in cents, like the API's ETags
+const budgetKey = (budget) => budget.toFixed(2);
+
+// Small LRU on top of Map's insertion order
+class ResponseCache {
+  constructor(maxSize) {
+    this.maxSize = maxSize;
+    this.entries = new Map();
+  }
+
+  get(key) {
+    if (!this.entries.has(key)) return undefined;
+    const value = this.entries.get(key);
+    this.entries.delete(key);
+    this.entries.set(key, value);
+    return value;
+  }
+
+  set(key, value) {
+    this.entries.delete(key);
+    this.entries.set(key, value);
+    if (this.entries.size > this.maxSize) {
+      this.entries.delete(this.entries.keys().next().value);
+    }
+  }
+}
+
+// Same answer as GET /api/projects?budget=..., computed from /api/projects/all
+function splitByBudget(catalog, budget) {
+  const sorted = [...catalog.projects].sort((a, b) => a.total_cost - b.total_cost);
+  const affordable = sorted.filter(project => project.total_cost <= budget);
+  const expensive = sorted.filter(project => project.total_cost > budget);
+  const mostExpensive = affordable.length ? affordable[affordable.length - 1].total_cost : 0;
+
+  return {
+    budget,
+    affordable_count: affordable.length,
+    affordable_projects: affordable,
+    expensive_projects: expensive,
+    stats: {
+      cheapest: affordable.length ? affordable[0].total_cost : 0,
+      remaining_budget: budget - mostExpensive,
+    },
+    pricing_source: catalog.pricing_source,
+  };
+}
+
+// Conditional GET of the whole catalog: null if `etag` is still current
+async function fetchCatalog(signal, etag) {
+  const response = await fetch(`${API_BASE_URL}/api/projects/all`, {
+    signal,
+    headers: etag ? { 'If-None-Match': etag } : {},
+    cache: 'no-store',
+  });
+  if (response.status === 304) return null;
+  if (!response.ok) {
+    throw new Error(`API error: ${response.status}`);
+  }
+  return { catalog: await response.json(), etag: response.headers.get('ETag') };
+}
+
+async function fetchJson(path, signal) {
+  const response = await fetch(`${API_BASE_URL}${path}`, { signal });
+  if (!response.ok) {
+    throw new Error(`API error: ${response.status}`);
+  }
+  return response.json();
+}
+
 function ProjectCard({ project, isAffordable }) {
   const [expanded, setExpanded] = useState(false);
 
@@ -76,31 +160,124 @@ export default function BudgetCalculator() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
-  // Fetch projects from API whenever budget changes
+  const cacheRef = useRef(new ResponseCache(RESPONSE_CACHE_SIZE));
+  const catalogRef = useRef(null);
+  const catalogEtagRef = useRef(null);
+  const fetchStartedRef = useRef(false);
+  // Bumped when revalidation brings new prices, so the view is re-split
+  const [catalogVersion, setCatalogVersion] = useState(0);
+
+  // Fetch projects whenever budget changes: debounced, cached, and any
+  // request still in flight is cancelled so late responses can't win
   useEffect(() => {
+    const key = budgetKey(budget);
+    const cached = cacheRef.current.get(key);
+    if (cached) {
+      setProjectData(cached);
+      setError(null);
+      setLoading(false);
+      return;
+    }
+    if (catalogRef.current) {
+      const data = splitByBudget(catalogRef.current, budget);
+      cacheRef.current.set(key, data);
+      setProjectData(data);
+      setError(null);
+      setLoading(false);
+      return;
+    }
+
+    const controller = new AbortController();
+
     const fetchProjects = async () => {
-      setLoading(true);
       setError(null);
-      
+
       try {
-        const response = await fetch(`${API_BASE_URL}/api/projects?budget=${budget}`);
-        
-        if (!response.ok) {
-          throw new Error(`API error: ${response.status}`);
+        let data;
+        if (FILTER_LOCALLY) {
+          const { catalog, etag } = await fetchCatalog(controller.signal, null);
+          catalogRef.current = catalog;
+          catalogEtagRef.current = etag;
+          data = splitByBudget(catalog, budget);
+        } else {
+          data = await fetchJson(`/api/projects?budget=${key}`, controller.signal);
         }
-        
-        const data = await response.json();
+        cacheRef.current.set(key, data);
         setProjectData(data);
+        setLoading(false);
       } catch (err) {
+        if (err.name === 'AbortError') return;
         setError(err.message);
+        setLoading(false);
         console.error('Failed to fetch projects:', err);
+      }
+    };
+
+    // Only the first fetch skips the debounce. After that every change
+    // waits, even while the first request is still failing or in flight,
+    // so dragging the slider doesn't abort and refire a request per tick
+    const timer = setTimeout(() => {
+      fetchStartedRef.current = true;
+      fetchProjects();
+    }, fetchStartedRef.current ? DEBOUNCE_MS : 0);
+
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [budget, catalogVersion]); // Re-run when budget or prices change
+
+  // Keep a long-lived tab's prices current: revalidate the catalog on a
+  // timer (sooner while it's fallback-priced) and when the window regains
+  // focus. Unchanged prices cost a 304; new ones replace the catalog and
+  // drop the budget answers split from the old one
+  useEffect(() => {
+    if (!FILTER_LOCALLY) return undefined;
+
+    let controller = null;
+    let timer = null;
+    let stopped = false;
+
+    const revalidate = async () => {
+      // Nothing to revalidate before the first load, or while a check runs
+      if (!catalogRef.current || controller) return;
+      controller = new AbortController();
+      try {
+        const result = await fetchCatalog(controller.signal, catalogEtagRef.current);
+        if (result) {
+          catalogRef.current = result.catalog;
+          catalogEtagRef.current = result.etag;
+          cacheRef.current.entries.clear();
+          setCatalogVersion(version => version + 1);
+        }
+      } catch (err) {
+        if (err.name !== 'AbortError') {
+          console.warn('Failed to revalidate projects:', err);
+        }
       } finally {
-        setLoading(false);
+        controller = null;
       }
     };
 
-    fetchProjects();
-  }, [budget]); // Re-run when budget changes
+    const schedule = () => {
+      if (stopped) return;
+      const fallback = catalogRef.current?.pricing_source === 'fallback';
+      timer = setTimeout(async () => {
+        // Hidden tabs wait for focus instead of polling
+        if (!document.hidden) await revalidate();
+        schedule();
+      }, fallback ? FALLBACK_REVALIDATE_MS : REVALIDATE_MS);
+    };
+
+    schedule();
+    window.addEventListener('focus', revalidate);
+    return () => {
+      stopped = true;
+      clearTimeout(timer);
+      window.removeEventListener('focus', revalidate);
+      controller?.abort();
+    };
+  }, []);
 
   // Loading state
   if (loading) {